@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class StudentpremiumcontentConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'StudentPremiumContent'
+
+    def ready(self):
+        # Connect the signal handlers that drop the cached entitlements
+        from . import signals  # noqa: F401
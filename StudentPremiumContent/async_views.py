@@ -0,0 +1,34 @@
+"""
+Async twins of the premium access checks of views.py, served under ASGI (myproject/fastpath.py)
+"""
+from myproject.fastpath import async_api_view, json_response
+from .entitlements import aget_entitlement
+from .views import access_answer, purchase_answer, purchase_question
+
+
+@async_api_view(['GET'])
+async def check_premium_access(request, student_id, content_id, content_type):
+    """
+    Async version of views.check_premium_access
+    """
+    try:
+        premium_content = await aget_entitlement(student_id, content_type, content_id)
+        return json_response(access_answer(premium_content))
+    except Exception as e:
+        return json_response({"error": f"فشل في التحقق من الوصول للمحتوى المميز: {str(e)}"}, status=500)
+
+
+@async_api_view(['GET'])
+async def check_content_purchase(request):
+    """
+    Async version of views.check_content_purchase
+    """
+    try:
+        question, error = purchase_question(request.GET)
+        if error:
+            return json_response(error, status=400)
+
+        premium_content = await aget_entitlement(*question)
+        return json_response(purchase_answer(premium_content))
+    except Exception as e:
+        return json_response({"error": f"فشل في التحقق من شراء المحتوى: {str(e)}"}, status=500)
@@ -0,0 +1,164 @@
+"""
+Per-student entitlements to premium content
+The premium content records of a student are loaded with one query into a
+{'type:content_id': record data} map and cached until the first active record
+expires (or ENTITLEMENT_TIMEOUT), so opening content and the access check
+endpoints answer without querying. Creating, deleting or extending a record
+drops the map of its student (StudentPremiumContent/signals.py)
+The price and publisher of a content, needed to know whether it is premium at
+all, are cached the same way and dropped when the package or note is saved
+Both live in the 'shared' cache, so a purchase or a price change handled by one
+worker is seen by every worker at once
+"""
+import datetime
+
+from django.core.cache import caches
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from myproject.projection import optimize
+from .models import StudentPremiumContent
+from .serializers import StudentPremiumContentSerializer
+
+# Longest time an entitlement map or content terms stay cached (seconds)
+ENTITLEMENT_TIMEOUT = 60 * 60
+
+entitlement_cache = caches['shared']
+
+
+def entitlements_key(student_id):
+    return f'entitlements:{student_id}'
+
+
+def content_terms_key(content_type, content_id):
+    return f'content_terms:{content_type}:{content_id}'
+
+
+def _seconds_until_expiry(records, today):
+    """
+    Seconds until the first active record expires (the end of its expiry day)
+    capped at ENTITLEMENT_TIMEOUT
+    """
+    upcoming = [record.date_of_expiry for record in records if record.date_of_expiry >= today]
+    if not upcoming:
+        return ENTITLEMENT_TIMEOUT
+
+    end_of_day = datetime.datetime.combine(min(upcoming) + datetime.timedelta(days=1), datetime.time())
+    end_of_day = timezone.make_aware(end_of_day, timezone.get_current_timezone())
+    remaining = (end_of_day - timezone.now()).total_seconds()
+    return max(1, min(ENTITLEMENT_TIMEOUT, int(remaining)))
+
+
+def _entitlements_query(student_id):
+    return optimize(StudentPremiumContent.objects.filter(student_id=student_id), StudentPremiumContentSerializer)
+
+
+def _entitlement_map(records):
+    """
+    Return the entitlement map of records and how long it may be cached
+    """
+    entitlements = {
+        f'{record.type}:{record.content_id}': StudentPremiumContentSerializer(record).data
+        for record in records
+    }
+    return entitlements, _seconds_until_expiry(records, timezone.localdate())
+
+
+def get_entitlements(student_id):
+    """
+    Return {'type:content_id': serialized record} for every premium content record of the student
+    Expired records are kept so callers can tell an expired purchase from no purchase
+    """
+    key = entitlements_key(student_id)
+    entitlements = entitlement_cache.get(key)
+    if entitlements is None:
+        entitlements, timeout = _entitlement_map(list(_entitlements_query(student_id)))
+        entitlement_cache.set(key, entitlements, timeout)
+    return entitlements
+
+
+async def aget_entitlements(student_id):
+    """
+    Async version of get_entitlements() for the ASGI fast path
+    """
+    key = entitlements_key(student_id)
+    entitlements = await entitlement_cache.aget(key)
+    if entitlements is None:
+        entitlements, timeout = _entitlement_map([record async for record in _entitlements_query(student_id)])
+        await entitlement_cache.aset(key, entitlements, timeout)
+    return entitlements
+
+
+def get_entitlement(student_id, content_type, content_id):
+    """
+    Return the serialized record giving the student access to the content, or None
+    The record may be expired, see is_active()
+    """
+    return get_entitlements(student_id).get(f'{content_type}:{content_id}')
+
+
+async def aget_entitlement(student_id, content_type, content_id):
+    return (await aget_entitlements(student_id)).get(f'{content_type}:{content_id}')
+
+
+def is_active(entitlement, today=None):
+    """
+    Whether an entitlement is still valid: its expiry day is today or later
+    """
+    today = today or timezone.localdate()
+    return datetime.date.fromisoformat(entitlement['date_of_expiry']) >= today
+
+
+def invalidate(student_id):
+    entitlement_cache.delete(entitlements_key(student_id))
+
+
+def get_content_terms(content_type, content_id):
+    """
+    Return (price, publisher_id) of a package ('exam') or note, or None if it does not exist
+    """
+    from notes.models import Notes
+    from test_packages.models import TestPackage
+
+    key = content_terms_key(content_type, content_id)
+    terms = entitlement_cache.get(key)
+    if terms is None:
+        model = TestPackage if content_type == 'exam' else Notes
+        terms = model.objects.filter(id=content_id).values_list('price', 'publisher_id').first()
+        if terms is None:
+            return None
+        entitlement_cache.set(key, terms, ENTITLEMENT_TIMEOUT)
+    return terms
+
+
+def invalidate_content_terms(content_type, content_id):
+    entitlement_cache.delete(content_terms_key(content_type, content_id))
+
+
+def can_open(user, content_type, content_id, price, publisher_id):
+    """
+    Whether user may open the content: free content, its publisher, staff,
+    or a student with an active entitlement
+    """
+    if not price or price <= 0:
+        return True
+    if not user or not user.is_authenticated:
+        return False
+    if user.is_staff or user.pk == publisher_id:
+        return True
+
+    entitlement = get_entitlement(user.pk, content_type, content_id)
+    return entitlement is not None and is_active(entitlement)
+
+
+def access_denied(request, content_type, content_id, price, publisher_id):
+    """
+    Return the 403 response refusing the content to request.user, or None when can_open()
+    """
+    if can_open(request.user, content_type, content_id, price, publisher_id):
+        return None
+    return Response(
+        {'error': 'هذا المحتوى مميز، يجب شراؤه أولاً أو تجديد اشتراكه'},
+        status=status.HTTP_403_FORBIDDEN
+    )
@@ -0,0 +1,44 @@
+"""
+Expiry of premium content
+Reads never write: an expired record is only reported as expired, and
+sweep() later flags every record whose expiry day has passed with chunked
+UPDATEs driven by the (is_expired, date_of_expiry, id) index, so each chunk
+is a range scan over the records still to flag
+The records are kept, the sale stays in the teacher earnings and the
+purchase history. Buying an expired content again replaces its record
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import StudentPremiumContent
+
+# Records flagged by one UPDATE
+SWEEP_BATCH_SIZE = 1000
+
+
+def expired_records(today=None):
+    """
+    Records whose expiry day has passed and that are not flagged yet
+    """
+    today = today or timezone.localdate()
+    return StudentPremiumContent.objects.filter(is_expired=False, date_of_expiry__lt=today)
+
+
+def sweep(today=None, batch_size=SWEEP_BATCH_SIZE):
+    """
+    Flag every record expired before today, batch_size records per transaction
+    Returns the number of records flagged
+    """
+    today = today or timezone.localdate()
+    swept = 0
+    while True:
+        with transaction.atomic():
+            # Flagged records leave the range, the next chunk starts where this one ended
+            ids = list(
+                expired_records(today).order_by('date_of_expiry', 'id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return swept
+            # The entitlements cache compares dates itself, it does not need the flag
+            StudentPremiumContent.objects.filter(id__in=ids).update(is_expired=True)
+        swept += len(ids)
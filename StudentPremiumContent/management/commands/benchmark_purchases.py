@@ -0,0 +1,130 @@
+import random
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from profiles.models import Profile_Student
+from StudentPremiumContent.models import StudentPremiumContent
+from StudentPremiumContent.purchases import purchase, InsufficientBalance, PurchaseError
+from test_packages.models import TestPackage
+from users.models import User
+
+
+class Command(BaseCommand):
+    """
+    Concurrency benchmark of the purchase service
+    Creates throwaway packages and students whose balance covers only part of their purchases,
+    sends every purchase (and its retries, with the same idempotency key) from
+    parallel threads, then checks that nobody was overcharged or charged twice
+    and reports the throughput
+    Run it against the production database engine (MySQL): SQLite serializes
+    writers and answers "database is locked" under parallel load
+    """
+    help = 'Run parallel purchases and check that balances are never overspent or charged twice'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=20, help='Number of students buying in parallel')
+        parser.add_argument('--purchases', type=int, default=10, help='Purchases attempted by each student')
+        parser.add_argument('--affordable', type=int, default=6, help='Purchases the balance of each student covers')
+        parser.add_argument('--retries', type=int, default=1, help='Times each purchase is resent with the same key')
+        parser.add_argument('--threads', type=int, default=8, help='Parallel workers')
+        parser.add_argument('--price', type=int, default=100, help='Price of every purchase')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark rows instead of deleting them')
+
+    def handle(self, *args, **options):
+        price = options['price']
+        run_id = uuid.uuid4().hex[:8]
+
+        teacher = User.objects.create(username=f'bench-{run_id}-teacher', email=f'bench-{run_id}-teacher@svi.com', is_teacher=True)
+        users = [
+            User.objects.create(username=f'bench-{run_id}-{i}', email=f'bench-{run_id}-{i}@svi.com')
+            for i in range(options['students'])
+        ]
+        student_ids = [user.pk for user in users]
+        package_ids = [
+            TestPackage.objects.create(
+                package_name=f'bench-{run_id}-{i}', units='unit', subject_name='math_12', price=price,
+                number_of_questions=1, publisher_id=teacher.pk, publisher_name='benchmark',
+            ).pk
+            for i in range(options['purchases'])
+        ]
+        initial_balance = options['affordable'] * price
+        Profile_Student.objects.filter(user_id__in=student_ids).update(balance=initial_balance)
+
+        # Every purchase once plus its retries, shuffled so retries race their original
+        tasks = [
+            (student_id, content_id, f'{run_id}-{student_id}-{content_id}')
+            for student_id in student_ids
+            for content_id in package_ids
+            for _ in range(1 + options['retries'])
+        ]
+        random.shuffle(tasks)
+
+        def run(task):
+            student_id, content_id, key = task
+            data = {
+                'student': student_id, 'price': price, 'content_id': content_id, 'content_name': f'content {content_id}',
+                'type': 'exam', 'subject_name': 'math_12', 'Class': '12', 'publisher_id': teacher.pk,
+                'publisher_name': 'benchmark', 'date_of_expiry': '2100-01-01',
+            }
+            try:
+                return 'replayed' if purchase(data, key).replayed else 'charged'
+            except InsufficientBalance:
+                return 'refused'
+            except PurchaseError as e:
+                return type(e).__name__
+            except Exception as e:
+                return f'error: {e}'
+            finally:
+                # Worker threads own their connection
+                connection.close()
+
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            outcomes = Counter(pool.map(run, tasks))
+        elapsed = time.monotonic() - started
+
+        try:
+            problems = self.find_problems(student_ids, initial_balance, price, outcomes)
+        finally:
+            if not options['keep']:
+                StudentPremiumContent.objects.filter(student_id__in=student_ids).delete()
+                TestPackage.objects.filter(pk__in=package_ids).delete()
+                User.objects.filter(pk__in=student_ids + [teacher.pk]).delete()
+
+        self.stdout.write(
+            f'{len(tasks)} requests from {options["threads"]} threads in {elapsed:.2f}s '
+            f'({len(tasks) / elapsed:.0f} requests/s, {outcomes["charged"] / elapsed:.0f} purchases/s)'
+        )
+        for outcome, number in sorted(outcomes.items()):
+            self.stdout.write(f'  {outcome}: {number}')
+
+        if problems:
+            raise CommandError('\n'.join(problems))
+        self.stdout.write(self.style.SUCCESS('No balance overspent, no purchase charged twice'))
+
+    def find_problems(self, student_ids, initial_balance, price, outcomes):
+        """
+        Return the inconsistencies between balances, records and outcomes
+        """
+        problems = []
+        balances = dict(Profile_Student.objects.filter(user_id__in=student_ids).values_list('user_id', 'balance'))
+        records = Counter(
+            StudentPremiumContent.objects.filter(student_id__in=student_ids).values_list('student_id', flat=True)
+        )
+
+        for student_id in student_ids:
+            expected = initial_balance - records[student_id] * price
+            if balances[student_id] < 0:
+                problems.append(f'student {student_id} has a negative balance {balances[student_id]}')
+            if balances[student_id] != expected:
+                problems.append(f'student {student_id} has {balances[student_id]}, expected {expected} for {records[student_id]} purchases')
+
+        if sum(records.values()) != outcomes['charged']:
+            problems.append(f'{outcomes["charged"]} purchases charged but {sum(records.values())} records created')
+
+        return problems
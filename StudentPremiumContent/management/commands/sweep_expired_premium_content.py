@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from StudentPremiumContent.expiry import SWEEP_BATCH_SIZE, sweep
+
+
+class Command(BaseCommand):
+    """
+    Flag the premium content records whose expiry day has passed
+    Meant to run periodically (daily from cron, shortly after midnight), the
+    read endpoints no longer delete expired records themselves
+    """
+    help = 'Mark expired premium content records with chunked updates and report the throughput'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=SWEEP_BATCH_SIZE, help='Records flagged per transaction')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        swept = sweep(batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+        rate = swept / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Marked {swept} expired premium content records in {elapsed:.2f}s ({rate:.0f} rows/s)'
+        ))
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentPremiumContent', '0007_alter_studentpremiumcontent_unique_together_and_more'),
+        ('profiles', '0020_alter_profile_teacher_class'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='studentpremiumcontent',
+            options={'ordering': ['-purchase_date', '-id'], 'verbose_name': 'Student Premium Content', 'verbose_name_plural': 'Student Premium Content'},
+        ),
+        migrations.AddIndex(
+            model_name='studentpremiumcontent',
+            index=models.Index(fields=['student', 'purchase_date', 'id'], name='premium_student_date_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentPremiumContent', '0008_alter_studentpremiumcontent_options_and_more'),
+        ('profiles', '0023_populate_teacherstats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentpremiumcontent',
+            name='idempotency_key',
+            field=models.CharField(blank=True, help_text='Client supplied key of the purchase request', max_length=64, null=True, verbose_name='Idempotency Key'),
+        ),
+        migrations.AddConstraint(
+            model_name='studentpremiumcontent',
+            constraint=models.UniqueConstraint(fields=('student', 'idempotency_key'), name='premium_student_idempotency_key'),
+        ),
+    ]
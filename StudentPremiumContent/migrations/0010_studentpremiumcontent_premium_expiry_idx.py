@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentPremiumContent', '0009_studentpremiumcontent_idempotency_key'),
+        ('profiles', '0025_populate_earningsentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='studentpremiumcontent',
+            index=models.Index(fields=['is_expired', 'date_of_expiry', 'id'], name='premium_expiry_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentPremiumContent', '0010_studentpremiumcontent_premium_expiry_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentpremiumcontent',
+            name='total_paid',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Sum of the prices paid for the content, the price itself when empty', max_digits=12, null=True, verbose_name='Total Paid'),
+        ),
+    ]
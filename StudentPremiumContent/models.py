@@ -89,6 +89,16 @@ class StudentPremiumContent(models.Model):
         help_text='Price of the premium content'
     )
     
+    # Sum of the prices paid over the first purchase and every renewal, empty until the first renewal
+    total_paid = models.DecimalField(
+        max_digits=12,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        verbose_name='Total Paid',
+        help_text='Sum of the prices paid for the content, the price itself when empty'
+    )
+
     # Date when the premium content access expires
     date_of_expiry = models.DateField(
         verbose_name='Date of Expiry',
@@ -101,16 +111,38 @@ class StudentPremiumContent(models.Model):
         verbose_name='Is Expired',
         help_text='Whether the premium content is expired'
     )
+    
+    # Key sent by the client with the purchase, a retry with the same key is not charged twice
+    idempotency_key = models.CharField(
+        max_length=64,
+        null=True,
+        blank=True,
+        verbose_name='Idempotency Key',
+        help_text='Client supplied key of the purchase request'
+    )
 
     class Meta:
-        # Order records by purchase date (newest first)
-        ordering = ['-purchase_date']
+        # Order records by purchase date (newest first), id breaks ties
+        # so cursor pagination always sees a stable order
+        ordering = ['-purchase_date', '-id']
         # Human-readable names for admin interface
         verbose_name = 'Student Premium Content'
         verbose_name_plural = 'Student Premium Content'
         # Ensure each student can only purchase the same content once
         unique_together = ['student', 'content_id' , 'type']
 
+        indexes = [
+            # Seek index for the student's purchase history feed
+            models.Index(fields=['student', 'purchase_date', 'id'], name='premium_student_date_idx'),
+            # Range scan of the expiry sweeper over the records not flagged yet
+            models.Index(fields=['is_expired', 'date_of_expiry', 'id'], name='premium_expiry_idx'),
+        ]
+
+        constraints = [
+            # One purchase per idempotency key of a student (NULL keys are not compared)
+            models.UniqueConstraint(fields=['student', 'idempotency_key'], name='premium_student_idempotency_key'),
+        ]
+
     def __str__(self):
         """
         String representation of the model instance
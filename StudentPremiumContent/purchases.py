@@ -0,0 +1,325 @@
+"""
+Purchase of premium content
+The balance check, the deduction, the StudentPremiumContent insert and the
+teacher commission (posted to the earnings ledger by the signals of the insert)
+happen in one transaction. Buying an expired content again renews its record
+in place and posts the new price as another sale. The deduction is a conditional
+UPDATE ... SET balance = balance - price WHERE balance >= price, so two
+concurrent purchases can never both spend the same balance, and it holds the
+student row lock until the purchase commits
+The price and publisher are read from the package or note being bought, the
+ones sent by the client are ignored
+A client supplied idempotency key makes retries safe: a purchase whose key was
+already used by the student is answered from the stored record without charging again
+checkout() buys a whole cart the same way, with one deduction for the summed price
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from notes.models import Notes
+from profiles.earnings import record_sale, record_sales
+from profiles.models import Profile_Student
+from test_packages.models import TestPackage
+from .entitlements import invalidate
+from .models import StudentPremiumContent
+from .serializers import CreateStudentPremiumContentSerializer
+
+# Longest idempotency key a client can send
+MAX_IDEMPOTENCY_KEY_LENGTH = 64
+
+# Most items bought by one checkout
+MAX_CART_SIZE = 50
+
+CART_CONTENT_TYPES = ('exam', 'note')
+
+# record: the StudentPremiumContent, replayed: whether it was answered from an earlier request
+Purchase = namedtuple('Purchase', ['record', 'previous_balance', 'new_balance', 'replayed'])
+
+
+class PurchaseError(Exception):
+    """
+    Base class of the reasons a purchase is refused, nothing was charged
+    """
+
+
+class StudentNotFound(PurchaseError):
+    pass
+
+
+class InsufficientBalance(PurchaseError):
+    def __init__(self, student, price):
+        super().__init__(student, price)
+        self.student = student
+        self.price = price
+
+
+class InvalidPurchase(PurchaseError):
+    def __init__(self, errors):
+        super().__init__(errors)
+        self.errors = errors
+
+
+class IdempotencyConflict(PurchaseError):
+    """
+    The idempotency key was already used by the student for another content
+    """
+
+
+def _replay(student_id, idempotency_key, data):
+    """
+    Return the purchase made earlier with this key, or None
+    """
+    record = StudentPremiumContent.objects.filter(student_id=student_id, idempotency_key=idempotency_key).first()
+    if record is None:
+        return None
+
+    if str(record.content_id) != str(data.get('content_id')) or record.type != data.get('type'):
+        raise IdempotencyConflict(idempotency_key)
+
+    balance = Profile_Student.objects.values_list('balance', flat=True).get(user_id=student_id)
+    return Purchase(record, balance, balance, True)
+
+
+def expired_record(student_id, data):
+    """
+    Return the expired record of the content the student is buying, locked for the renewal, or None
+    """
+    try:
+        content_id = int(data.get('content_id'))
+    except (TypeError, ValueError):
+        # Refused by the serializer
+        return None
+    return StudentPremiumContent.objects.select_for_update().filter(
+        student_id=student_id, type=data.get('type'), content_id=content_id, date_of_expiry__lt=timezone.localdate()
+    ).first()
+
+
+def renew(record, **fields):
+    """
+    Renew an expired record in place with the fields of the new purchase
+    The record keeps its id, so the earnings of the earlier purchase stay in the
+    ledger, and the new price is posted as a sale of its own
+    """
+    paid = record.price if record.total_paid is None else record.total_paid
+    for field, value in fields.items():
+        setattr(record, field, value)
+    record.total_paid = paid + record.price
+    record.purchase_date = timezone.localdate()
+    record.is_expired = False
+    record.save()
+    record_sale(record)
+    return record
+
+
+def _content_terms(data):
+    """
+    Return (price, publisher_id) of the package or note data is buying
+    """
+    model = {'exam': TestPackage, 'note': Notes}.get(data.get('type'))
+    if model is None:
+        raise InvalidPurchase({'type': ["نوع محتوى غير صحيح. يجب أن يكون إما 'exam' أو 'note'"]})
+    try:
+        content_id = int(data.get('content_id'))
+    except (TypeError, ValueError):
+        raise InvalidPurchase({'content_id': ['معرف المحتوى يجب أن يكون رقماً صحيحاً']})
+
+    terms = model.objects.filter(id=content_id).values_list('price', 'publisher_id').first()
+    if terms is None:
+        raise InvalidPurchase({'content_id': ['المحتوى غير موجود']})
+    return terms
+
+
+def purchase(data, idempotency_key=None):
+    """
+    Charge the student data['student'] the price of the content and create the premium content record
+    data holds the fields of CreateStudentPremiumContentSerializer, its price
+    and publisher_id are replaced by those of the package or note
+    Raises a PurchaseError subclass when the purchase is refused
+    """
+    student_id = data['student']
+
+    if idempotency_key:
+        replayed = _replay(student_id, idempotency_key, data)
+        if replayed is not None:
+            return replayed
+
+    price, publisher_id = _content_terms(data)
+    data = data.copy()
+    data['price'] = price
+    data['publisher_id'] = publisher_id
+
+    try:
+        with transaction.atomic():
+            # Deduct only if the balance covers the price, in the same statement
+            charged = Profile_Student.objects.filter(user_id=student_id, balance__gte=price).update(
+                balance=F('balance') - price
+            )
+            if not charged:
+                student = Profile_Student.objects.filter(user_id=student_id).first()
+                if student is None:
+                    raise StudentNotFound(student_id)
+                raise InsufficientBalance(student, price)
+
+            # Buying an expired content again renews its record (it is kept after expiry)
+            expired = expired_record(student_id, data)
+
+            # Refusing the record rolls the deduction back with it
+            serializer = CreateStudentPremiumContentSerializer(expired, data=data)
+            if not serializer.is_valid():
+                raise InvalidPurchase(serializer.errors)
+            if expired is None:
+                record = serializer.save(idempotency_key=idempotency_key or None)
+            else:
+                record = renew(expired, idempotency_key=idempotency_key or None, **serializer.validated_data)
+
+            new_balance = Profile_Student.objects.values_list('balance', flat=True).get(user_id=student_id)
+    except (IntegrityError, PurchaseError) as e:
+        # The same request sent concurrently (a retry) may have committed first,
+        # this one then failed the balance or the unique checks because of it
+        if idempotency_key:
+            replayed = _replay(student_id, idempotency_key, data)
+            if replayed is not None:
+                return replayed
+        if isinstance(e, PurchaseError):
+            raise
+        raise InvalidPurchase({'non_field_errors': ['هذا الطالب لديه بالفعل وصول مميز لهذا المحتوى.']})
+
+    return Purchase(record, new_balance + price, new_balance, False)
+
+
+def _cart_items(items):
+    """
+    Parse the (type, content_id) items of a cart, refusing the whole cart on the first bad item
+    Returns the distinct (type, content_id) pairs in order
+    """
+    if not isinstance(items, list) or not items:
+        raise InvalidPurchase({'items': ['يجب أن تحتوي السلة على عنصر واحد على الأقل']})
+    if len(items) > MAX_CART_SIZE:
+        raise InvalidPurchase({'items': [f'لا يمكن شراء أكثر من {MAX_CART_SIZE} عنصراً في طلب واحد']})
+
+    keys = []
+    for item in items:
+        try:
+            key = (item['type'], int(item['content_id']))
+        except (KeyError, TypeError, ValueError):
+            raise InvalidPurchase({'items': [f'عنصر غير صحيح: {item}']})
+        if key[0] not in CART_CONTENT_TYPES:
+            raise InvalidPurchase({'items': [f"نوع محتوى غير صحيح: {key[0]}"]})
+        if key not in keys:
+            keys.append(key)
+    return keys
+
+
+def _cart_contents(keys):
+    """
+    Load the packages and notes of the cart, one query per content type
+    Returns {(type, content_id): (name, content)}
+    """
+    contents = {}
+    for content_type, model, name_field in (('exam', TestPackage, 'package_name'), ('note', Notes, 'title')):
+        ids = [content_id for key_type, content_id in keys if key_type == content_type]
+        if not ids:
+            continue
+        rows = model.objects.filter(id__in=ids).only(
+            'id', name_field, 'subject_name', 'Class', 'price', 'publisher_id', 'publisher_name'
+        )
+        for content in rows:
+            contents[(content_type, content.id)] = (getattr(content, name_field), content)
+
+    missing = [key for key in keys if key not in contents]
+    if missing:
+        raise InvalidPurchase({'items': [f'المحتوى غير موجود: {content_type} {content_id}' for content_type, content_id in missing]})
+    return contents
+
+
+def _owned(student_id, keys):
+    """
+    Records of the student for any content of the cart, in one query
+    """
+    condition = Q()
+    for content_type in CART_CONTENT_TYPES:
+        ids = [content_id for key_type, content_id in keys if key_type == content_type]
+        if ids:
+            condition |= Q(type=content_type, content_id__in=ids)
+    return StudentPremiumContent.objects.filter(condition, student_id=student_id)
+
+
+def checkout(student_id, items, date_of_expiry):
+    """
+    Buy every (type, content_id) of items for the student, all or nothing
+    Names, prices and publishers come from the packages and notes themselves.
+    The summed price is deducted with one conditional UPDATE, the records are
+    inserted with one INSERT and their commissions posted to the earnings
+    ledger with another, all in one transaction. Expired records of the cart
+    are renewed in place (renew())
+    A resent cart is refused as already bought, it is never charged twice
+    Returns a Purchase whose record is the list of created records
+    Raises a PurchaseError subclass when the cart is refused
+    """
+    keys = _cart_items(items)
+    contents = _cart_contents(keys)
+    total = sum(content.price for _, content in contents.values())
+
+    try:
+        with transaction.atomic():
+            # Every item is validated against the student's records at once, locked
+            # so a concurrent checkout sees the renewals of this one
+            today = timezone.localdate()
+            owned = list(_owned(student_id, keys).select_for_update())
+            active = [record for record in owned if record.date_of_expiry >= today]
+            if active:
+                raise InvalidPurchase({'items': [
+                    f'هذا الطالب لديه بالفعل وصول مميز لهذا المحتوى: {record.content_name}' for record in active
+                ]})
+
+            charged = Profile_Student.objects.filter(user_id=student_id, balance__gte=total).update(
+                balance=F('balance') - total
+            )
+            if not charged:
+                student = Profile_Student.objects.filter(user_id=student_id).first()
+                if student is None:
+                    raise StudentNotFound(student_id)
+                raise InsufficientBalance(student, total)
+            new_balance, student_name = Profile_Student.objects.values_list('balance', 'full_name').get(user_id=student_id)
+
+            def fields(name, content):
+                return dict(
+                    student_name=student_name,
+                    Class=content.Class,
+                    subject_name=content.subject_name,
+                    content_name=name,
+                    publisher_id_id=content.publisher_id,
+                    publisher_name=content.publisher_name,
+                    price=content.price,
+                    date_of_expiry=date_of_expiry,
+                )
+
+            # Expired records of the cart are renewed in place, like purchase() does
+            renewed = {(record.type, record.content_id): record for record in owned}
+            for key, record in renewed.items():
+                renew(record, **fields(*contents[key]))
+
+            StudentPremiumContent.objects.bulk_create([
+                StudentPremiumContent(
+                    student_id=student_id, type=content_type, content_id=content_id,
+                    **fields(name, content),
+                )
+                for (content_type, content_id), (name, content) in contents.items()
+                if (content_type, content_id) not in renewed
+            ])
+
+            # Read back for the ids, bulk_create does not set them on MySQL
+            records = list(_owned(student_id, keys).order_by('id'))
+            record_sales([record for record in records if (record.type, record.content_id) not in renewed])
+    except IntegrityError:
+        # A concurrent purchase of the same content won, or a publisher has no teacher profile
+        raise InvalidPurchase({'non_field_errors': ['تعذر إتمام الشراء، أحد عناصر السلة تم شراؤه بالفعل أو غير صالح']})
+
+    # bulk_create sends no signals, drop the cached entitlements here
+    invalidate(student_id)
+    transaction.on_commit(lambda: invalidate(student_id))
+
+    return Purchase(records, new_balance + total, new_balance, False)
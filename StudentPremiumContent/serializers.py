@@ -11,7 +11,7 @@ class StudentPremiumContentSerializer(serializers.ModelSerializer):
     """
     # Computed fields that get data from related student profile
     student_name = serializers.CharField(source='student.full_name', read_only=True)
-    student_email = serializers.CharField(source='student.email', read_only=True)
+    student_email = serializers.CharField(source='student.user.email', read_only=True)
     
     class Meta:
         model = StudentPremiumContent
@@ -91,7 +91,7 @@ class StudentPremiumContentFilterSerializer(serializers.ModelSerializer):
     def get_is_expired(self, obj):
         """
         Method to check if the premium content has expired
-        Compares the expiry date with current time
+        Compares the expiry date with today, the sweeper may not have flagged it yet
         """
         from django.utils import timezone
-        return obj.date_of_expiry < timezone.now()
+        return obj.is_expired or obj.date_of_expiry < timezone.localdate()
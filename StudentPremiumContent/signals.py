@@ -0,0 +1,42 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from notes.models import Notes
+from test_packages.models import TestPackage
+from .entitlements import invalidate, invalidate_content_terms
+from .models import StudentPremiumContent
+
+
+@receiver(post_save, sender=StudentPremiumContent)
+@receiver(post_delete, sender=StudentPremiumContent)
+def drop_entitlements(sender, instance, **kwargs):
+    """
+    Drop the cached entitlements of the student on a purchase, a deletion or an extension
+    Dropped again once committed, a read in between may have cached the old records
+    """
+    student_id = instance.student_id
+    invalidate(student_id)
+    transaction.on_commit(lambda: invalidate(student_id))
+
+
+@receiver(post_save, sender=TestPackage)
+@receiver(post_delete, sender=TestPackage)
+def drop_exam_terms(sender, instance, **kwargs):
+    """
+    Drop the cached price and publisher of a package, again once committed
+    """
+    package_id = instance.id
+    invalidate_content_terms('exam', package_id)
+    transaction.on_commit(lambda: invalidate_content_terms('exam', package_id))
+
+
+@receiver(post_save, sender=Notes)
+@receiver(post_delete, sender=Notes)
+def drop_note_terms(sender, instance, **kwargs):
+    """
+    Drop the cached price and publisher of a note, again once committed
+    """
+    note_id = instance.id
+    invalidate_content_terms('note', note_id)
+    transaction.on_commit(lambda: invalidate_content_terms('note', note_id))
@@ -1,3 +1,398 @@
+from datetime import date, timedelta
+from unittest import mock
+
+from django.core.cache import cache, caches
+from django.db import connection
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from myproject.projection import related_lookups
+from myproject.testing import QueryPlanTestMixin, QueryRecorder, explain, indexes_starting_with
+from notes.models import Notes
+from profiles.earnings import reconcile, rollup
+from profiles.models import EarningsEntry, Profile_Student, Profile_Teacher, TeacherStats
+from test_packages.models import TestPackage
+from users.models import User
+from . import entitlements
+from .expiry import sweep
+from .models import StudentPremiumContent
+from .serializers import StudentPremiumContentSerializer
 
 # Create your tests here.
+
+
+class StudentPremiumContentIndexTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that purchase history and access checks are served by their indexes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher_user = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+        teacher = Profile_Teacher.objects.get(user=teacher_user)
+        students = []
+        for i in range(5):
+            user = User.objects.create(username=f'student{i}', email=f'student{i}@svi.com')
+            students.append(Profile_Student.objects.get(user=user))
+
+        StudentPremiumContent.objects.bulk_create([
+            StudentPremiumContent(
+                student=student,
+                Class='12',
+                type=['exam', 'note'][i % 2],
+                subject_name='math_12',
+                content_id=i,
+                content_name=f'content {i}',
+                publisher_id=teacher,
+                publisher_name='teacher',
+                price=1000,
+                date_of_expiry=date.today() + timedelta(days=30),
+            )
+            for student in students
+            for i in range(60)
+        ])
+        cls.student = students[0]
+
+    def test_purchase_history_uses_student_index(self):
+        self.assertEndpointUsesIndex(
+            f'/StudentPremiumContent/student/{self.student.pk}/',
+            StudentPremiumContent,
+            indexes_starting_with(StudentPremiumContent, 'student_id'),
+            {'count': 2, 'limit': 10},
+        )
+
+    def test_access_check_uses_student_index(self):
+        # The access check loads every entitlement of the student at once
+        caches['shared'].clear()
+        self.assertEndpointUsesIndex(
+            '/StudentPremiumContent/check-purchase/',
+            StudentPremiumContent,
+            indexes_starting_with(StudentPremiumContent, 'student_id'),
+            {'student_id': self.student.pk, 'content_type': 'exam', 'content_id': 4},
+        )
+
+    def test_expiry_sweep_uses_expiry_index(self):
+        with CaptureQueriesContext(connection) as context:
+            sweep()
+
+        selects = [query['sql'] for query in context.captured_queries if query['sql'].startswith('SELECT')]
+        self.assertTrue(selects)
+        for sql in selects:
+            self.assertIn('premium_expiry_idx', {row['key'] for row in explain(sql)}, sql)
+
+
+class PurchaseTests(TestCase):
+    """
+    Purchases charge the balance once, atomically with the record, at the price of the content
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher_user = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+        cls.teacher = Profile_Teacher.objects.get(user=teacher_user)
+        student_user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=student_user)
+        Profile_Student.objects.filter(pk=cls.student.pk).update(balance=1500)
+        cls.package, cls.other_package, cls.cheap, cls.other_cheap = (
+            TestPackage.objects.create(
+                package_name='package', units='unit', subject_name='math_12', price=price,
+                number_of_questions=10, publisher_id=cls.teacher.pk,
+            )
+            for price in (1000, 1000, 10, 10)
+        )
+
+    def buy(self, package, key=None, price=None):
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/StudentPremiumContent/create-with-balance-check/', {
+            'student': self.student.pk, 'price': package.price if price is None else price, 'content_id': package.pk,
+            'content_name': 'package', 'type': 'exam', 'subject_name': 'math_12', 'Class': '12',
+            'publisher_id': self.teacher.pk, 'publisher_name': 'teacher', 'date_of_expiry': '2100-01-01',
+        }, content_type='application/json', **headers)
+
+    def balance(self):
+        return Profile_Student.objects.get(pk=self.student.pk).balance
+
+    def test_retry_with_same_key_is_not_charged_twice(self):
+        first = self.buy(self.package, key='retry-1')
+        retry = self.buy(self.package, key='retry-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertTrue(retry.json()['replayed'])
+        self.assertEqual(retry.json()['premium_content']['id'], first.json()['premium_content']['id'])
+        self.assertEqual(self.balance(), 500)
+        self.assertEqual(StudentPremiumContent.objects.filter(student=self.student).count(), 1)
+
+    def test_key_reused_for_other_content_is_refused(self):
+        self.buy(self.cheap, key='key')
+        self.assertEqual(self.buy(self.other_cheap, key='key').status_code, 409)
+        self.assertEqual(self.balance(), 1490)
+
+    def test_insufficient_balance_is_not_charged(self):
+        self.assertEqual(self.buy(self.package).status_code, 201)
+        response = self.buy(self.other_package)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['current_balance'], 500)
+        self.assertEqual(self.balance(), 500)
+
+    def test_refused_record_rolls_back_the_deduction(self):
+        self.buy(self.cheap)
+
+        # Same content again: the record is refused, the deduction with it
+        response = self.buy(self.cheap)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance(), 1490)
+
+    def test_expired_content_can_be_bought_again(self):
+        self.buy(self.cheap)
+        StudentPremiumContent.objects.filter(student=self.student).update(date_of_expiry=date.today() - timedelta(days=1))
+
+        self.assertEqual(self.buy(self.cheap).status_code, 201)
+        self.assertEqual(self.balance(), 1480)
+        self.assertEqual(StudentPremiumContent.objects.get(student=self.student).date_of_expiry, date(2100, 1, 1))
+
+    def test_renewal_keeps_the_teacher_earnings(self):
+        first = self.buy(self.package).json()['premium_content']
+        StudentPremiumContent.objects.filter(id=first['id']).update(date_of_expiry=date.today() - timedelta(days=1))
+        TestPackage.objects.filter(pk=self.package.pk).update(price=500)
+
+        renewed = self.buy(self.package)
+
+        self.assertEqual(renewed.status_code, 201)
+        record = StudentPremiumContent.objects.get(student=self.student)
+        self.assertEqual((record.id, record.price, record.total_paid), (first['id'], 500, 1500))
+        self.assertEqual(record.date_of_expiry, date(2100, 1, 1))
+        self.assertEqual(self.balance(), 0)
+
+        # The first sale stays, the renewal is a sale of its own
+        entries = EarningsEntry.objects.filter(purchase_id=record.id).order_by('id')
+        self.assertEqual([(entry.amount, entry.is_reversal) for entry in entries], [(700, False), (350, False)])
+        self.assertEqual(reconcile(), {})
+
+        rollup()
+        stats = TeacherStats.objects.get(teacher=self.teacher)
+        self.assertEqual((stats.total_net, stats.number_of_sales, stats.revenue), (1050, 2, 1500))
+
+        # A deletion cancels both sales
+        record.delete()
+        self.assertEqual(EarningsEntry.objects.filter(purchase_id=first['id']).aggregate(net=Sum('amount'))['net'], 0)
+        self.assertEqual(reconcile(), {})
+
+    def test_price_comes_from_the_content(self):
+        response = self.buy(self.package, price=1)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['amount_deducted'], 1000)
+        self.assertEqual(self.balance(), 500)
+        self.assertEqual(StudentPremiumContent.objects.get(student=self.student).price, 1000)
+
+    def test_unknown_content_is_refused(self):
+        missing = TestPackage(pk=self.package.pk + 1000, price=1)
+
+        self.assertEqual(self.buy(missing).status_code, 400)
+        self.assertEqual(self.balance(), 1500)
+
+
+class EntitlementTests(TestCase):
+    """
+    Access checks answer from the cached entitlements, which purchases and deletions drop
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher_user = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+        cls.teacher = Profile_Teacher.objects.get(user=teacher_user)
+        cls.student_user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=cls.student_user)
+        cls.note = Notes.objects.create(title='note', price=1000, content='content', publisher_id=cls.teacher.pk)
+
+    def setUp(self):
+        cache.clear()
+        caches['shared'].clear()
+
+    def buy(self, expiry):
+        return StudentPremiumContent.objects.create(
+            student=self.student, Class='12', type='note', subject_name='math_12', content_id=self.note.pk,
+            content_name='note', publisher_id=self.teacher, publisher_name='teacher', price=1000,
+            date_of_expiry=expiry,
+        )
+
+    def check(self):
+        return self.client.get(f'/StudentPremiumContent/check-access/{self.student.pk}/{self.note.pk}/note/').json()
+
+    def open_note(self):
+        client = APIClient()
+        client.force_authenticate(user=self.student_user)
+        return client.get(f'/notes/GetNoteWithContent/{self.note.pk}/')
+
+    def test_repeat_check_runs_no_query(self):
+        self.check()
+        with self.assertNumQueries(0):
+            self.assertFalse(self.check()['has_access'])
+
+    def test_purchase_and_deletion_drop_the_cache(self):
+        self.assertFalse(self.check()['has_access'])
+
+        record = self.buy(date.today() + timedelta(days=30))
+        self.assertTrue(self.check()['has_access'])
+
+        record.delete()
+        self.assertFalse(self.check()['has_access'])
+
+    def test_purchase_in_another_worker_is_seen(self):
+        # This worker caches the missing entitlement with its own cache connection
+        worker_cache = caches.create_connection('shared')
+        with mock.patch.object(entitlements, 'entitlement_cache', worker_cache):
+            self.assertFalse(self.check()['has_access'])
+
+        # Another worker sells the note and drops the map from the shared backend
+        self.buy(date.today() + timedelta(days=30))
+
+        with mock.patch.object(entitlements, 'entitlement_cache', worker_cache):
+            self.assertTrue(self.check()['has_access'])
+
+    def test_extension_drops_the_cache(self):
+        record = self.buy(date.today() - timedelta(days=1))
+        self.assertFalse(self.check()['has_access'])
+
+        record.date_of_expiry = date.today() + timedelta(days=30)
+        record.save()
+        self.assertTrue(self.check()['has_access'])
+
+    def test_paid_note_needs_an_active_purchase(self):
+        self.assertEqual(self.open_note().status_code, 403)
+
+        self.buy(date.today() - timedelta(days=1))
+        self.assertEqual(self.open_note().status_code, 403)
+
+        StudentPremiumContent.objects.filter(student=self.student).update(date_of_expiry=date.today())
+        caches['shared'].clear()
+        self.assertEqual(self.open_note().status_code, 200)
+
+    def test_expired_purchase_is_reported_not_deleted(self):
+        expired = self.buy(date.today() - timedelta(days=1))
+
+        response = self.client.get('/StudentPremiumContent/check-purchase/', {
+            'student_id': self.student.pk, 'content_type': 'note', 'content_id': self.note.pk,
+        })
+        self.assertTrue(response.json()['is_expired'])
+        self.assertTrue(StudentPremiumContent.objects.filter(id=expired.id).exists())
+
+    def test_sweep_flags_only_expired_records(self):
+        expired = self.buy(date.today() - timedelta(days=1))
+        active = StudentPremiumContent.objects.create(
+            student=self.student, Class='12', type='exam', subject_name='math_12', content_id=1,
+            content_name='package', publisher_id=self.teacher, publisher_name='teacher', price=1000,
+            date_of_expiry=date.today(),
+        )
+
+        self.assertEqual(sweep(batch_size=1), 1)
+        self.assertEqual(sweep(batch_size=1), 0)
+        self.assertTrue(StudentPremiumContent.objects.get(id=expired.id).is_expired)
+        self.assertFalse(StudentPremiumContent.objects.get(id=active.id).is_expired)
+
+
+class CheckoutTests(TestCase):
+    """
+    A cart is charged once for its summed price and bought all or nothing
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher_user = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+        cls.teacher = Profile_Teacher.objects.get(user=teacher_user)
+        student_user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=student_user)
+        Profile_Student.objects.filter(pk=cls.student.pk).update(balance=1500)
+        cls.notes = [
+            Notes.objects.create(title=f'note {i}', price=500, content='content', publisher_id=cls.teacher.pk)
+            for i in range(3)
+        ]
+
+    def checkout(self, notes):
+        return self.client.post('/StudentPremiumContent/checkout/', {
+            'student': self.student.pk, 'date_of_expiry': '2100-01-01',
+            'items': [{'type': 'note', 'content_id': note.pk} for note in notes],
+        }, content_type='application/json')
+
+    def balance(self):
+        return Profile_Student.objects.get(pk=self.student.pk).balance
+
+    def test_cart_is_charged_once(self):
+        response = self.checkout(self.notes[:2])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['amount_deducted'], 1000)
+        self.assertEqual(response.json()['teacher_commissions'], {str(self.teacher.pk): 700})
+        self.assertEqual(self.balance(), 500)
+        self.assertEqual(StudentPremiumContent.objects.filter(student=self.student).count(), 2)
+        self.assertEqual(EarningsEntry.objects.filter(teacher=self.teacher).count(), 2)
+
+    def test_cart_with_owned_item_is_refused_whole(self):
+        self.checkout(self.notes[:1])
+        response = self.checkout(self.notes[:2])
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.balance(), 1000)
+        self.assertEqual(StudentPremiumContent.objects.filter(student=self.student).count(), 1)
+
+    def test_expired_items_are_renewed_in_place(self):
+        self.checkout(self.notes[:1])
+        first = StudentPremiumContent.objects.get(student=self.student)
+        StudentPremiumContent.objects.filter(id=first.id).update(date_of_expiry=date.today() - timedelta(days=1))
+
+        response = self.checkout(self.notes[:2])
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['amount_deducted'], 1000)
+        self.assertEqual(self.balance(), 0)
+        renewed = StudentPremiumContent.objects.get(id=first.id)
+        self.assertEqual((renewed.date_of_expiry, renewed.total_paid), (date(2100, 1, 1), 1000))
+        self.assertEqual(StudentPremiumContent.objects.filter(student=self.student).count(), 2)
+
+        # The first sale keeps its commission, the renewal and the new item add theirs
+        entries = EarningsEntry.objects.filter(teacher=self.teacher)
+        self.assertEqual(sorted(entries.values_list('amount', flat=True)), [350, 350, 350])
+        self.assertFalse(entries.filter(is_reversal=True).exists())
+        self.assertEqual(reconcile(), {})
+
+    def test_cart_over_balance_is_not_charged(self):
+        Profile_Student.objects.filter(pk=self.student.pk).update(balance=1000)
+
+        self.assertEqual(self.checkout(self.notes).status_code, 400)
+        self.assertEqual(self.balance(), 1000)
+        self.assertFalse(StudentPremiumContent.objects.filter(student=self.student).exists())
+
+
+class PremiumContentRelationTests(TestCase):
+    """
+    The premium content details join the student profile and account for the name and email
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        teacher_user = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+        cls.teacher = Profile_Teacher.objects.get(user=teacher_user)
+        student_user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=student_user)
+        cls.record = StudentPremiumContent.objects.create(
+            student=cls.student, Class='12', type='exam', subject_name='math_12', content_id=1,
+            content_name='package', publisher_id=cls.teacher, publisher_name='teacher', price=1000,
+            date_of_expiry=date.today() + timedelta(days=30),
+        )
+
+    def test_source_paths_are_joined(self):
+        select, prefetch = related_lookups(StudentPremiumContentSerializer, StudentPremiumContent)
+
+        self.assertEqual(set(select), {'student', 'student__user'})
+        self.assertEqual(prefetch, [])
+
+    def test_details_render_the_student_in_one_query(self):
+        with QueryRecorder() as recorder:
+            response = self.client.get(f'/StudentPremiumContent/details/{self.record.pk}/')
+
+        self.assertEqual(recorder.queries, 1)
+        self.assertEqual(response.json()['student_email'], 'student@svi.com')
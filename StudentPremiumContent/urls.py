@@ -15,6 +15,9 @@ urlpatterns = [
     # Create premium content with balance check and deduction
     path('create-with-balance-check/', views.create_premium_content_with_balance_check, name='create_premium_content_with_balance_check'),
     
+    # Buy several contents at once with one balance deduction
+    path('checkout/', views.checkout_premium_content, name='checkout_premium_content'),
+    
     # Check if student has premium access to specific content
     path('check-access/<int:student_id>/<int:content_id>/<str:content_type>/', views.check_premium_access, name='check_premium_access'),
     
@@ -4,52 +4,80 @@ from rest_framework.response import Response
 from rest_framework import status, generics
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.views import APIView
-from django.utils import timezone
+from rest_framework.exceptions import ValidationError
 from .models import StudentPremiumContent
 from .serializers import (
     StudentPremiumContentSerializer,
     StudentPremiumContentPreviewSerializer,
     CreateStudentPremiumContentSerializer,
 )    
-from profiles.models import Profile_Student, Profile_Teacher
+from .entitlements import get_entitlement, is_active
+from .purchases import (
+    checkout,
+    purchase,
+    MAX_IDEMPOTENCY_KEY_LENGTH,
+    StudentNotFound,
+    InsufficientBalance,
+    InvalidPurchase,
+    IdempotencyConflict,
+)
+from profiles.stats import commission
+from myproject.pagination import paginate, keyset_paginate, cursor_total, BoundedListMixin, MAX_PAGE_SIZE
+from myproject.projection import optimize, OptimizedQuerysetMixin
 
 
 @api_view(['GET'])
 def get_premium_content_by_student(request, student_id):
     """
     Get premium content for a specific student with pagination following the same pattern as other apps
+    Pass ?cursor= (empty for the first page) to page with cursors instead of count
     """
     try:
         # Get query parameters for pagination and filtering
         count = request.GET.get('count', 1)
         limit = request.GET.get('limit', 10)
         
-        # Filter premium content by student ID
-        queryset = StudentPremiumContent.objects.filter(student_id=student_id)
+        cursor = request.GET.get('cursor')
         
-        # Serialize the data
-        serializer = StudentPremiumContentPreviewSerializer(queryset, many=True)
+        # Filter premium content by student ID
+        queryset = optimize(StudentPremiumContent.objects.filter(student_id=student_id), StudentPremiumContentPreviewSerializer)
         
-        # Apply pagination
-        try:
-            count = int(count)
-            limit = int(limit)
-            begin = (count - 1) * limit
-            end = count * limit
+        # Opt-in cursor pagination seeks on (purchase_date, id) instead of using OFFSET
+        if cursor is not None:
+            try:
+                page, next_cursor, previous_cursor = keyset_paginate(queryset, cursor, limit, 'purchase_date')
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "مؤشر الصفحة غير صحيح"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Ensure bounds are within data length
-            begin = min(begin, len(serializer.data))
-            end = min(end, len(serializer.data))
+            serializer = StudentPremiumContentPreviewSerializer(page, many=True)
             
-            paginated_data = serializer.data[begin:end]
+            return Response(
+                {
+                    'premium_content': serializer.data,
+                    'number_of_premium_content': cursor_total(queryset, cursor),
+                    'next_cursor': next_cursor,
+                    'previous_cursor': previous_cursor
+                },
+                status=status.HTTP_200_OK
+            )
+        
+        # Apply pagination in the database
+        try:
+            page, number_of_premium_content = paginate(queryset, count, limit)
         except (ValueError, TypeError):
-            # If pagination parameters are invalid, return all data
-            paginated_data = serializer.data
+            # If pagination parameters are invalid, return the first page of the maximum size
+            page, number_of_premium_content = paginate(queryset, 1, MAX_PAGE_SIZE)
+        
+        # Serialize only the requested page
+        serializer = StudentPremiumContentPreviewSerializer(page, many=True)
         
         return Response(
             {
-                'premium_content': paginated_data,
-                'number_of_premium_content': len(serializer.data)
+                'premium_content': serializer.data,
+                'number_of_premium_content': number_of_premium_content
             },
             status=status.HTTP_200_OK
         )
@@ -68,7 +96,8 @@ def get_premium_content_details(request, id):
     """
     try:
         # Find the premium content or return 404 if not found
-        premium_content = get_object_or_404(StudentPremiumContent, id=id)
+        # with the student profile and account joined for the name and email
+        premium_content = get_object_or_404(optimize(StudentPremiumContent.objects.all(), StudentPremiumContentSerializer), id=id)
         
         # Serialize the data
         serializer = StudentPremiumContentSerializer(premium_content)
@@ -126,13 +155,15 @@ def create_premium_content_with_balance_check(request):
     """
     Create a new premium content record for a student with balance validation.
     This endpoint checks if the student has sufficient balance, deducts it, and creates the premium content.
+    Everything happens in one transaction (see purchases.py), send an Idempotency-Key header
+    (or an idempotency_key field) so a retried request is not charged twice
     """
     try:
         # Copy request data to avoid modifying original data
         data = request.data.copy()
-        
-        # Validate required fields
-        required_fields = ['student', 'price', 'content_id', 'content_name', 'type', 'subject_name', 'Class', 'publisher_id', 'publisher_name', 'date_of_expiry']
+
+        # Validate required fields, the price and publisher are taken from the package or note
+        required_fields = ['student', 'content_id', 'content_name', 'type', 'subject_name', 'Class', 'publisher_name', 'date_of_expiry']
         for field in required_fields:
             if field not in data:
                 return Response(
@@ -141,121 +172,204 @@ def create_premium_content_with_balance_check(request):
                     },
                     status=status.HTTP_400_BAD_REQUEST
                 )
-        
-        # Get student profile and check if exists
+
+        # Idempotency key of the request, the header wins over the field
+        idempotency_key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+        if idempotency_key and len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+            return Response(
+                {
+                    "error": "مفتاح عدم التكرار طويل جداً"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        # Charge the student and create the premium content record in one transaction
         try:
-            student = Profile_Student.objects.get(user_id=data['student'])
-        except Profile_Student.DoesNotExist:
+            result = purchase(data, idempotency_key)
+        except StudentNotFound:
             return Response(
                 {
                     "error": "لم يتم العثور على الطالب"
                 },
                 status=status.HTTP_404_NOT_FOUND
             )
-        
-        # Convert price to integer for comparison
-        try:
-            price = int(data['price'])
-        except (ValueError, TypeError):
+        except InsufficientBalance as e:
             return Response(
                 {
-                    "error": "تنسيق السعر غير صحيح. يجب أن يكون السعر رقماً"
+                    "success": False,
+                    "error": "رصيد غير كافي",
+                    "current_balance": e.student.balance,
+                    "required_price": e.price,
+                    "student_id": e.student.user_id,
+                    "student_name": e.student.full_name
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Check if student has sufficient balance
-        if student.balance < price:
+        except InvalidPurchase as e:
+            # Nothing was deducted, the transaction rolled back
             return Response(
                 {
                     "success": False,
-                    "error": "رصيد غير كافي",
-                    "current_balance": student.balance,
-                    "required_price": price,
-                    "student_id": student.user_id,
-                    "student_name": student.full_name
+                    "error": "فشل في إنشاء المحتوى المميز",
+                    "validation_errors": e.errors,
+                    "balance_refunded": True
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        
-        # Deduct balance from student account
-        previous_balance = student.balance
-        student.balance -= price
-        student.save()
-        
-        # Create premium content record
-        serializer = CreateStudentPremiumContentSerializer(data=data)
-        
-        if serializer.is_valid():
-            # Save premium content to database
-            premium_content = serializer.save()
-            
-            # Increase teacher balance by 70% of the price
-            try:
-                # Find teacher profile using publisher ID
-                teacher = Profile_Teacher.objects.get(user_id=data['publisher_id'])
-                
-                # Calculate teacher commission (70% of price)
-                teacher_commission = int(price * 0.7)
-                
-                # Add commission to teacher's total net earnings
-                teacher.total_net += teacher_commission
-                teacher.save()
-            except Profile_Teacher.DoesNotExist:
-                # Log the error but don't fail the transaction
-                pass
-            except Exception as e:
-                # Log the error but don't fail the transaction
-                pass
-            
-            # Get the created instance with full data
-            created_instance = StudentPremiumContent.objects.get(id=premium_content.id)
-            full_serializer = StudentPremiumContentSerializer(created_instance)
-            
+        except IdempotencyConflict:
             return Response(
                 {
-                    "success": True,
-                    "message": "تم إنشاء المحتوى المميز بنجاح",
-                    "balance_deducted": True,
-                    "previous_balance": previous_balance,
-                    "new_balance": student.balance,
-                    "amount_deducted": price,
-                    "teacher_commission_added": teacher_commission if 'teacher_commission' in locals() else None,
-                    "premium_content": full_serializer.data
+                    "error": "مفتاح عدم التكرار مستخدم لمحتوى آخر"
                 },
-                status=status.HTTP_201_CREATED
+                status=status.HTTP_409_CONFLICT
             )
-        else:
-            # If premium content creation fails, refund the balance
-            student.balance = previous_balance
-            student.save()
-            
+
+        # Get the created instance with full data
+        created_instance = optimize(StudentPremiumContent.objects.all(), StudentPremiumContentSerializer).get(id=result.record.id)
+        full_serializer = StudentPremiumContentSerializer(created_instance)
+
+        return Response(
+            {
+                "success": True,
+                "message": "تم إنشاء المحتوى المميز بنجاح",
+                "balance_deducted": not result.replayed,
+                "replayed": result.replayed,
+                "previous_balance": result.previous_balance,
+                "new_balance": result.new_balance,
+                "amount_deducted": 0 if result.replayed else result.previous_balance - result.new_balance,
+                # Teacher commission (70% of price), credited to the teacher's
+                # total net earnings by the TeacherStats signals of the new record
+                "teacher_commission_added": None if result.replayed else commission(result.record.price),
+                "premium_content": full_serializer.data
+            },
+            status=status.HTTP_200_OK if result.replayed else status.HTTP_201_CREATED
+        )
+
+    except Exception as e:
+        return Response(
+            {"error": f"فشل في إنشاء المحتوى المميز: {str(e)}"},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+
+@api_view(['POST'])
+def checkout_premium_content(request):
+    """
+    Buy several premium contents for a student in one request
+    Body: student, date_of_expiry and items, a list of {"type": "exam" | "note", "content_id": id}
+    Names, prices and publishers are read from the contents. The summed price is
+    deducted once and every record is created in one transaction, a cart with one
+    invalid item is refused as a whole (see purchases.checkout)
+    """
+    try:
+        data = request.data
+
+        # Validate required fields
+        for field in ['student', 'items', 'date_of_expiry']:
+            if field not in data:
+                return Response(
+                    {
+                        "error": f"الحقل المطلوب مفقود: {field}"
+                    },
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+        date_field = CreateStudentPremiumContentSerializer().fields['date_of_expiry']
+        try:
+            student_id = int(data['student'])
+            date_of_expiry = date_field.to_internal_value(data['date_of_expiry'])
+        except (ValueError, TypeError, ValidationError):
+            return Response(
+                {
+                    "error": "تنسيق الطالب أو تاريخ الانتهاء غير صحيح"
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            result = checkout(student_id, data['items'], date_of_expiry)
+        except StudentNotFound:
+            return Response(
+                {
+                    "error": "لم يتم العثور على الطالب"
+                },
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except InsufficientBalance as e:
             return Response(
                 {
                     "success": False,
-                    "error": "فشل في إنشاء المحتوى المميز",
-                    "validation_errors": serializer.errors,
+                    "error": "رصيد غير كافي",
+                    "current_balance": e.student.balance,
+                    "required_price": e.price,
+                    "student_id": e.student.user_id,
+                    "student_name": e.student.full_name
+                },
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except InvalidPurchase as e:
+            return Response(
+                {
+                    "success": False,
+                    "error": "فشل في إتمام الشراء",
+                    "validation_errors": e.errors,
                     "balance_refunded": True
                 },
                 status=status.HTTP_400_BAD_REQUEST
             )
-            
+
+        # Teacher commissions of the cart grouped by publisher, credited through the earnings ledger
+        commissions = {}
+        for record in result.record:
+            commissions[record.publisher_id_id] = commissions.get(record.publisher_id_id, 0) + commission(record.price)
+
+        return Response(
+            {
+                "success": True,
+                "message": "تم إتمام الشراء بنجاح",
+                "previous_balance": result.previous_balance,
+                "new_balance": result.new_balance,
+                "amount_deducted": result.previous_balance - result.new_balance,
+                "teacher_commissions": commissions,
+                "premium_content": StudentPremiumContentPreviewSerializer(result.record, many=True).data
+            },
+            status=status.HTTP_201_CREATED
+        )
+
     except Exception as e:
-        # If any error occurs, try to refund the balance if it was deducted
-        if 'student' in locals() and 'previous_balance' in locals():
-            try:
-                student.balance = previous_balance
-                student.save()
-            except:
-                pass
-        
         return Response(
-            {"error": f"فشل في إنشاء المحتوى المميز: {str(e)}"},
+            {"error": f"فشل في إتمام الشراء: {str(e)}"},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
 
+def access_answer(premium_content):
+    """
+    Body of check-access for the entitlement of the student to the content (None when there is none)
+    Shared by the DRF view and its async twin (async_views.py)
+    """
+    if premium_content:
+        # Check if the content has expired
+        if not is_active(premium_content):
+            # Content has expired, return false access
+            return {
+                "has_access": False,
+                "reason": "انتهت صلاحية المحتوى المميز",
+                "expiry_date": premium_content['date_of_expiry']
+            }
+        # Content is still valid, return true access
+        return {
+            "has_access": True,
+            "premium_content": premium_content
+        }
+
+    # No premium content record found for this student and content
+    return {
+        "has_access": False,
+        "reason": "لم يتم العثور على محتوى مميز"
+    }
+
+
 @api_view(['GET'])
 def check_premium_access(request, student_id, content_id , content_type):
     """
@@ -264,47 +378,10 @@ def check_premium_access(request, student_id, content_id , content_type):
     """
     
     try:
-        # Get current time
-        current_time = timezone.now()
+        # Answered from the cached entitlements of the student
+        premium_content = get_entitlement(student_id, content_type, content_id)
         
-        # First, check if the student has any premium content record for this content
-        premium_content = StudentPremiumContent.objects.filter(
-            student_id=student_id,
-            content_id=content_id ,
-            type = content_type,
-        ).first()
-        
-        if premium_content:
-            # Check if the content has expired
-            if premium_content.date_of_expiry < current_time:
-                # Content has expired, return false access
-                return Response(
-                    {
-                        "has_access": False,
-                        "reason": "انتهت صلاحية المحتوى المميز",
-                        "expiry_date": premium_content.date_of_expiry
-                    },
-                    status=status.HTTP_200_OK
-                )
-            else:
-                # Content is still valid, return true access
-                serializer = StudentPremiumContentSerializer(premium_content)
-                return Response(
-                    {
-                        "has_access": True,
-                        "premium_content": serializer.data
-                    },
-                    status=status.HTTP_200_OK
-                )
-        else:
-            # No premium content record found for this student and content
-            return Response(
-                {
-                    "has_access": False,
-                    "reason": "لم يتم العثور على محتوى مميز"
-                },
-                status=status.HTTP_200_OK
-            )
+        return Response(access_answer(premium_content), status=status.HTTP_200_OK)
             
     except Exception as e:
         return Response(
@@ -313,6 +390,76 @@ def check_premium_access(request, student_id, content_id , content_type):
         )
 
 
+def purchase_question(params):
+    """
+    Validate the query parameters of check-purchase
+    Returns ((student_id, content_type, content_id), None), or (None, error body) when they are invalid
+    Shared by the DRF view and its async twin (async_views.py)
+    """
+    # Get query parameters
+    student_id = params.get('student_id')
+    content_type = params.get('content_type')
+    content_id = params.get('content_id')
+    
+    # Validate required parameters
+    if not student_id or not content_type or not content_id:
+        return None, {
+            "error": "معاملات مطلوبة مفقودة. يرجى توفير student_id و content_type و content_id"
+        }
+    
+    # Validate content_type
+    if content_type not in ['exam', 'note']:
+        return None, {
+            "error": "نوع محتوى غير صحيح. يجب أن يكون إما 'exam' أو 'note'"
+        }
+    
+    # Convert IDs to integers
+    try:
+        student_id = int(student_id)
+        content_id = int(content_id)
+    except ValueError:
+        return None, {
+            "error": "تنسيق معرف غير صحيح. يجب أن تكون student_id و content_id أرقام صحيحة"
+        }
+
+    return (student_id, content_type, content_id), None
+
+
+def purchase_answer(premium_content):
+    """
+    Body of check-purchase for the record of the student for the content (None when there is none)
+    Shared by the DRF view and its async twin (async_views.py)
+    """
+    if premium_content:
+        # Check if the content has expired
+        if not is_active(premium_content):
+            # Reported only, `manage.py sweep_expired_premium_content` flags expired records
+            return {
+                "has_purchased": True,
+                "is_expired": True,
+                "reason": "انتهت صلاحية المحتوى",
+                "purchase_date": premium_content['purchase_date'],
+                "expiry_date": premium_content['date_of_expiry'],
+                "content_name": premium_content['content_name'],
+                "subject_name": premium_content['subject_name']
+            }
+        return {
+            "has_purchased": True,
+            "is_expired": False,
+            "purchase_date": premium_content['purchase_date'],
+            "expiry_date": premium_content['date_of_expiry'],
+            "content_name": premium_content['content_name'],
+            "subject_name": premium_content['subject_name']
+        }
+
+    # No purchase record found
+    return {
+        "has_purchased": False,
+        "is_expired": False,
+        "reason": "لم يتم العثور على سجل شراء لهذا المحتوى"
+    }
+
+
 @api_view(['GET'])
 def check_content_purchase(request):
     """
@@ -323,91 +470,14 @@ def check_content_purchase(request):
     - content_id: ID of the specific content
     """
     try:
-        # Get query parameters
-        student_id = request.GET.get('student_id')
-        content_type = request.GET.get('content_type')
-        content_id = request.GET.get('content_id')
-        
-        # Validate required parameters
-        if not student_id or not content_type or not content_id:
-            return Response(
-                {
-                    "error": "معاملات مطلوبة مفقودة. يرجى توفير student_id و content_type و content_id"
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Validate content_type
-        if content_type not in ['exam', 'note']:
-            return Response(
-                {
-                    "error": "نوع محتوى غير صحيح. يجب أن يكون إما 'exam' أو 'note'"
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        # Convert IDs to integers
-        try:
-            student_id = int(student_id)
-            content_id = int(content_id)
-        except ValueError:
-            return Response(
-                {
-                    "error": "تنسيق معرف غير صحيح. يجب أن تكون student_id و content_id أرقام صحيحة"
-                },
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        question, error = purchase_question(request.GET)
+        if error:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get current time
-        current_time = timezone.now()
+        # Check if the student has purchased this specific content, from the cached entitlements
+        premium_content = get_entitlement(*question)
         
-        # Check if the student has purchased this specific content
-        premium_content = StudentPremiumContent.objects.filter(
-            student_id=student_id,
-            type=content_type,
-            content_id=content_id
-        ).first()
-        
-        if premium_content:
-            # Check if the content has expired
-            if premium_content.date_of_expiry < current_time.date():
-                # Store content info before deletion
-                content_info = {
-                    "has_purchased": True,
-                    "is_expired": True,
-                    "reason": "انتهت صلاحية المحتوى وتم حذفه",
-                    "purchase_date": premium_content.purchase_date,
-                    "expiry_date": premium_content.date_of_expiry,
-                    "content_name": premium_content.content_name,
-                    "subject_name": premium_content.subject_name
-                }
-                
-                # Delete the expired content from the database
-                premium_content.delete()
-                
-                return Response(content_info, status=status.HTTP_200_OK)
-            else:
-                return Response(
-                    {
-                        "has_purchased": True,
-                        "is_expired": False,
-                        "purchase_date": premium_content.purchase_date,
-                        "expiry_date": premium_content.date_of_expiry,
-                        "content_name": premium_content.content_name,
-                        "subject_name": premium_content.subject_name
-                    },
-                    status=status.HTTP_200_OK
-                )
-        else:
-            # No purchase record found
-            return Response(
-                {
-                    "has_purchased": False,
-                    "is_expired": False,
-                    "reason": "لم يتم العثور على سجل شراء لهذا المحتوى"
-                },
-                status=status.HTTP_200_OK
-            )
+        return Response(purchase_answer(premium_content), status=status.HTTP_200_OK)
             
     except Exception as e:
         return Response(
@@ -417,7 +487,7 @@ def check_content_purchase(request):
 
 
 # Generic views for CRUD operations
-class StudentPremiumContentListCreateView(generics.ListCreateAPIView):
+class StudentPremiumContentListCreateView(BoundedListMixin, OptimizedQuerysetMixin, generics.ListCreateAPIView):
     """
     Generic view for listing and creating StudentPremiumContent
     """
@@ -431,7 +501,7 @@ class StudentPremiumContentListCreateView(generics.ListCreateAPIView):
         return StudentPremiumContentSerializer
 
 
-class StudentPremiumContentDetailView(generics.RetrieveUpdateDestroyAPIView):
+class StudentPremiumContentDetailView(OptimizedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Generic view for retrieving, updating, and deleting StudentPremiumContent
     """
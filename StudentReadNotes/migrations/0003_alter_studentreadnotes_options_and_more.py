@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('StudentReadNotes', '0002_alter_studentreadnotes_note_id_and_more'),
+        ('notes', '0013_alter_notes_options'),
+        ('profiles', '0020_alter_profile_teacher_class'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='studentreadnotes',
+            options={'ordering': ['-last_read_at', '-id'], 'verbose_name': 'Student Read Note', 'verbose_name_plural': 'Student Read Notes'},
+        ),
+        migrations.AddIndex(
+            model_name='studentreadnotes',
+            index=models.Index(fields=['student', 'last_read_at', 'id'], name='readnotes_student_date_idx'),
+        ),
+    ]
@@ -90,8 +90,14 @@ class StudentReadNotes(models.Model):
         # Prevents duplicate read records for the same student-note combination
         unique_together = ['student', 'note_id']
         
-        # Default ordering by last read time (most recent first)
-        ordering = ['-last_read_at']
+        # Default ordering by last read time (most recent first), id breaks ties
+        # so cursor pagination always sees a stable order
+        ordering = ['-last_read_at', '-id']
+
+        indexes = [
+            # Seek index for the student's reading history feed
+            models.Index(fields=['student', 'last_read_at', 'id'], name='readnotes_student_date_idx'),
+        ]
 
     def __str__(self):
         """
@@ -1,3 +1,87 @@
 from django.test import TestCase
 
+from myproject.projection import related_lookups
+from myproject.testing import QueryPlanTestMixin, QueryRecorder, indexes_starting_with
+from notes.models import Notes
+from profiles.models import Profile_Student
+from users.models import User
+from .models import StudentReadNotes
+from .serializers import StudentReadNotesPreviewSerializer
+
 # Create your tests here.
+
+
+class StudentReadNotesIndexTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that the reading history is read through a student index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        notes = Notes.objects.bulk_create([
+            Notes(title=f'note {i}', content='content') for i in range(60)
+        ])
+        students = []
+        for i in range(5):
+            user = User.objects.create(username=f'student{i}', email=f'student{i}@svi.com')
+            students.append(Profile_Student.objects.get(user=user))
+
+        StudentReadNotes.objects.bulk_create([
+            StudentReadNotes(
+                student=student,
+                subject_name='math_12',
+                note_name=note.title,
+                note_id=note,
+                publisher_id=1,
+                publisher_name='SVI',
+            )
+            for student in students
+            for note in notes
+        ])
+        cls.student = students[0]
+
+    def test_read_notes_page_uses_seek_index(self):
+        self.assertEndpointUsesIndex(
+            f'/StudentReadNotes/get_read_notes/{self.student.pk}/',
+            StudentReadNotes,
+            indexes_starting_with(StudentReadNotes, 'student_id'),
+            {'count': 2, 'limit': 10},
+        )
+
+
+class ReadNotesRelationTests(TestCase):
+    """
+    Check that the reading history joins the student and the note instead of querying them per row
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        notes = Notes.objects.bulk_create([Notes(title=f'note {i}', content='content') for i in range(30)])
+        user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=user)
+        Profile_Student.objects.filter(pk=cls.student.pk).update(full_name='Student Name')
+        StudentReadNotes.objects.bulk_create([
+            StudentReadNotes(student=cls.student, subject_name='math_12', note_name=note.title, note_id=note,
+                             publisher_id=1, publisher_name='SVI')
+            for note in notes
+        ])
+
+    def test_source_paths_are_joined(self):
+        select, prefetch = related_lookups(StudentReadNotesPreviewSerializer, StudentReadNotes)
+
+        self.assertCountEqual(select, ['student', 'note_id'])
+        self.assertEqual(prefetch, [])
+
+    def test_page_cost_does_not_grow_with_its_size(self):
+        costs = []
+        for limit in (5, 30):
+            with QueryRecorder() as recorder:
+                response = self.client.get(
+                    f'/StudentReadNotes/get_read_notes/{self.student.pk}/', {'count': 1, 'limit': limit}
+                ).json()
+            costs.append(recorder.queries)
+            self.assertEqual(len(response['read_notes']), limit)
+
+        self.assertEqual(costs, [2, 2])
+        self.assertEqual(response['read_notes'][0]['student_full_name'], 'Student Name')
+        self.assertTrue(response['read_notes'][0]['note_title'].startswith('note '))
@@ -9,6 +9,8 @@ from .serializers import (
     CreateStudentReadNotesSerializer,
     StudentReadNotesPreviewSerializer
 )
+from myproject.pagination import paginate, keyset_paginate, cursor_total, BoundedListMixin, MAX_PAGE_SIZE
+from myproject.projection import optimize, OptimizedQuerysetMixin
 
 @api_view(['POST'])
 def create_student_read_note(request):
@@ -46,7 +48,7 @@ def create_student_read_note(request):
                 # Save the new record to database
                 serializer.save()
                 # Get the created instance with full data for response
-                created_instance = StudentReadNotes.objects.get(id=serializer.instance.id)
+                created_instance = optimize(StudentReadNotes.objects.all(), StudentReadNotesSerializer).get(id=serializer.instance.id)
                 full_serializer = StudentReadNotesSerializer(created_instance)
                 return Response(
                     {
@@ -98,41 +100,55 @@ def get_read_notes(request, student_id):
     Get StudentReadNotes for a specific student with pagination
     Returns paginated list of notes read by the student
     Follows the same pagination pattern as other apps
+    Pass ?cursor= (empty for the first page) to page with cursors instead of count
     """
     try:
         # Get query parameters for pagination
         count = request.GET.get('count', 1)
         limit = request.GET.get('limit', 10)
         
-        # Filter read notes by student ID
-        # This gets all notes that the student has read
-        queryset = StudentReadNotes.objects.filter(student_id=student_id)
+        cursor = request.GET.get('cursor')
         
-        # Serialize the data using preview serializer
-        serializer = StudentReadNotesPreviewSerializer(queryset, many=True)
+        # Filter read notes by student ID
+        # This gets all notes that the student has read, with the student and note joined
+        queryset = optimize(StudentReadNotes.objects.filter(student_id=student_id), StudentReadNotesPreviewSerializer)
         
-        # Apply pagination to the results
-        try:
-            count = int(count)
-            limit = int(limit)
-            begin = (count - 1) * limit
-            end = count * limit
+        # Opt-in cursor pagination seeks on (last_read_at, id) instead of using OFFSET
+        if cursor is not None:
+            try:
+                page, next_cursor, previous_cursor = keyset_paginate(queryset, cursor, limit, 'last_read_at')
+            except (ValueError, TypeError):
+                return Response(
+                    {"error": "مؤشر الصفحة غير صحيح"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
-            # Ensure pagination bounds are within data length
-            begin = min(begin, len(serializer.data))
-            end = min(end, len(serializer.data))
+            serializer = StudentReadNotesPreviewSerializer(page, many=True)
             
-            paginated_data = serializer.data[begin:end]
+            return Response(
+                {
+                    'read_notes': serializer.data,
+                    'number_of_read_notes': cursor_total(queryset, cursor),
+                    'next_cursor': next_cursor,
+                    'previous_cursor': previous_cursor,
+                },
+                status=status.HTTP_200_OK
+            )
+        
+        # Apply pagination in the database
+        try:
+            page, number_of_read_notes = paginate(queryset, count, limit)
         except (ValueError, TypeError):
-            # If pagination parameters are invalid, return all data
-            paginated_data = serializer.data
-            count = 1
-            limit = 7
+            # If pagination parameters are invalid, return the first page of the maximum size
+            page, number_of_read_notes = paginate(queryset, 1, MAX_PAGE_SIZE)
+        
+        # Serialize only the requested page using preview serializer
+        serializer = StudentReadNotesPreviewSerializer(page, many=True)
         
         return Response(
             {
-                'read_notes': paginated_data,
-                'number_of_read_notes': len(serializer.data),
+                'read_notes': serializer.data,
+                'number_of_read_notes': number_of_read_notes,
             },
             status=status.HTTP_200_OK
         )
@@ -145,7 +161,7 @@ def get_read_notes(request, student_id):
 
 
 # Generic views for CRUD operations
-class StudentReadNotesListCreateView(ListCreateAPIView):
+class StudentReadNotesListCreateView(BoundedListMixin, OptimizedQuerysetMixin, ListCreateAPIView):
     """
     Generic view for listing and creating StudentReadNotes
     Provides standard CRUD operations with automatic serializer selection
@@ -0,0 +1,25 @@
+"""
+URLconf of ASGI requests (settings.ASYNC_URLCONF)
+The async catalogue views are matched first at the same paths as their DRF
+versions, every other URL falls through to myproject/urls.py
+"""
+from django.urls import include, path
+
+from notes import async_views as notes_views
+from profiles import async_views as profiles_views
+from StudentPremiumContent import async_views as premium_views
+from test_packages import async_views as test_packages_views
+
+urlpatterns = [
+    path('test_packages/get_packages/<str:subject_name>/', test_packages_views.get_all_packages),
+    path('test_packages/get_single_package/<int:id>/', test_packages_views.get_package_info),
+    path('test_packages/get_package_details/<int:id>/', test_packages_views.get_package_details),
+    path('notes/get_by_filter/<str:subject_name>/', notes_views.get_by_filter),
+    path('notes/GetNoteWithoutContent/<int:id>/', notes_views.GetNoteWithoutContent),
+    path('profiles/get_teacher_preview/', profiles_views.get_teacher_preview),
+    path('StudentPremiumContent/check-access/<int:student_id>/<int:content_id>/<str:content_type>/',
+         premium_views.check_premium_access, name='check_premium_access'),
+    path('StudentPremiumContent/check-purchase/', premium_views.check_content_purchase, name='check_content_purchase'),
+
+    path('', include('myproject.urls')),
+]
@@ -0,0 +1,173 @@
+"""
+Write-behind buffer for the popularity counters (apps, reads, purchases, teacher totals)
+The increment endpoints used to load the row, add one and save every column back,
+which loses increments under concurrency and locks the hottest rows at peak exam times
+Increments are now accumulated in process and written in one
+UPDATE ... SET field = field + CASE pk WHEN ... END per table. The buffer is
+flushed at the end of any request once FLUSH_INTERVAL seconds have passed, as
+soon as MAX_BUFFERED rows are pending, and when the process exits
+The state of the buffer of a worker is served by /counters/metrics/ (staff only)
+"""
+import atexit
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.core.signals import request_finished
+from django.db import transaction
+from django.dispatch import receiver
+from django.db.models import Case, F, Value, When
+
+# Seconds between two flushes of the buffer
+FLUSH_INTERVAL = 5
+
+# Number of buffered (row, field) pairs that forces a flush before the interval
+MAX_BUFFERED = 1000
+
+_lock = threading.Lock()
+
+# {model: {field: {pk: delta}}}
+_pending = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+_last_flush = time.monotonic()
+
+# Totals since the process started, read through metrics()
+_stats = {'flushes': 0, 'flushed_deltas': 0}
+
+logger = logging.getLogger(__name__)
+
+
+def _buffered_rows():
+    return sum(len(rows) for fields in _pending.values() for rows in fields.values())
+
+
+def increment(model, pk, field, delta=1):
+    """
+    Add delta to model.field of the row pk, the change reaches the database on the next flush
+    """
+    with _lock:
+        _pending[model][field][pk] += delta
+        full = _buffered_rows() >= MAX_BUFFERED
+
+    if full:
+        _try_flush()
+
+
+def _try_flush():
+    # A failed flush keeps its deltas for the next one, the caller still gets its answer
+    try:
+        flush()
+    except Exception:
+        logger.exception('counters: flush failed, the deltas are kept for the next one')
+
+
+@receiver(request_finished, dispatch_uid='flush_counters')
+def flush_when_due(**kwargs):
+    """
+    Flush the buffer after any request once FLUSH_INTERVAL seconds have passed,
+    so increments do not wait for the next increment to reach the database
+    """
+    with _lock:
+        due = bool(_pending) and time.monotonic() - _last_flush >= FLUSH_INTERVAL
+    if due:
+        _try_flush()
+
+
+def _take():
+    """
+    Swap the buffer for an empty one and return its content
+    """
+    global _pending, _last_flush
+
+    with _lock:
+        pending, _last_flush = _pending, time.monotonic()
+        _pending = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+    return pending
+
+
+def _restore(pending):
+    """
+    Put back deltas a failed flush could not write, so they go out with the next one
+    """
+    with _lock:
+        for model, fields in pending.items():
+            for field, rows in fields.items():
+                for pk, delta in rows.items():
+                    _pending[model][field][pk] += delta
+
+
+def add_deltas(model, fields):
+    """
+    Apply {field: {pk: delta}} to one table in a single UPDATE statement
+    Also used by the jobs that fold batches of rows into totals
+    """
+    updates = {}
+    pks = set()
+    for field, rows in fields.items():
+        rows = {pk: delta for pk, delta in rows.items() if delta}
+        if not rows:
+            continue
+        pks.update(rows)
+        updates[field] = F(field) + Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in rows.items()],
+            default=Value(0),
+            output_field=model._meta.get_field(field),
+        )
+
+    if updates:
+        model.objects.filter(pk__in=pks).update(**updates)
+
+
+def flush():
+    """
+    Write every buffered delta to the database, one UPDATE per table
+    Returns the number of deltas written
+    """
+    pending = _take()
+    if not pending:
+        return 0
+
+    try:
+        # Every table or none, so a failed flush can be retried as a whole
+        with transaction.atomic():
+            for model, fields in pending.items():
+                add_deltas(model, fields)
+    except Exception:
+        _restore(pending)
+        raise
+
+    written = sum(abs(delta) for fields in pending.values() for rows in fields.values() for delta in rows.values())
+    with _lock:
+        _stats['flushes'] += 1
+        _stats['flushed_deltas'] += written
+    return written
+
+
+def discard():
+    """
+    Drop the buffered deltas without writing them (tests only)
+    """
+    _take()
+
+
+def metrics():
+    """
+    Return the state of the buffer:
+    buffered_rows: (row, field) pairs waiting for a flush
+    buffered_deltas: sum of the absolute increments waiting for a flush
+    flushes / flushed_deltas: totals written since the process started
+    """
+    with _lock:
+        buffered = sum(abs(delta) for fields in _pending.values() for rows in fields.values() for delta in rows.values())
+        return {'buffered_rows': _buffered_rows(), 'buffered_deltas': buffered, **_stats}
+
+
+@atexit.register
+def _flush_on_shutdown():
+    """
+    Write what is left in the buffer when the worker process exits
+    """
+    try:
+        flush()
+    except Exception:
+        logger.exception('counters: could not flush on shutdown')
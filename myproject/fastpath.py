@@ -0,0 +1,43 @@
+"""
+ASGI fast path for the read-heavy catalogue endpoints
+Under ASGI every DRF function view runs in a thread through sync_to_async,
+together with DRF's request wrapping, content negotiation and rendering.
+The hottest reads have async twins (the async_views.py module of their app)
+that query with the async ORM and render plain JSON, at the same URLs and with
+the same response shapes. myproject/async_urls.py routes them first, and
+middleware.fast_path selects that URLconf for ASGI requests only, so WSGI
+workers keep serving the DRF views
+The querysets are built by the same helpers as the sync views, only their
+execution differs
+"""
+from functools import wraps
+
+from django.http import JsonResponse
+from rest_framework.utils.encoders import JSONEncoder
+
+
+def json_response(data, status=200):
+    """
+    Render data like DRF's JSONRenderer: compact, UTF-8, with DRF's encoder
+    """
+    return JsonResponse(
+        data,
+        status=status,
+        safe=False,
+        encoder=JSONEncoder,
+        json_dumps_params={'ensure_ascii': False, 'separators': (',', ':')},
+    )
+
+
+def async_api_view(methods):
+    """
+    Decorator of the async views, refusing other methods with DRF's 405 body
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods:
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,58 @@
+"""
+Middleware that keeps ASGI requests on the event loop
+Django runs a sync-only middleware under ASGI by pushing it and everything
+below it through thread hops, which would also take the async views of the
+fast path (myproject/fastpath.py) off the event loop
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.decorators import sync_and_async_middleware
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+@sync_and_async_middleware
+def fast_path(get_response):
+    """
+    Route ASGI requests through settings.ASYNC_URLCONF, where the async views are matched first
+    """
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            if isinstance(request, ASGIRequest) and settings.ASYNC_URLCONF:
+                request.urlconf = settings.ASYNC_URLCONF
+            return await get_response(request)
+    else:
+        def middleware(request):
+            return get_response(request)
+    return middleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+    """
+    WhiteNoiseMiddleware that also runs as async middleware
+    Static files are still served by WhiteNoise in a thread, every other
+    request is passed on without leaving the event loop
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, **kwargs):
+        super().__init__(get_response, **kwargs)
+        self.async_mode = iscoroutinefunction(self.get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            # Looks the file up on disk (DEBUG)
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
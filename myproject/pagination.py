@@ -0,0 +1,178 @@
+"""
+Shared pagination helpers for the list endpoints
+Keeps the existing count/limit contract (count is the 1-based page number,
+limit is the page size) but lets the database do the slicing with
+LIMIT/OFFSET and a separate COUNT query instead of serializing every row
+Student history feeds can also be paged with an opaque (date, id) cursor
+"""
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+# Largest page a client can ask for through the limit parameter
+MAX_PAGE_SIZE = 100
+
+# Hard upper bound on rows returned by the generic list (GET) views
+MAX_LIST_SIZE = 500
+
+
+def get_page_bounds(count, limit):
+    """
+    Convert the count/limit query parameters into [begin, end) row offsets
+    Raises ValueError/TypeError when the parameters are not integers,
+    just like the int() calls the views used to do inline
+    """
+    count = int(count)
+    limit = min(int(limit), MAX_PAGE_SIZE)
+
+    # Never produce a negative offset, the ORM does not support it
+    begin = max((count - 1) * limit, 0)
+    end = max(count * limit, begin)
+
+    return begin, end
+
+
+def paginate(queryset, count, limit):
+    """
+    Return one page of the queryset together with the total number of rows
+    The page is still a lazy queryset so it can be passed straight to a serializer
+    """
+    begin, end = get_page_bounds(count, limit)
+
+    # COUNT(*) runs in the database, the page is fetched with LIMIT/OFFSET
+    total = queryset.count()
+
+    return queryset[begin:end], total
+
+
+async def apaginate(queryset, count, limit):
+    """
+    Async version of paginate() for the ASGI fast path (myproject/fastpath.py)
+    The page is fetched here, async code cannot leave a lazy queryset to a serializer
+    """
+    begin, end = get_page_bounds(count, limit)
+
+    total = await queryset.acount()
+    rows = [row async for row in queryset[begin:end]]
+
+    return rows, total
+
+
+class BoundedListMixin:
+    """
+    Mixin for ListCreateAPIView subclasses that caps the rows returned by GET
+    The response shape is unchanged (a plain list), only the size is bounded
+    """
+    max_list_size = MAX_LIST_SIZE
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+
+        # Only bound list requests, POST/PUT never iterate the queryset
+        if self.request.method == 'GET':
+            return queryset[:self.max_list_size]
+        return queryset
+
+
+def encode_cursor(direction, date_value, pk):
+    """
+    Build the opaque cursor string handed to the client
+    The cursor remembers the (date, id) of the boundary row and the direction to seek
+    """
+    payload = json.dumps([direction, date_value.isoformat(), pk], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor produced by encode_cursor
+    Raises ValueError when the cursor was tampered with or is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        direction, date_value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError) as e:
+        raise ValueError('invalid cursor') from e
+
+    if direction not in ('next', 'prev') or not isinstance(date_value, str) or not isinstance(pk, int):
+        raise ValueError('invalid cursor')
+
+    return direction, date_value, pk
+
+
+def keyset_paginate(queryset, cursor, limit, date_field):
+    """
+    Seek one page of a newest-first feed ordered by (date_field, id)
+    An empty cursor returns the first page, otherwise the page right after
+    (or before) the row the cursor points to. The filter on (date, id) lets the
+    database seek straight into the index, so deep pages cost the same as the first one
+    Returns the rows of the page plus the next and previous cursors (None at the ends)
+    """
+    limit = min(int(limit), MAX_PAGE_SIZE)
+    if limit <= 0:
+        raise ValueError('limit must be positive')
+
+    field = queryset.model._meta.get_field(date_field)
+    direction = 'next'
+
+    if cursor:
+        direction, date_value, pk = decode_cursor(cursor)
+        try:
+            date_value = field.to_python(date_value)
+        except ValidationError as e:
+            raise ValueError('invalid cursor') from e
+
+        if direction == 'next':
+            # Rows strictly older than the boundary row
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__lt': date_value}) | Q(**{date_field: date_value, 'id__lt': pk})
+            )
+        else:
+            # Rows strictly newer than the boundary row
+            queryset = queryset.filter(
+                Q(**{f'{date_field}__gt': date_value}) | Q(**{date_field: date_value, 'id__gt': pk})
+            )
+
+    # Walk the index forwards for "next" and backwards for "prev"
+    if direction == 'next':
+        queryset = queryset.order_by(f'-{date_field}', '-id')
+    else:
+        queryset = queryset.order_by(date_field, 'id')
+
+    # Fetch one extra row to know whether there is another page
+    rows = list(queryset[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    if direction == 'prev':
+        rows.reverse()
+
+    next_cursor = None
+    previous_cursor = None
+
+    if rows:
+        first, last = rows[0], rows[-1]
+        if direction == 'next':
+            has_next, has_previous = has_more, bool(cursor)
+        else:
+            has_next, has_previous = True, has_more
+
+        if has_next:
+            next_cursor = encode_cursor('next', getattr(last, date_field), last.id)
+        if has_previous:
+            previous_cursor = encode_cursor('prev', getattr(first, date_field), first.id)
+
+    return rows, next_cursor, previous_cursor
+
+
+def cursor_total(queryset, cursor):
+    """
+    Total number of rows of a cursor-paged feed, counted on the first page only
+    Later pages return None, the client keeps the total it got with the first page
+    so scrolling deeper never pays for a COUNT over the whole history
+    """
+    if cursor:
+        return None
+    return queryset.count()
@@ -0,0 +1,223 @@
+"""
+Serializer-driven query shaping for the list endpoints
+Reads the fields a ModelSerializer renders and restricts the queryset with
+.only() to the columns behind them, so list queries never load TextFields
+(note content, question text, teacher bios) that the response does not contain
+The same walk over the serializer's source paths infers the select_related and
+prefetch_related a queryset needs, so rendering a page never runs a query per row
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+class UnknownSource(Exception):
+    """
+    A serializer field reads something that is not a model column
+    (a method field, a property...), its columns cannot be inferred
+    """
+
+
+def _collect(serializer, model, prefix, selected, paths):
+    """
+    Add to paths the model columns a serializer instance reads, prefixed by prefix
+    selected is the select_related subtree of model, relations that are not
+    selected are only needed as their foreign key column
+    """
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if field.source == '*':
+            # Nested serializer over the same object reads the same model
+            if isinstance(field, serializers.BaseSerializer):
+                _collect(field, model, prefix, selected, paths)
+                continue
+            raise UnknownSource(field.field_name)
+
+        _collect_source(field, field.source_attrs, model, prefix, selected, paths)
+
+
+def _collect_source(field, attrs, model, prefix, selected, paths):
+    """
+    Resolve one dotted source path against the model and record the columns behind it
+    """
+    name, rest = attrs[0], attrs[1:]
+
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        if name == 'pk':
+            paths.add(prefix + model._meta.pk.name)
+            return
+        raise UnknownSource(field.field_name)
+
+    # Reverse relations and many to many fields live in other tables
+    if model_field.many_to_many or model_field.one_to_many:
+        return
+
+    # A reverse one to one has no column here, but its row can be joined like a foreign key
+    if model_field.concrete:
+        paths.add(prefix + name)
+    elif not model_field.one_to_one:
+        return
+
+    if not model_field.is_relation:
+        return
+
+    # Going past a foreign key only narrows columns when the related row is joined
+    nested = selected if selected is True else (selected or {}).get(name)
+    if nested is None:
+        return
+
+    related_model = model_field.related_model
+    related_prefix = f'{prefix}{name}__'
+
+    if rest:
+        _collect_source(field, rest, related_model, related_prefix, nested, paths)
+    elif isinstance(field, serializers.BaseSerializer) and not getattr(field, 'many', False):
+        _collect(field, related_model, related_prefix, nested, paths)
+    elif isinstance(field, serializers.PrimaryKeyRelatedField):
+        # Rendered from the foreign key column alone
+        return
+    elif isinstance(field, serializers.SlugRelatedField):
+        paths.add(related_prefix + field.slug_field)
+    elif isinstance(field, serializers.RelatedField):
+        # A related field renders the whole related object (its __str__), keep every column
+        paths.update(f'{related_prefix}{related.name}' for related in related_model._meta.concrete_fields)
+
+
+def serializer_columns(serializer_class, queryset):
+    """
+    Return the sorted .only() paths needed to render the queryset with the serializer
+    or None when a field reads something that is not a model column
+    """
+    serializer = serializer_class()
+    paths = set()
+
+    # select_related tree of the queryset: nested dicts, or True when it follows every relation
+    selected = queryset.query.select_related
+
+    try:
+        _collect(serializer, queryset.model, '', selected, paths)
+    except UnknownSource:
+        return None
+
+    return sorted(paths)
+
+
+def project(queryset, serializer_class):
+    """
+    Restrict the queryset to the columns rendered by serializer_class
+    The queryset is returned unchanged when the columns cannot be inferred
+    """
+    columns = serializer_columns(serializer_class, queryset)
+    if not columns:
+        return queryset
+    return queryset.only(*columns)
+
+
+def _relations(serializer, model, prefix, many, lookups):
+    """
+    Add to lookups the relations a serializer instance follows, prefixed by prefix
+    many is True below a to-many relation, where every lookup has to be prefetched
+    """
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+
+        if field.source == '*':
+            if isinstance(field, serializers.BaseSerializer):
+                _relations(field, model, prefix, many, lookups)
+            continue
+
+        _relation_source(field, field.source_attrs, model, prefix, many, lookups)
+
+
+def _relation_source(field, attrs, model, prefix, many, lookups):
+    """
+    Follow one dotted source path and record the relations it goes through
+    """
+    name, rest = attrs[0], attrs[1:]
+
+    try:
+        model_field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return
+
+    # A foreign key read through its column name (user_id) needs no join either
+    if not model_field.is_relation or name != model_field.name:
+        return
+
+    to_many = model_field.many_to_many or model_field.one_to_many
+
+    # A single primary key is rendered from the foreign key column, no join needed
+    if not rest and not to_many and isinstance(field, serializers.PrimaryKeyRelatedField):
+        return
+
+    path = prefix + name
+    many = many or to_many
+    lookups['prefetch' if many else 'select'].append(path)
+
+    related_model = model_field.related_model
+    related_prefix = path + '__'
+
+    if rest:
+        _relation_source(field, rest, related_model, related_prefix, many, lookups)
+    elif isinstance(field, serializers.ListSerializer):
+        _relations(field.child, related_model, related_prefix, many, lookups)
+    elif isinstance(field, serializers.BaseSerializer):
+        _relations(field, related_model, related_prefix, many, lookups)
+
+
+def related_lookups(serializer_class, model):
+    """
+    Return the (select_related, prefetch_related) lookups needed to render
+    instances of model with serializer_class without a query per row
+    Forward foreign keys are joined, reverse and many to many relations (and
+    everything below them) are prefetched
+    """
+    lookups = {'select': [], 'prefetch': []}
+    _relations(serializer_class(), model, '', False, lookups)
+    return lookups['select'], lookups['prefetch']
+
+
+def optimize(queryset, serializer_class):
+    """
+    Join and prefetch the relations the serializer follows, then restrict the
+    queryset to the columns it renders
+    """
+    select, prefetch = related_lookups(serializer_class, queryset.model)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return project(queryset, serializer_class)
+
+
+class ProjectedListMixin:
+    """
+    Mixin for ListCreateAPIView subclasses that projects GET querysets on the serializer fields
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        # Only project list requests, writes go through the full row
+        if self.request.method == 'GET':
+            return project(queryset, self.get_serializer_class())
+        return queryset
+
+
+class OptimizedQuerysetMixin:
+    """
+    Mixin for generic views that shapes GET querysets on the serializer:
+    relations are joined or prefetched and only the rendered columns are loaded
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+
+        # Writes go through the full row, like ProjectedListMixin
+        if self.request.method == 'GET':
+            return optimize(queryset, self.get_serializer_class())
+        return queryset
@@ -51,12 +51,15 @@ INSTALLED_APPS = [
     'StudentPremiumContent',
     'StudentReadNotes',
     'StudentSubjectTracking',
+    'search',
+    'vouchers',
 ]
 
 MIDDLEWARE = [
+    'myproject.middleware.fast_path',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'myproject.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -92,6 +95,9 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'myproject.wsgi.application'
 
+# URLconf of ASGI requests, the async catalogue views first (myproject/fastpath.py), None to serve the DRF views
+ASYNC_URLCONF = 'myproject.async_urls'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -108,6 +114,38 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# Redis URL of the 'shared' cache (redis://host:6379/0), needed as soon as the
+# API runs on more than one host. Without it the workers of a host share it on disk
+SHARED_CACHE_URL = os.environ.get('SHARED_CACHE_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Compiled exam snapshots (questions/snapshots.py), kept on disk so every worker of the host shares them
+    # Edits move a package to a new key, the snapshots of old versions expire or are culled
+    'exam_snapshots': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'exam_snapshots'),
+        'TIMEOUT': 60 * 60 * 24,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Cached data whose invalidation every worker must see: entitlements, profile
+    # snapshots and facet counts. The 'default' cache is private to each worker
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': SHARED_CACHE_URL,
+    } if SHARED_CACHE_URL else {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache', 'shared'),
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -152,8 +190,15 @@ MEDIA_URL = '/media/'
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
+# Opt-in stateless mode: request.user is built from the JWT claims without a
+# users.User query (users/authentication.py). DRF auth tokens are not issued by
+# the API, the mode does not try them
+STATELESS_JWT_AUTH = os.environ.get('STATELESS_JWT_AUTH') == '1'
+
 REST_FRAMEWORK = { 
     'DEFAULT_AUTHENTICATION_CLASSES': ( 
+        'users.authentication.ClaimsJWTAuthentication',
+        ) if STATELESS_JWT_AUTH else (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
         'rest_framework.authentication.TokenAuthentication',
         ) 
@@ -192,7 +237,7 @@ SIMPLE_JWT = {
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 
     "TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainPairSerializer",
-    "TOKEN_REFRESH_SERIALIZER": "rest_framework_simplejwt.serializers.TokenRefreshSerializer",
+    "TOKEN_REFRESH_SERIALIZER": "users.serializers.FilteredTokenRefreshSerializer",
     "TOKEN_VERIFY_SERIALIZER": "rest_framework_simplejwt.serializers.TokenVerifySerializer",
     "TOKEN_BLACKLIST_SERIALIZER": "rest_framework_simplejwt.serializers.TokenBlacklistSerializer",
     "SLIDING_TOKEN_OBTAIN_SERIALIZER": "rest_framework_simplejwt.serializers.TokenObtainSlidingSerializer",
@@ -0,0 +1,160 @@
+"""
+Helpers shared by the app test suites
+Lets a test run an endpoint, capture the SQL it issued and check the
+database plan (EXPLAIN) of each query on SQLite and MySQL, or count the
+statements and rows an endpoint costs to hold it to a query budget
+"""
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+def explain(sql):
+    """
+    Return the query plan rows of a captured SQL statement as a list of dicts
+    Every row has at least the 'table' and 'key' (index used, or None) entries
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            plan = []
+            for row in cursor.fetchall():
+                # detail looks like "SEARCH <table> USING [COVERING] INDEX <name> (...)"
+                detail = row[-1]
+                words = detail.split()
+                table = words[1] if len(words) > 1 else None
+                key = None
+                if 'INDEX' in words:
+                    key = words[words.index('INDEX') + 1]
+                elif 'PRIMARY' in words and 'KEY' in words:
+                    key = 'PRIMARY'
+                plan.append({'table': table, 'key': key, 'detail': detail})
+            return plan
+
+        if connection.vendor == 'mysql':
+            cursor.execute('EXPLAIN ' + sql)
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row), detail=row) for row in cursor.fetchall()]
+
+        raise NotImplementedError(f'EXPLAIN is not supported for {connection.vendor}')
+
+
+def index_name_for(model, columns):
+    """
+    Look up the real name of the index covering exactly these columns
+    Needed for unique_together indexes whose name is generated by Django
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+    for name, info in constraints.items():
+        if info['columns'] == list(columns) and (info['index'] or info['unique']):
+            return name
+
+    raise LookupError(f'No index on {model._meta.db_table}({", ".join(columns)})')
+
+
+def indexes_starting_with(model, column):
+    """
+    Return the names of every index whose leading column is the given column
+    Useful when any index that seeks on that column is acceptable (e.g. a COUNT
+    that the database may answer from the foreign key index)
+    """
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+    return {
+        name for name, info in constraints.items()
+        if info['columns'] and info['columns'][0] == column and (info['index'] or info['unique'])
+    }
+
+
+class QueryPlanTestMixin:
+    """
+    TestCase mixin that asserts the SQL issued by an endpoint is served by an index
+    """
+
+    def capture_endpoint_queries(self, url, data=None):
+        """
+        GET the url and return the SQL of every query it ran
+        """
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, data)
+
+        self.assertEqual(response.status_code, 200, response.content)
+        return [query['sql'] for query in context.captured_queries]
+
+    def assertEndpointUsesIndex(self, url, model, index_names, data=None):
+        """
+        Every SELECT the endpoint runs against the model's table must use
+        index_names (a single index name or a collection of acceptable ones)
+        """
+        if isinstance(index_names, str):
+            index_names = {index_names}
+
+        table = model._meta.db_table
+        selects = [
+            sql for sql in self.capture_endpoint_queries(url, data)
+            if sql.lstrip().upper().startswith('SELECT') and table in sql
+        ]
+        self.assertTrue(selects, f'{url} did not query {table}')
+
+        for sql in selects:
+            plan = [row for row in explain(sql) if row['table'] == table]
+            keys = {row['key'] for row in plan}
+            self.assertTrue(
+                keys & set(index_names),
+                f'Query does not use {sorted(index_names)}:\n{sql}\nplan: {[row["detail"] for row in plan]}'
+            )
+
+
+class QueryRecorder:
+    """
+    Context manager recording the SQL statements run on the default connection
+    and how many rows every SELECT returned
+    Savepoint bookkeeping is not counted, it depends on how the test wraps the call
+    """
+
+    def __init__(self):
+        self.statements = []
+        self._counting = False
+
+    def __enter__(self):
+        self._wrapper = connection.execute_wrapper(self)
+        self._wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._wrapper.__exit__(*exc_info)
+
+    def __call__(self, execute, sql, params, many, context):
+        result = execute(sql, params, many, context)
+
+        # The row counting query below goes through this wrapper too
+        if self._counting:
+            return result
+
+        keyword = sql.lstrip().split(None, 1)[0].upper()
+        if keyword in ('SAVEPOINT', 'RELEASE', 'ROLLBACK'):
+            return result
+
+        rows = 0
+        if keyword == 'SELECT' and not many:
+            # Run the same statement again as a COUNT, before anything else can change the data
+            self._counting = True
+            try:
+                with context['connection'].cursor() as cursor:
+                    cursor.execute(f'SELECT COUNT(*) FROM ({sql}) budget_rows', params)
+                    rows = cursor.fetchone()[0]
+            finally:
+                self._counting = False
+
+        self.statements.append({'sql': sql, 'rows': rows})
+        return result
+
+    @property
+    def queries(self):
+        return len(self.statements)
+
+    @property
+    def rows(self):
+        return sum(statement['rows'] for statement in self.statements)
@@ -0,0 +1,642 @@
+"""
+Query budget of every endpoint
+Seeds a catalogue with many teachers, students, packages, notes and student
+histories, calls every URL of myproject/urls.py and checks that the number of
+SQL statements and of rows fetched stays under the budget declared in BUDGETS.
+The read endpoints are then called again on a catalogue several times bigger
+and must run exactly the same number of queries, so a serializer or view that
+starts querying per row fails here
+A table of the measured numbers is printed at the end of the run
+"""
+import datetime
+import io
+import re
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache, caches
+from django.db import transaction
+from django.test import AsyncClient, TestCase
+from django.urls import URLPattern, URLResolver, get_resolver
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from myproject import async_urls, counters
+from myproject.pagination import MAX_LIST_SIZE
+from myproject.testing import QueryRecorder
+from notes.models import Notes, NoteImages
+from profiles.models import EarningsEntry, Profile_Student, Profile_Teacher
+from profiles.stats import commission
+from questions.models import Questions, QuestionImages
+from search.suggest import suggestion_index
+from student_related_exams.models import DoneExams
+from StudentPremiumContent.models import StudentPremiumContent
+from StudentReadNotes.models import StudentReadNotes
+from StudentSubjectTracking.models import StudentSubjectTracking
+from test_packages.models import TestPackage
+from users.blacklist import blacklist_filter
+from users.models import User
+from vouchers.codes import generate_batch
+
+# URL prefixes that are not part of the API
+UNBUDGETED_PREFIXES = ('admin/', 'media/', '^media/')
+
+PASSWORD = 'budget-password'
+
+# Size of the catalogue created by one call to seed()
+TEACHERS = 4
+STUDENTS = 4
+PACKAGES_PER_TEACHER = 10
+NOTES_PER_TEACHER = 10
+HISTORY_PER_STUDENT = 15
+QUESTIONS_PER_PACKAGE = 10
+
+# How many times bigger the catalogue gets for the size independence check
+GROWTH = 3
+
+# Page size used by the paginated endpoints
+PAGE = {'count': 1, 'limit': 10}
+
+
+class Budget:
+    """
+    Declared cost of one endpoint
+    url_kwargs and data are either values or functions of the fixture
+    staff requests are authenticated as a staff user instead of the student
+    """
+
+    def __init__(self, method, queries, rows, url_kwargs=None, data=None, authenticated=False, multipart=False, staff=False):
+        self.method = method
+        self.queries = queries
+        self.rows = rows
+        self.url_kwargs = url_kwargs or {}
+        self.data = data or {}
+        self.authenticated = authenticated
+        self.multipart = multipart
+        self.staff = staff
+
+    @property
+    def is_read(self):
+        return self.method == 'get'
+
+
+def resolve(value, fixture):
+    return value(fixture) if callable(value) else value
+
+
+BUDGETS = {
+    # profiles
+    'profiles/get_teacher_preview/': Budget(
+        'get', 2, 11, data={'Class': '12', 'city': 'all', 'subject_name': 'عرض الكل', **PAGE}),
+    'profiles/get_teacher_info/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.teacher.pk}),
+    'profiles/update_teacher_profile/<int:id>/': Budget(
+        'post', 4, 1, url_kwargs=lambda f: {'id': f.teacher.pk}, multipart=True, data={
+            'phone_number': '0999', 'another_phone_number': '0988', 'teaching_in_school': 'school',
+            'teaching_in_institutions': 'institute', 'bio': 'bio', 'facebook_link': '', 'instagram_link': '',
+            'whatsapp_link': '', 'telegram_link': '', 'studying_subjects': 'math', 'city': 'damascus', 'Class': '12',
+        }),
+    'profiles/get_student_own_profile_info/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.student.pk}),
+    'profiles/update_student_profile/<int:id>/': Budget(
+        'post', 2, 1, url_kwargs=lambda f: {'id': f.student.pk}, data={'full_name': 'student'}),
+    'profiles/check_student_balance/': Budget(
+        'get', 2, 1, data=lambda f: {'student_id': f.student.pk, 'price': 10}),
+    'profiles/get_teacher_stats/<int:id>/': Budget(
+        'get', 2, 2, url_kwargs=lambda f: {'id': f.teacher.pk}),
+    'profiles/get_teacher_earnings/<int:id>/': Budget(
+        'get', 2, 11, url_kwargs=lambda f: {'id': f.teacher.pk}, data=PAGE),
+    'profiles/increase_number_of_teacher_exams/<int:id>/': Budget(
+        'post', 1, 1, url_kwargs=lambda f: {'id': f.teacher.pk}),
+    'profiles/decrease_number_of_teacher_exams/<int:id>/': Budget(
+        'post', 1, 1, url_kwargs=lambda f: {'id': f.teacher.pk}),
+    'profiles/increase_number_of_teacher_notes/<int:id>/': Budget(
+        'post', 1, 1, url_kwargs=lambda f: {'id': f.teacher.pk}),
+    'profiles/decrease_number_of_teacher_notes/<int:id>/': Budget(
+        'post', 1, 1, url_kwargs=lambda f: {'id': f.teacher.pk}),
+
+    # test_packages
+    'test_packages/get_packages/<str:subject_name>/': Budget(
+        'get', 2, 11, url_kwargs={'subject_name': 'math_12'},
+        data={'price': 100000, 'number_of_questions': 1000, **PAGE}),
+    'test_packages/get_student_solved_exams/<str:subject_name>/': Budget(
+        'get', 1, HISTORY_PER_STUDENT, url_kwargs={'subject_name': 'math_12'},
+        data=lambda f: {'user_id': f.student.pk}),
+    'test_packages/get_units/<str:subject_name>/': Budget(
+        'get', 1, 2, url_kwargs={'subject_name': 'math_12'}, data={'price': 100000}),
+    'test_packages/get_single_package/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.package.pk}),
+    'test_packages/increase_num_of_apps/<int:id>/': Budget(
+        'put', 1, 1, url_kwargs=lambda f: {'id': f.package.pk}),
+    'test_packages/increase_number_of_purchases/<int:id>/': Budget(
+        'put', 1, 1, url_kwargs=lambda f: {'id': f.package.pk}),
+    'test_packages/create_test_packages/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+    'test_packages/get_package_details/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.package.pk}),
+    'test_packages/get_test_packages_by_publisher_id/<int:id>/': Budget(
+        'get', 2, 11, url_kwargs=lambda f: {'id': f.teacher.pk}, data=PAGE),
+    'test_packages/edit_test_package/<int:id>/': Budget(
+        'put', 4, 58, url_kwargs=lambda f: {'id': f.package.pk}, data={'price': 20}),
+    'test_packages/delete_test_package/<int:id>/': Budget(
+        'delete', 8, 3, url_kwargs=lambda f: {'id': f.spare_package.pk}),
+
+    # questions
+    'questions/all_questions/<int:package_id>/': Budget(
+        'get', 4, QUESTIONS_PER_PACKAGE + 3, url_kwargs=lambda f: {'package_id': f.package.pk}),
+    'questions/exam/<int:package_id>/': Budget(
+        'get', 4, QUESTIONS_PER_PACKAGE + 3, url_kwargs=lambda f: {'package_id': f.package.pk}),
+    'questions/add_questions/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+    'questions/add_question_images/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+    'questions/get_question_images/<int:test_id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'test_id': f.question.pk}, data={'field_name': 'test_content'}),
+    'questions/edit_question_by_id/<int:id>/': Budget(
+        'put', 3, 1, url_kwargs=lambda f: {'id': f.question.pk}, data={
+            'test_content': 'question', 'option_A': 'a', 'option_B': 'b', 'option_C': 'c',
+            'option_D': 'd', 'option_E': 'e', 'explanation': 'because', 'right_answer': 'A',
+        }),
+    'questions/delete_question_by_id/<int:id>/': Budget(
+        'delete', 6, 2, url_kwargs=lambda f: {'id': f.spare_question.pk}),
+
+    # users
+    'users/register/': Budget(
+        'post', 10, 1, data={
+            'username': 'new_student', 'email': 'new_student@example.com', 'password': PASSWORD,
+            'is_teacher': False, 'full_name': 'new student', 'phone_number': '0999', 'Class': '12',
+            'city': 'damascus', 'school': 'school', 'gender': 'M',
+        }),
+    'users/provision/': Budget(
+        'post', 7, 2, staff=True, data={'users': [
+            {'username': 'bulk_student', 'email': 'bulk_student@example.com', 'password': PASSWORD,
+             'full_name': 'bulk student', 'Class': '12', 'city': 'damascus', 'school': 'school', 'gender': 'M'},
+            {'username': 'bulk_teacher', 'email': 'bulk_teacher@example.com', 'password': PASSWORD, 'is_teacher': True,
+             'full_name': 'bulk teacher', 'Class': '12', 'city': 'damascus', 'studying_subjects': 'math', 'gender': 'F'},
+        ]}),
+    'users/login/': Budget(
+        'post', 3, 2, data=lambda f: {'username': f.student_user.username, 'password': PASSWORD}),
+    'users/logout/': Budget(
+        'post', 7, 3, authenticated=True,
+        data=lambda f: {'username': f.student_user.username, 'refresh_token': str(RefreshToken.for_user(f.student_user))}),
+    'users/refresh/': Budget(
+        'post', 1, 1, data=lambda f: {'refresh': str(RefreshToken.for_user(f.student_user))}),
+    'token/': Budget(
+        'post', 2, 1, data=lambda f: {'username': f.student_user.username, 'password': PASSWORD}),
+    'token/refresh/': Budget(
+        'post', 8, 4, data=lambda f: {'refresh': str(RefreshToken.for_user(f.student_user))}),
+
+    # notes
+    'notes/GetNoteWithContent/<int:id>/': Budget(
+        'get', 2, 1 + HISTORY_PER_STUDENT, authenticated=True, url_kwargs=lambda f: {'id': f.paid_note.pk}),
+    'notes/GetNoteWithoutContent/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.note.pk}),
+    'notes/add_note/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+    'notes/addNoteImages/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+    'notes/get_by_filter/<str:subject_name>/': Budget(
+        'get', 2, 11, url_kwargs={'subject_name': 'math_12'}, data={'price': 100000, 'Class': '12', **PAGE}),
+    'notes/IncreaseNumberOfReads/<int:id>/': Budget(
+        'put', 1, 1, url_kwargs=lambda f: {'id': f.note.pk}),
+    'notes/IncreaseNumberOfPurchases/<int:id>/': Budget(
+        'put', 1, 1, url_kwargs=lambda f: {'id': f.note.pk}),
+    'notes/getNoteImages/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.note.pk}),
+    'notes/edit_note_by_id/<int:id>/': Budget(
+        'put', 5, 41, url_kwargs=lambda f: {'id': f.note.pk}, data={'title': 'edited note'}),
+    'notes/delete_note_by_id/<int:id>/': Budget(
+        'delete', 6, 1, url_kwargs=lambda f: {'id': f.spare_note.pk}),
+    'notes/GetNotesWithoutContentByTeacherID/<int:publisher_id>/': Budget(
+        'get', 2, 11, url_kwargs=lambda f: {'publisher_id': f.teacher.pk}, data=PAGE),
+    'notes/get_note_info_for_edit/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.note.pk}),
+
+    # StudentReadNotes
+    'StudentReadNotes/create/': Budget(
+        'post', 6, 3, data=lambda f: {
+            'student': f.student.pk, 'note_id': f.unread_note.pk, 'subject_name': 'math_12',
+            'note_name': f.unread_note.title, 'publisher_id': f.teacher.pk, 'publisher_name': 'teacher',
+        }),
+    'StudentReadNotes/increase_reads/<int:id>/': Budget(
+        'post', 2, 1, url_kwargs=lambda f: {'id': f.read_note.pk}),
+    'StudentReadNotes/get_read_notes/<int:student_id>/': Budget(
+        'get', 2, 11, url_kwargs=lambda f: {'student_id': f.student.pk}, data=PAGE),
+    'StudentReadNotes/list_create/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+
+    # StudentPremiumContent
+    'StudentPremiumContent/student/<int:student_id>/': Budget(
+        'get', 2, 11, url_kwargs=lambda f: {'student_id': f.student.pk}, data=PAGE),
+    'StudentPremiumContent/details/<int:id>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'id': f.premium.pk}),
+    'StudentPremiumContent/create-with-balance-check/': Budget(
+        'post', 11, 5, data=lambda f: {
+            'student': f.student.pk, 'price': 10, 'content_id': f.unread_note.pk, 'content_name': 'note',
+            'type': 'note', 'subject_name': 'math_12', 'Class': '12', 'publisher_id': f.teacher.pk,
+            'publisher_name': 'teacher', 'date_of_expiry': '2099-01-01',
+        }),
+    'StudentPremiumContent/checkout/': Budget(
+        'post', 8, 5, data=lambda f: {
+            'student': f.student.pk, 'date_of_expiry': '2099-01-01', 'items': [
+                {'type': 'note', 'content_id': f.unread_note.pk}, {'type': 'exam', 'content_id': f.package.pk},
+            ],
+        }),
+    'StudentPremiumContent/check-access/<int:student_id>/<int:content_id>/<str:content_type>/': Budget(
+        'get', 1, HISTORY_PER_STUDENT, url_kwargs=lambda f: {'student_id': f.student.pk, 'content_id': f.unread_note.pk, 'content_type': 'note'}),
+    'StudentPremiumContent/check-purchase/': Budget(
+        'get', 1, HISTORY_PER_STUDENT, data=lambda f: {'student_id': f.student.pk, 'content_type': 'note', 'content_id': f.premium.content_id}),
+    'StudentPremiumContent/': Budget(
+        'get', 1, MAX_LIST_SIZE),
+    'StudentPremiumContent/<int:pk>/': Budget(
+        'get', 1, 1, url_kwargs=lambda f: {'pk': f.premium.pk}),
+
+    # student_related_exams
+    'StudentRelatedExams/examDoneRecord/': Budget(
+        'get', 0, 0),
+    'StudentRelatedExams/student_done_exams/<int:id>/': Budget(
+        'get', 2, 11, url_kwargs=lambda f: {'id': f.student.pk}, data=PAGE),
+
+    # StudentSubjectTracking
+    'StudentSubjectTracking/create/': Budget(
+        'post', 3, 2, authenticated=True, data=lambda f: {
+            'student': f.student_user.pk, 'subject_name': 'math_12', 'Class': '12', 'increase': 'note',
+        }),
+    'StudentSubjectTracking/student/<int:student_id>/class/<str:Class>/': Budget(
+        'get', 1, 1, authenticated=True, url_kwargs=lambda f: {'student_id': f.student_user.pk, 'Class': '12'}),
+
+    # search
+    'search/suggest/': Budget(
+        'get', 0, 0, data={'q': 'pa'}),
+    'search/facets/<str:catalogue>/': Budget(
+        'get', 1, 100, url_kwargs={'catalogue': 'packages'}, data={'subject_name': 'math_12'}),
+
+    # vouchers
+    'vouchers/redeem/': Budget(
+        'post', 3, 1, authenticated=True, data=lambda f: {'code': f.voucher_code}),
+    'vouchers/batches/': Budget(
+        'post', 2, 0, staff=True, data={'name': 'budget', 'value': 1000, 'quantity': 20}),
+
+    # counters
+    'counters/metrics/': Budget(
+        'get', 0, 0, staff=True),
+}
+
+
+def api_routes(resolver=None, prefix=''):
+    """
+    Return the route of every URL pattern of the project, admin and media excluded
+    """
+    routes = []
+    for pattern in (resolver or get_resolver()).url_patterns:
+        route = prefix + str(pattern.pattern)
+        if route.startswith(UNBUDGETED_PREFIXES):
+            continue
+        if isinstance(pattern, URLResolver):
+            routes.extend(api_routes(pattern, route))
+        elif isinstance(pattern, URLPattern):
+            routes.append(route)
+    return routes
+
+
+def build_url(route, kwargs):
+    """
+    Fill the <converter:name> parts of a route with the given values
+    """
+    return '/' + re.sub(r'<(?:\w+:)?(\w+)>', lambda match: str(kwargs[match.group(1)]), route)
+
+
+class Fixture:
+    """
+    Representative catalogue, every call to seed() adds one more batch of everything
+    The objects the budgets point at come from the first batch
+    """
+
+    def __init__(self):
+        self.batches = 0
+
+    def seed(self):
+        batch = self.batches
+        self.batches += 1
+        password = make_password(PASSWORD)
+
+        teachers = []
+        for i in range(TEACHERS):
+            user = User.objects.create(
+                username=f'teacher_{batch}_{i}', email=f'teacher_{batch}_{i}@example.com',
+                password=password, is_teacher=True,
+            )
+            Profile_Teacher.objects.filter(user=user).update(
+                full_name=f'teacher {batch} {i}', studying_subjects='math', Class='12', city='damascus',
+            )
+            teachers.append(Profile_Teacher.objects.get(user=user))
+
+        students = []
+        for i in range(STUDENTS):
+            user = User.objects.create(
+                username=f'student_{batch}_{i}', email=f'student_{batch}_{i}@example.com', password=password,
+            )
+            Profile_Student.objects.filter(user=user).update(full_name=f'student {batch} {i}', balance=100000)
+            students.append(Profile_Student.objects.get(user=user))
+
+        packages = []
+        notes = []
+        for teacher in teachers:
+            for i in range(PACKAGES_PER_TEACHER):
+                packages.append(TestPackage.objects.create(
+                    package_name=f'package {batch} {teacher.pk} {i}', units='unit one, unit two', Class='12',
+                    subject_name='math_12', price=10 * i, number_of_questions=QUESTIONS_PER_PACKAGE,
+                    publisher_id=teacher.pk, publisher_name=teacher.full_name,
+                ))
+            for i in range(NOTES_PER_TEACHER):
+                notes.append(Notes.objects.create(
+                    title=f'note {batch} {teacher.pk} {i}', subject_name='math_12', Class='12', price=10 * i,
+                    content='content ' * 200, publisher_id=teacher.pk, publisher_name=teacher.full_name,
+                ))
+
+        for package in packages[:2]:
+            questions = Questions.objects.bulk_create([
+                Questions(package=package, test_content='question ' * 50, option_A='a', option_B='b',
+                          explanation='explanation ' * 50)
+                for _ in range(QUESTIONS_PER_PACKAGE)
+            ])
+            QuestionImages.objects.bulk_create([QuestionImages(test_id=questions[0], field_name='test_content')])
+        NoteImages.objects.bulk_create([NoteImages(note_id=notes[0])])
+
+        today = datetime.date.today()
+        for student in students:
+            DoneExams.objects.bulk_create([
+                DoneExams(
+                    student=student, subject_name='math_12', exam_name=package.package_name, exam_id=str(package.pk),
+                    publisher_id=package.publisher_id, publisher_name=package.publisher_name,
+                    date_of_application=today, result=50, price=package.price, time_taken=datetime.time(0, 30),
+                )
+                for package in packages[:HISTORY_PER_STUDENT]
+            ])
+            StudentReadNotes.objects.bulk_create([
+                StudentReadNotes(
+                    student=student, note_id=note, subject_name='math_12', note_name=note.title,
+                    publisher_id=note.publisher_id, publisher_name=note.publisher_name,
+                )
+                for note in notes[:HISTORY_PER_STUDENT]
+            ])
+            StudentPremiumContent.objects.bulk_create([
+                StudentPremiumContent(
+                    student=student, type='note', content_id=note.pk, content_name=note.title, Class='12',
+                    subject_name='math_12', publisher_id=teachers[0], publisher_name=teachers[0].full_name,
+                    price=note.price, date_of_expiry=today + datetime.timedelta(days=30),
+                )
+                for note in notes[:HISTORY_PER_STUDENT]
+            ])
+            EarningsEntry.objects.bulk_create([
+                EarningsEntry(teacher=teachers[0], purchase_id=note.pk, price=note.price, amount=commission(note.price))
+                for note in notes[:HISTORY_PER_STUDENT]
+            ])
+            StudentSubjectTracking.objects.create(student=student.user, subject_name='math_12', Class='12')
+
+        if batch == 0:
+            self.teacher = teachers[0]
+            self.student = students[0]
+            self.student_user = students[0].user
+            self.package = packages[0]
+            self.spare_package = packages[-1]
+            self.note = notes[0]
+            self.paid_note = notes[1]
+            self.unread_note = notes[-1]
+            self.spare_note = notes[-2]
+            self.question = Questions.objects.filter(package=packages[0]).first()
+            self.spare_question = Questions.objects.filter(package=packages[1]).first()
+            self.read_note = StudentReadNotes.objects.filter(student=students[0]).first()
+            self.premium = StudentPremiumContent.objects.filter(student=students[0]).first()
+            self.staff_user = User.objects.create(username='staff', email='staff@example.com', is_staff=True)
+            codes = io.StringIO()
+            generate_batch('budget', 1000, 20, codes)
+            self.voucher_code = codes.getvalue().splitlines()[1].split(',')[1]
+
+
+class EndpointQueryBudgetTests(TestCase):
+    """
+    Every endpoint stays within its declared number of queries and rows fetched
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = Fixture()
+        cls.fixture.seed()
+
+    def measure(self, route, budget):
+        """
+        Call the endpoint inside a rolled back savepoint and return (status code, recorder)
+        """
+        client = APIClient()
+        if budget.staff:
+            client.force_authenticate(user=self.fixture.staff_user)
+        elif budget.authenticated:
+            client.force_authenticate(user=self.fixture.student_user)
+
+        url = build_url(route, resolve(budget.url_kwargs, self.fixture))
+        data = resolve(budget.data, self.fixture)
+        options = {} if budget.is_read or budget.multipart else {'format': 'json'}
+
+        # Cold caches so every endpoint pays for what it computes
+        cache.clear()
+        caches['exam_snapshots'].clear()
+        caches['shared'].clear()
+        suggestion_index.load()
+        counters.discard()
+        blacklist_filter.reset()
+        blacklist_filter.load()
+
+        with transaction.atomic():
+            with QueryRecorder() as recorder:
+                response = getattr(client, budget.method)(url, data, **options)
+            transaction.set_rollback(True)
+
+        return response.status_code, recorder
+
+    def measure_all(self):
+        results = {}
+        for route in api_routes():
+            budget = BUDGETS.get(route)
+            if budget is not None:
+                results[route] = self.measure(route, budget)
+        return results
+
+    def test_every_endpoint_has_a_budget(self):
+        missing = sorted(set(api_routes()) - set(BUDGETS))
+        self.assertFalse(missing, f'Declare a query budget for {missing}')
+
+        stale = sorted(set(BUDGETS) - set(api_routes()))
+        self.assertFalse(stale, f'Budgets declared for unknown routes {stale}')
+
+    def test_endpoints_stay_within_budget(self):
+        results = self.measure_all()
+
+        # Read endpoints must cost the same on a catalogue several times bigger
+        for _ in range(GROWTH - 1):
+            self.fixture.seed()
+        grown = {route: self.measure(route, BUDGETS[route]) for route in results if BUDGETS[route].is_read}
+
+        lines = [f'{"endpoint":<90} {"status":>6} {"queries":>11} {"rows":>11} {"grown":>7}']
+        for route, (status_code, recorder) in results.items():
+            budget = BUDGETS[route]
+            grown_queries = grown[route][1].queries if route in grown else ''
+            lines.append(
+                f'{budget.method.upper() + " /" + route:<90} {status_code:>6} '
+                f'{f"{recorder.queries}/{budget.queries}":>11} {f"{recorder.rows}/{budget.rows}":>11} {grown_queries:>7}'
+            )
+        print('\n' + '\n'.join(lines))
+
+        for route, (status_code, recorder) in results.items():
+            budget = BUDGETS[route]
+            with self.subTest(route=route):
+                self.assertLess(status_code, 500, route)
+                self.assertLessEqual(recorder.queries, budget.queries, [s['sql'] for s in recorder.statements])
+                self.assertLessEqual(recorder.rows, budget.rows)
+
+        for route, (status_code, recorder) in grown.items():
+            budget = BUDGETS[route]
+            with self.subTest(route=route, grown=True):
+                self.assertEqual(recorder.queries, results[route][1].queries, [s['sql'] for s in recorder.statements])
+                self.assertLessEqual(recorder.rows, budget.rows)
+
+
+def fast_routes():
+    """
+    Routes served by async views under ASGI (myproject/async_urls.py)
+    """
+    return [str(pattern.pattern) for pattern in async_urls.urlpatterns if isinstance(pattern, URLPattern)]
+
+
+class AsyncFastPathTests(TestCase):
+    """
+    Under ASGI the fast path routes answer from async views exactly like their
+    DRF versions, within the same query budgets
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.fixture = Fixture()
+        cls.fixture.seed()
+
+    def test_fast_routes_are_api_routes(self):
+        unknown = sorted(set(fast_routes()) - set(api_routes()))
+        self.assertFalse(unknown, f'Async views declared for unknown routes {unknown}')
+
+    def test_async_views_answer_like_drf_views(self):
+        for route in fast_routes():
+            budget = BUDGETS[route]
+            url = build_url(route, resolve(budget.url_kwargs, self.fixture))
+            data = resolve(budget.data, self.fixture)
+
+            with self.subTest(route=route):
+                cache.clear()
+                expected = APIClient().get(url, data)
+
+                cache.clear()
+                with QueryRecorder() as recorder:
+                    response = async_to_sync(AsyncClient().get)(url, data)
+
+                # DRF views answer with an Allow header, the async views do not
+                self.assertIn('Allow', expected.headers)
+                self.assertNotIn('Allow', response.headers)
+
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.json(), expected.json())
+                self.assertLessEqual(recorder.queries, budget.queries)
+                self.assertLessEqual(recorder.rows, budget.rows)
+
+    def test_other_methods_are_refused_like_drf(self):
+        url = build_url('profiles/get_teacher_preview/', {})
+        expected = APIClient().post(url)
+        response = async_to_sync(AsyncClient().post)(url)
+
+        self.assertEqual(response.status_code, 405)
+        self.assertEqual(response.json(), expected.json())
+
+
+class CounterBufferTests(TestCase):
+    """
+    Increments are buffered and written in one UPDATE per table, at the end of
+    the first request after the flush interval
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.teacher = User.objects.create(username='counter_teacher', email='counter_teacher@svi.com', is_teacher=True)
+        cls.packages = [
+            TestPackage.objects.create(
+                package_name=f'package {i}', units='unit', subject_name='math_12',
+                price=0, number_of_questions=10, publisher_id=cls.teacher.pk,
+            )
+            for i in range(3)
+        ]
+        cls.note = Notes.objects.create(title='note', content='content', publisher_id=cls.teacher.pk)
+        cls.staff = User.objects.create(username='counter_staff', email='counter_staff@svi.com', is_staff=True)
+
+    def setUp(self):
+        counters.discard()
+        self.client = APIClient()
+
+    def test_increments_are_written_on_flush(self):
+        first, second, _ = self.packages
+        for _ in range(3):
+            self.client.put(f'/test_packages/increase_num_of_apps/{first.pk}/')
+        self.client.put(f'/test_packages/increase_num_of_apps/{second.pk}/')
+        self.client.put(f'/test_packages/increase_number_of_purchases/{second.pk}/')
+        self.client.put(f'/notes/IncreaseNumberOfReads/{self.note.pk}/')
+
+        # Nothing reaches the rows before the flush
+        first.refresh_from_db()
+        self.assertEqual(first.number_of_apps, 0)
+        self.assertEqual(counters.metrics()['buffered_deltas'], 6)
+
+        with QueryRecorder() as recorder:
+            self.assertEqual(counters.flush(), 6)
+
+        # One UPDATE for test packages, one for notes
+        self.assertEqual(recorder.queries, 2)
+        self.assertEqual(counters.metrics()['buffered_deltas'], 0)
+
+        counts = dict(TestPackage.objects.values_list('pk', 'number_of_apps'))
+        self.assertEqual(counts, {first.pk: 3, second.pk: 1, self.packages[2].pk: 0})
+        self.assertEqual(TestPackage.objects.get(pk=second.pk).number_of_purchases, 1)
+        self.assertEqual(Notes.objects.get(pk=self.note.pk).number_of_reads, 1)
+
+    def test_unknown_row_is_not_buffered(self):
+        response = self.client.put('/test_packages/increase_num_of_apps/999999/')
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(counters.metrics()['buffered_deltas'], 0)
+
+    def test_any_request_after_the_interval_flushes(self):
+        package = self.packages[0]
+        self.client.put(f'/test_packages/increase_num_of_apps/{package.pk}/')
+        self.assertEqual(counters.metrics()['buffered_deltas'], 1)
+
+        # No other increment comes, an unrelated request ends after the interval
+        with mock.patch.object(counters, '_last_flush', counters._last_flush - counters.FLUSH_INTERVAL):
+            self.client.get(f'/test_packages/get_package_details/{package.pk}/')
+
+        self.assertEqual(counters.metrics()['buffered_deltas'], 0)
+        package.refresh_from_db()
+        self.assertEqual(package.number_of_apps, 1)
+
+    def test_failed_flush_is_logged_and_kept(self):
+        counters.increment(TestPackage, self.packages[0].pk, 'number_of_apps')
+
+        with mock.patch.object(counters, 'add_deltas', side_effect=RuntimeError), \
+                self.assertLogs('myproject.counters', 'ERROR'):
+            counters._try_flush()
+
+        self.assertEqual(counters.metrics()['buffered_deltas'], 1)
+
+    def test_metrics_endpoint_is_staff_only(self):
+        counters.increment(TestPackage, self.packages[0].pk, 'number_of_apps')
+
+        self.assertEqual(self.client.get('/counters/metrics/').status_code, 401)
+        self.client.force_authenticate(user=self.staff)
+        response = self.client.get('/counters/metrics/')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['buffered_deltas'], 1)
@@ -19,6 +19,7 @@ from django.urls import path , include
 from rest_framework_simplejwt import views as jwt_views
 from django.conf import settings
 from django.conf.urls.static import static 
+from . import views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -38,6 +39,9 @@ urlpatterns = [
           name ='token_refresh'),
     path('StudentRelatedExams/',include('student_related_exams.urls')),
     path('StudentSubjectTracking/',include('StudentSubjectTracking.urls')),
+    path('search/',include('search.urls')),
+    path('vouchers/',include('vouchers.urls')),
+    path('counters/metrics/', views.counter_metrics),
 
 ]+static(settings.MEDIA_URL , document_root = settings.MEDIA_ROOT)
 
@@ -0,0 +1,15 @@
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import counters
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def counter_metrics(request):
+    """
+    State of the counters write-behind buffer of the worker answering (staff only)
+    Every worker process has its own buffer, see myproject/counters.py metrics()
+    """
+    return Response(counters.metrics())
@@ -0,0 +1,31 @@
+"""
+Async twins of the note previews of views.py, served under ASGI (myproject/fastpath.py)
+"""
+from myproject.fastpath import async_api_view, json_response
+from myproject.pagination import apaginate
+from myproject.projection import project
+from .models import Notes
+from .serializers import NoteFilterSerializer
+from .views import note_catalogue
+
+
+@async_api_view(['GET'])
+async def get_by_filter(request, subject_name):
+    """
+    Async version of views.get_by_filter
+    """
+    page, num = await apaginate(
+        note_catalogue(subject_name, request.GET), request.GET.get('count', None), request.GET.get('limit', None)
+    )
+
+    return json_response({'notes': NoteFilterSerializer(page, many=True).data, 'number_of_notes': num})
+
+
+@async_api_view(['GET'])
+async def GetNoteWithoutContent(request, id):
+    """
+    Async version of views.GetNoteWithoutContent
+    """
+    obj = [note async for note in project(Notes.objects.filter(id=id), NoteFilterSerializer)]
+
+    return json_response(NoteFilterSerializer(obj, many=True).data)
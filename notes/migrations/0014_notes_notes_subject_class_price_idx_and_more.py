@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notes', '0013_alter_notes_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['subject_name', 'Class', 'price'], name='notes_subject_class_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notes',
+            index=models.Index(fields=['publisher_id', 'date_uploaded'], name='notes_publisher_date_idx'),
+        ),
+    ]
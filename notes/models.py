@@ -46,6 +46,13 @@ class Notes(models.Model):
         """
         # Order records by date uploaded (newest first)
         ordering = ['-date_uploaded']
+
+        indexes = [
+            # get_by_filter: subject_name and Class equality, then price range
+            models.Index(fields=['subject_name', 'Class', 'price'], name='notes_subject_class_price_idx'),
+            # GetNotesWithoutContentByTeacherID: publisher equality, newest first
+            models.Index(fields=['publisher_id', 'date_uploaded'], name='notes_publisher_date_idx'),
+        ]
     
     def __str__(self):
         """
@@ -1,3 +1,98 @@
 from django.test import TestCase
+from rest_framework import serializers
+
+from myproject.projection import project, serializer_columns
+from myproject.testing import QueryPlanTestMixin
+from .models import Notes
+from .serializers import NoteFilterSerializer
 
 # Create your tests here.
+
+SUBJECTS = ['math_12', 'physics_12', 'chemistry_12', 'science_12', 'arabic_12']
+
+
+class NotesIndexTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that the note listing queries are served by their indexes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Notes.objects.bulk_create([
+            Notes(
+                title=f'note {i}',
+                subject_name=SUBJECTS[i % len(SUBJECTS)],
+                Class='12' if i % 2 else '9',
+                price=(i % 10) * 1000,
+                publisher_id=i % 20 + 1,
+                content='content',
+            )
+            for i in range(400)
+        ])
+
+    def test_get_by_filter_uses_subject_class_price_index(self):
+        self.assertEndpointUsesIndex(
+            '/notes/get_by_filter/math_12/',
+            Notes,
+            'notes_subject_class_price_idx',
+            {'price': 3000, 'Class': '12', 'count': 1, 'limit': 10},
+        )
+
+    def test_get_notes_by_teacher_uses_publisher_index(self):
+        self.assertEndpointUsesIndex(
+            '/notes/GetNotesWithoutContentByTeacherID/3/',
+            Notes,
+            'notes_publisher_date_idx',
+            {'count': 1, 'limit': 10},
+        )
+
+
+class NoteProjectionTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that the note previews never load the content column and render the same data
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        Notes.objects.bulk_create([
+            Notes(title=f'note {i}', subject_name='math_12', Class='12', price=1000, publisher_id=1, content='x' * 1000)
+            for i in range(5)
+        ])
+
+    def test_preview_columns_leave_out_content(self):
+        columns = serializer_columns(NoteFilterSerializer, Notes.objects.all())
+
+        self.assertIn('title', columns)
+        self.assertNotIn('content', columns)
+
+    def test_list_endpoints_do_not_select_content(self):
+        for url, data in [
+            ('/notes/get_by_filter/math_12/', {'price': 1000, 'Class': '12', 'count': 1, 'limit': 10}),
+            ('/notes/GetNotesWithoutContentByTeacherID/1/', {'count': 1, 'limit': 10}),
+        ]:
+            with self.subTest(url=url):
+                selects = [sql for sql in self.capture_endpoint_queries(url, data) if 'notes_notes' in sql]
+                self.assertTrue(selects)
+                self.assertFalse([sql for sql in selects if '"content"' in sql])
+
+    def test_projected_rows_render_like_full_rows(self):
+        queryset = Notes.objects.order_by('id')
+
+        self.assertEqual(
+            NoteFilterSerializer(project(queryset, NoteFilterSerializer), many=True).data,
+            NoteFilterSerializer(queryset, many=True).data,
+        )
+
+    def test_unknown_source_keeps_the_full_row(self):
+        class WithMethodField(serializers.ModelSerializer):
+            summary = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Notes
+                fields = ['id', 'summary']
+
+            def get_summary(self, note):
+                return note.content[:10]
+
+        queryset = Notes.objects.all()
+        self.assertIs(project(queryset, WithMethodField), queryset)
@@ -8,10 +8,15 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 # from .filters import NoteFilter
 from rest_framework import status
+from myproject.pagination import paginate, BoundedListMixin
+from myproject.projection import project, ProjectedListMixin
+from myproject import counters
+from search.index import search
+from StudentPremiumContent.entitlements import access_denied
 
 
 # Generic views for CRUD operations
-class addNote(generics.ListCreateAPIView):
+class addNote(BoundedListMixin, ProjectedListMixin, generics.ListCreateAPIView):
     """
     Generic view for listing and creating notes
     Provides standard CRUD operations for Notes model
@@ -22,7 +27,7 @@ class addNote(generics.ListCreateAPIView):
     serializer_class = NoteSerializer
 
 
-class addNoteImages(generics.ListCreateAPIView):
+class addNoteImages(ProjectedListMixin, generics.ListCreateAPIView):
     """
     Generic view for listing and creating note images
     Handles file uploads for note images
@@ -42,7 +47,7 @@ def getNoteImages(request, id):
     Returns all images linked to the note by note ID
     """
     # Filter images by note ID
-    query = NoteImages.objects.filter(note_id=id)
+    query = project(NoteImages.objects.filter(note_id=id), NoteImagesSerializer)
     
     # Serialize the filtered images data
     serial = NoteImagesSerializer(query, many=True)
@@ -55,16 +60,44 @@ def GetNoteWithContent(request, id):
     """
     Get a single note with full content by its ID
     Returns complete note information including all content
+    A paid note is only sent to its publisher, staff, or a student with an active purchase
     """
     # Get the note object by ID
     obj = Notes.objects.get(id=id) 
     
+    denied = access_denied(request, 'note', obj.id, obj.price, obj.publisher_id)
+    if denied is not None:
+        return denied
+    
     # Serialize the note data with full content
     serial = NoteSerializer(obj)
     
     return Response(serial.data)
 
 
+def note_catalogue(subject_name, params):
+    """
+    Build the filtered, projected queryset of get_by_filter from its query parameters
+    Shared by the DRF view and its async twin (async_views.py)
+    """
+    price = params.get('price', None)
+    Class = params.get('Class', None)
+    name = params.get('name', None)
+    publisher_name = params.get('publisher_name', None)
+ 
+    # Filter notes by subject, class, and maximum price
+    queryset = Notes.objects.filter(subject_name=subject_name, Class=Class, price__lte=price)  
+  
+    # Search by title and publisher through the search index (best matches first)
+    if name is not None:
+        queryset = search(queryset, 'note', 'title', name)
+    if publisher_name is not None:
+        queryset = search(queryset, 'note', 'publisher_name', publisher_name, rank=name is None)
+
+    # Load only the columns of the preview (never the content)
+    return project(queryset, NoteFilterSerializer)
+
+
 @api_view(['GET'])
 def get_by_filter(request, subject_name):
     """
@@ -72,34 +105,20 @@ def get_by_filter(request, subject_name):
     Returns paginated list of notes matching the specified criteria
     Excludes note content for preview purposes
     """
-    # Get query parameters for filtering
-    price = request.GET.get('price', None)
-    Class = request.GET.get('Class', None)
+    # Get query parameters for pagination
     count = request.GET.get('count', None)
     limit = request.GET.get('limit', None)
-    name = request.GET.get('name', None)
-    publisher_name = request.GET.get('publisher_name', None)
- 
-    # Filter notes by subject, class, and maximum price
-    queryset = Notes.objects.filter(subject_name=subject_name, Class=Class, price__lte=price)  
-  
-    if name is not None:
-        queryset = queryset.filter(title__icontains=name)
-    if publisher_name is not None:
-        queryset = queryset.filter(publisher_name__icontains=publisher_name)
-    # Serialize the filtered notes data (without content)
-    serializer = NoteFilterSerializer(queryset, many=True)
-
-    # Convert pagination parameters to integers
-    count = int(count)
-    limit = int(limit)
-
-    # Calculate pagination boundaries
-    begin = min((count - 1) * limit, len(serializer.data))
-    end = min(count * limit, len(serializer.data))
-    num = len(serializer.data) 
+
+    # Filter, search and project the notes
+    queryset = note_catalogue(subject_name, request.GET)
+
+    # Apply pagination in the database
+    page, num = paginate(queryset, count, limit)
+
+    # Serialize only the requested page (without content)
+    serializer = NoteFilterSerializer(page, many=True)
    
-    return Response({'notes': serializer.data[begin:end], 'number_of_notes': num}, status=200)
+    return Response({'notes': serializer.data, 'number_of_notes': num}, status=200)
 
 
 @api_view(['GET'])
@@ -108,28 +127,20 @@ def GetNotesWithoutContentByTeacherID(request, publisher_id):
     Get all notes published by a specific teacher
     Returns paginated list of notes without content for the specified publisher
     """
-    # Filter notes by publisher ID
-    queryset = Notes.objects.filter(publisher_id=publisher_id)   
-    
-    # Serialize the filtered notes data (without content)
-    serializer = NoteFilterSerializer(queryset, many=True)
+    # Filter notes by publisher ID, loading only the columns of the preview
+    queryset = project(Notes.objects.filter(publisher_id=publisher_id), NoteFilterSerializer)
  
     # Get pagination parameters
     limit = request.GET.get('limit')
     count = request.GET.get('count')
+
+    # Apply pagination in the database
+    page, num = paginate(queryset, count, limit)
     
-    # Convert pagination parameters to integers if provided
-    if count:
-        count = int(count)
-    if limit:
-        limit = int(limit)
-
-    # Calculate pagination boundaries
-    begin = min((count - 1) * limit, len(serializer.data))
-    end = min(count * limit, len(serializer.data))
-    num = len(serializer.data) 
+    # Serialize only the requested page (without content)
+    serializer = NoteFilterSerializer(page, many=True)
    
-    return Response({'notes': serializer.data[begin:end], 'number_of_notes': num}, status=200)
+    return Response({'notes': serializer.data, 'number_of_notes': num}, status=200)
 
 
 @api_view(['GET'])
@@ -138,8 +149,8 @@ def GetNoteWithoutContent(request, id):
     Get a single note without content by its ID
     Returns note information excluding the main content for preview purposes
     """
-    # Filter notes by ID
-    obj = Notes.objects.filter(id=id) 
+    # Filter notes by ID, without loading the content column
+    obj = project(Notes.objects.filter(id=id), NoteFilterSerializer)
     
     # Serialize the note data without content
     serializer = NoteFilterSerializer(obj, many=True)
@@ -153,14 +164,11 @@ def IncreaseNumberOfReads(request, id):
     Increase the read count for a specific note
     Increments the note's read counter by 1
     """
-    # Get the note object or return 404 if not found
-    note = get_object_or_404(Notes, id=id)
+    # Make sure the note exists, reading its primary key only
+    get_object_or_404(Notes.objects.only('id'), id=id)
     
-    # Increment the read count
-    note.number_of_reads += 1 
-    
-    # Save the updated note
-    note.save()
+    # Buffer the increment, it reaches the database with the next batched flush
+    counters.increment(Notes, id, 'number_of_reads')
     
     return Response('تم زيادة عدد القراء بنجاح', status=200)
 
@@ -172,14 +180,11 @@ def IncreaseNumberOfPurchases(request, id):
     Increments the note's purchase counter by 1
     """
     try:
-        # Get the note object or return 404 if not found
-        note = get_object_or_404(Notes, id=id)
-        
-        # Increment the purchase count
-        note.number_of_purchases += 1
+        # Make sure the note exists, reading its primary key only
+        get_object_or_404(Notes.objects.only('id'), id=id)
         
-        # Save the updated note
-        note.save()
+        # Buffer the increment, it reaches the database with the next batched flush
+        counters.increment(Notes, id, 'number_of_purchases')
         
         return Response('تم زيادة عدد المشتريات بنجاح', status=200)
     except Exception as e:
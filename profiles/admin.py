@@ -11,9 +11,9 @@ class ProfileStudentAdmin(admin.ModelAdmin):  # student
 
 
 class ProfileTeacherAdmin(admin.ModelAdmin): # teacher
-   list_display = ['user','full_name','studying_subjects','Class','total_net','phone_number','another_phone_number','city']
-   search_fields = ['user','full_name','studying_subjects','Class','total_net','phone_number','another_phone_number','city']
-   list_filter = ['user','full_name','studying_subjects','Class','total_net','phone_number','another_phone_number','city']
+   list_display = ['user','full_name','studying_subjects','Class','stats__total_net','phone_number','another_phone_number','city']
+   search_fields = ['user','full_name','studying_subjects','Class','phone_number','another_phone_number','city']
+   list_filter = ['user','full_name','studying_subjects','Class','phone_number','another_phone_number','city']
 
 admin.site.register(Profile_Student  , ProfileStudentAdmin)
 admin.site.register(Profile_Teacher , ProfileTeacherAdmin)
@@ -0,0 +1,17 @@
+"""
+Async twin of the teacher preview of views.py, served under ASGI (myproject/fastpath.py)
+"""
+from myproject.fastpath import async_api_view, json_response
+from myproject.pagination import apaginate
+from .serializers import TeacherPreviewSerializer
+from .views import teacher_catalogue
+
+
+@async_api_view(['GET'])
+async def get_teacher_preview(request):
+    """
+    Async version of views.get_teacher_preview
+    """
+    page, number = await apaginate(teacher_catalogue(request.GET), request.GET.get('count'), request.GET.get('limit'))
+
+    return json_response({'teacher_preview': TeacherPreviewSerializer(page, many=True).data, 'number': number})
@@ -0,0 +1,162 @@
+"""
+Teacher earnings ledger
+Sales only append EarningsEntry rows, rollup() later folds the pending entries
+into TeacherStats (sales, revenue, total_net, buyers) in batches, with one UPDATE
+per batch instead of one per sale on the teacher's row
+reconcile() compares the ledger with the prices of StudentPremiumContent using
+one grouped query on each side
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Case, Count, IntegerField, Q, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from myproject.counters import add_deltas
+from StudentPremiumContent.models import StudentPremiumContent
+from .models import EarningsEntry, TeacherStats
+from .stats import commission, rebuild
+
+# Entries folded by one rollup transaction
+ROLLUP_BATCH_SIZE = 5000
+
+
+def record_sale(purchase):
+    """
+    Append the teacher's commission on a new or renewed StudentPremiumContent
+    """
+    EarningsEntry.objects.create(
+        teacher_id=purchase.publisher_id_id,
+        purchase_id=purchase.id,
+        price=purchase.price,
+        amount=commission(purchase.price),
+    )
+
+
+def record_sales(purchases):
+    """
+    Append the commissions of StudentPremiumContent rows created together with one INSERT
+    (bulk_create sends no post_save, the cart checkout posts its sales here)
+    """
+    EarningsEntry.objects.bulk_create([
+        EarningsEntry(
+            teacher_id=purchase.publisher_id_id,
+            purchase_id=purchase.id,
+            price=purchase.price,
+            amount=commission(purchase.price),
+        )
+        for purchase in purchases
+    ])
+
+
+def record_reversal(purchase):
+    """
+    Append the entries cancelling the sales of a deleted StudentPremiumContent,
+    one per sale entry, so the first purchase and every renewal are reversed
+    """
+    sales = EarningsEntry.objects.filter(purchase_id=purchase.id, is_reversal=False)
+    EarningsEntry.objects.bulk_create([
+        EarningsEntry(
+            teacher_id=teacher_id,
+            purchase_id=purchase.id,
+            price=-price,
+            amount=-amount,
+            is_reversal=True,
+        )
+        for teacher_id, price, amount in sales.order_by('id').values_list('teacher_id', 'price', 'amount')
+    ])
+
+
+def pending_net(teacher_id):
+    """
+    Commissions of the teacher not yet folded into TeacherStats.total_net
+    """
+    pending = EarningsEntry.objects.filter(teacher_id=teacher_id, rolled_up=False).aggregate(amount=Sum('amount'))
+    return pending['amount'] or 0
+
+
+def _fold(entry_ids):
+    """
+    Add a batch of pending entries to TeacherStats and mark them rolled up
+    """
+    totals = EarningsEntry.objects.filter(id__in=entry_ids).order_by().values('teacher_id').annotate(
+        sales=Count('id', filter=Q(is_reversal=False)) - Count('id', filter=Q(is_reversal=True)),
+        revenue=Sum('price'),
+        net=Sum('amount'),
+    )
+
+    deltas = defaultdict(dict)
+    for row in totals:
+        deltas['number_of_sales'][row['teacher_id']] = row['sales']
+        deltas['revenue'][row['teacher_id']] = row['revenue']
+        deltas['total_net'][row['teacher_id']] = row['net']
+    teacher_ids = list(deltas['total_net'])
+
+    # Teachers who never had statistics get them computed from scratch instead
+    existing = set(TeacherStats.objects.filter(teacher_id__in=teacher_ids).values_list('teacher_id', flat=True))
+    for fields in deltas.values():
+        for teacher_id in set(fields) - existing:
+            del fields[teacher_id]
+    add_deltas(TeacherStats, deltas)
+
+    # Distinct buyers cannot be added up, count them again for the teachers of the batch
+    if existing:
+        buyers = dict(
+            StudentPremiumContent.objects.filter(publisher_id__in=existing).order_by()
+            .values('publisher_id').annotate(buyers=Count('student', distinct=True))
+            .values_list('publisher_id', 'buyers')
+        )
+        TeacherStats.objects.filter(teacher_id__in=existing).update(number_of_buyers=Case(
+            *[When(teacher_id=teacher_id, then=Value(buyers.get(teacher_id, 0))) for teacher_id in existing],
+            output_field=IntegerField(),
+        ))
+
+    EarningsEntry.objects.filter(id__in=entry_ids).update(rolled_up=True)
+
+    missing = set(teacher_ids) - existing
+    if missing:
+        rebuild(list(missing))
+
+
+def rollup(batch_size=ROLLUP_BATCH_SIZE):
+    """
+    Fold every pending entry into TeacherStats, batch_size entries per transaction
+    Returns the number of entries folded
+    """
+    folded = 0
+    while True:
+        with transaction.atomic():
+            # Concurrent rollups skip the entries another one is folding
+            entry_ids = list(
+                EarningsEntry.objects.select_for_update(skip_locked=True)
+                .filter(rolled_up=False).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not entry_ids:
+                return folded
+            _fold(entry_ids)
+        folded += len(entry_ids)
+
+
+def reconcile(teacher_ids=None):
+    """
+    Compare the ledger with StudentPremiumContent for the given teachers (every teacher by default)
+    The sales side counts every price paid for a record, renewals included (total_paid)
+    Returns {teacher id: (ledger price total, sales price total)} for the teachers that differ
+    """
+    ledger = EarningsEntry.objects.all()
+    sales = StudentPremiumContent.objects.all()
+    if teacher_ids is not None:
+        ledger = ledger.filter(teacher_id__in=teacher_ids)
+        sales = sales.filter(publisher_id__in=teacher_ids)
+
+    ledger_totals = dict(ledger.order_by().values('teacher_id').annotate(total=Sum('price')).values_list('teacher_id', 'total'))
+    sales_totals = dict(
+        sales.order_by().values('publisher_id').annotate(total=Sum(Coalesce('total_paid', 'price')))
+        .values_list('publisher_id', 'total')
+    )
+
+    return {
+        teacher_id: (ledger_totals.get(teacher_id, 0), sales_totals.get(teacher_id, 0))
+        for teacher_id in set(ledger_totals) | set(sales_totals)
+        if (ledger_totals.get(teacher_id) or 0) != (sales_totals.get(teacher_id) or 0)
+    }
@@ -0,0 +1,24 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from profiles.stats import rebuild
+
+
+class Command(BaseCommand):
+    """
+    Recompute the teacher statistics from the source tables
+    Needed whenever rows were changed with queryset.update() or raw SQL
+    (which do not send the signals) or moved to another publisher
+    """
+    help = 'Recompute the statistics of every teacher (or of the given teacher ids)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('teacher_ids', nargs='*', type=int, help='Only recompute these teachers')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        rebuilt = rebuild(options['teacher_ids'] or None)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt the statistics of {rebuilt} teachers in {time.monotonic() - started:.2f}s'
+        ))
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from profiles.earnings import ROLLUP_BATCH_SIZE, reconcile, rollup
+
+
+class Command(BaseCommand):
+    """
+    Fold the pending earnings ledger entries into the teacher statistics
+    Meant to run periodically (every minute from cron), concurrent runs skip
+    each other's entries
+    """
+    help = 'Fold pending teacher earnings into TeacherStats, optionally reconcile the ledger with the sales'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=ROLLUP_BATCH_SIZE, help='Entries folded per transaction')
+        parser.add_argument('--reconcile', action='store_true', help='Also compare the ledger with the sales prices')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        folded = rollup(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Folded {folded} earnings entries in {time.monotonic() - started:.2f}s'
+        ))
+
+        if options['reconcile']:
+            mismatches = reconcile()
+            for teacher_id, (ledger, sales) in sorted(mismatches.items()):
+                self.stdout.write(self.style.WARNING(f'Teacher {teacher_id}: ledger {ledger}, sales {sales}'))
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS('The ledger matches the sales'))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:55
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0020_alter_profile_teacher_class'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='profile_teacher',
+            index=models.Index(fields=['Class', 'city', 'studying_subjects'], name='teacher_class_city_subj_idx'),
+        ),
+    ]
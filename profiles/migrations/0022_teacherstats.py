@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0021_profile_teacher_teacher_class_city_subj_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TeacherStats',
+            fields=[
+                ('teacher', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='profiles.profile_teacher')),
+                ('number_of_exams', models.IntegerField(default=0)),
+                ('number_of_notes', models.IntegerField(default=0)),
+                ('number_of_sales', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('total_net', models.IntegerField(default=0)),
+                ('number_of_buyers', models.IntegerField(default=0)),
+                ('number_of_results', models.IntegerField(default=0)),
+                ('total_score', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+        ),
+    ]
@@ -0,0 +1,72 @@
+from decimal import Decimal
+
+from django.db import migrations
+from django.db.models import Count, F, Sum
+from django.db.models.functions import Floor
+
+# Copy of profiles/stats.py rebuild() at the time of this migration, so later
+# changes to the live code do not change what this migration does
+TEACHER_SHARE = Decimal('0.7')
+
+STATS_FIELDS = [
+    'number_of_exams', 'number_of_notes', 'number_of_sales', 'revenue',
+    'total_net', 'number_of_buyers', 'number_of_results', 'total_score',
+]
+
+
+def grouped(queryset, teacher_field, **aggregates):
+    rows = queryset.order_by().values(teacher_field).annotate(**aggregates)
+    return {row.pop(teacher_field): row for row in rows}
+
+
+def populate_teacher_stats(apps, schema_editor):
+    """
+    Compute the statistics of every existing teacher from the source tables
+    """
+    Profile_Teacher = apps.get_model('profiles', 'Profile_Teacher')
+    TeacherStats = apps.get_model('profiles', 'TeacherStats')
+    TestPackage = apps.get_model('test_packages', 'TestPackage')
+    Notes = apps.get_model('notes', 'Notes')
+    StudentPremiumContent = apps.get_model('StudentPremiumContent', 'StudentPremiumContent')
+    DoneExams = apps.get_model('student_related_exams', 'DoneExams')
+
+    exams = grouped(TestPackage.objects.all(), 'publisher_id', number_of_exams=Count('id'))
+    notes = grouped(Notes.objects.all(), 'publisher_id', number_of_notes=Count('id'))
+    sales = grouped(
+        StudentPremiumContent.objects.all(), 'publisher_id',
+        number_of_sales=Count('id'),
+        revenue=Sum('price'),
+        total_net=Sum(Floor(F('price') * TEACHER_SHARE)),
+        number_of_buyers=Count('student', distinct=True),
+    )
+    results = grouped(
+        DoneExams.objects.all(), 'publisher_id',
+        number_of_results=Count('id'),
+        total_score=Sum('result'),
+    )
+
+    rows = []
+    for teacher_id in Profile_Teacher.objects.order_by('user_id').values_list('user_id', flat=True):
+        values = {field: 0 for field in STATS_FIELDS}
+        for source in (exams, notes, sales, results):
+            values.update({field: value or 0 for field, value in source.get(teacher_id, {}).items()})
+        values['total_net'] = int(values['total_net'])
+        rows.append(TeacherStats(teacher_id=teacher_id, **values))
+
+    TeacherStats.objects.all().delete()
+    TeacherStats.objects.bulk_create(rows, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0022_teacherstats'),
+        ('notes', '0014_notes_notes_subject_class_price_idx_and_more'),
+        ('student_related_exams', '0014_doneexams_doneexams_student_subject_idx'),
+        ('StudentPremiumContent', '0008_alter_studentpremiumcontent_options_and_more'),
+        ('test_packages', '0017_populate_unit_catalogue'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_teacher_stats, migrations.RunPython.noop),
+    ]
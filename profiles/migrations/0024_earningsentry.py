@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0023_populate_teacherstats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EarningsEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('purchase_id', models.BigIntegerField()),
+                ('price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('amount', models.IntegerField()),
+                ('is_reversal', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('rolled_up', models.BooleanField(default=False)),
+                ('teacher', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='earnings', to='profiles.profile_teacher')),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+                'indexes': [models.Index(fields=['teacher', 'created_at', 'id'], name='earnings_teacher_date_idx'), models.Index(fields=['rolled_up', 'id'], name='earnings_rolled_up_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+import datetime
+from decimal import Decimal
+
+from django.db import migrations
+from django.utils import timezone
+
+# Copy of profiles/stats.py commission() at the time of this migration
+TEACHER_SHARE = Decimal('0.7')
+
+
+def commission(price):
+    return int(Decimal(price) * TEACHER_SHARE)
+
+
+def populate_earnings(apps, schema_editor):
+    """
+    Write a ledger entry for every existing sale, already counted by TeacherStats
+    """
+    StudentPremiumContent = apps.get_model('StudentPremiumContent', 'StudentPremiumContent')
+    EarningsEntry = apps.get_model('profiles', 'EarningsEntry')
+
+    sales = StudentPremiumContent.objects.order_by('id').values_list('id', 'publisher_id', 'price', 'purchase_date')
+
+    entries = []
+    for purchase_id, teacher_id, price, purchase_date in sales.iterator(chunk_size=2000):
+        created_at = timezone.make_aware(datetime.datetime.combine(purchase_date, datetime.time()))
+        entries.append(EarningsEntry(
+            teacher_id=teacher_id, purchase_id=purchase_id, price=price, amount=commission(price),
+            created_at=created_at, rolled_up=True,
+        ))
+        if len(entries) >= 1000:
+            EarningsEntry.objects.bulk_create(entries)
+            entries = []
+
+    EarningsEntry.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0024_earningsentry'),
+        ('StudentPremiumContent', '0009_studentpremiumcontent_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_earnings, migrations.RunPython.noop),
+    ]
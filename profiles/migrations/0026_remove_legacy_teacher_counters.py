@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:12
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0025_populate_earningsentry'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='profile_teacher',
+            name='number_of_exams',
+        ),
+        migrations.RemoveField(
+            model_name='profile_teacher',
+            name='number_of_notes',
+        ),
+        migrations.RemoveField(
+            model_name='profile_teacher',
+            name='total_net',
+        ),
+    ]
@@ -2,6 +2,7 @@ from django.db import models
 from django.dispatch import receiver 
 from users.models import User
 from django.db.models.signals import post_save
+from django.utils import timezone
 
 # Create your models here.
 
@@ -100,9 +101,6 @@ class Profile_Teacher(models.Model):
     # Biography and description
     bio = models.CharField(default='', max_length=5000, blank=True, null=True)
     
-    # Financial information
-    total_net = models.IntegerField(default=0, blank=True)
-    
     # Timestamp
     created_at = models.DateField(auto_now_add=True)
     
@@ -115,10 +113,8 @@ class Profile_Teacher(models.Model):
     teaching_in_school = models.CharField(default='', max_length=255, blank=True, null=True)
     teaching_in_institutions = models.CharField(default='', max_length=500, blank=True, null=True)
     
-    # Statistics
-    number_of_exams = models.IntegerField(default=0, blank=True)
-    number_of_notes = models.IntegerField(default=0, blank=True)
-    
+    # Statistics (exams, notes, earnings) are kept in TeacherStats
+
     # Contact information section
     phone_number = models.CharField(max_length=15, default='-', blank=True)
     another_phone_number = models.CharField(max_length=15, default='-', blank=True)
@@ -126,6 +122,12 @@ class Profile_Teacher(models.Model):
     whatsapp_link = models.CharField(default='', max_length=500, blank=True, null=True)
     facebook_link = models.CharField(default='', max_length=500, blank=True, null=True)
     instagram_link = models.CharField(default='', max_length=500, blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # get_teacher_preview: Class equality (or '9_12'), then city and subject
+            models.Index(fields=['Class', 'city', 'studying_subjects'], name='teacher_class_city_subj_idx'),
+        ]
     
     def __str__(self):
         """
@@ -148,4 +150,90 @@ def save_profile_teacher(sender, instance, created, **kwargs):
         profile = Profile_Teacher(user=user)
         profile.save()
 
- 
\ No newline at end of file
+ 
+
+class TeacherStats(models.Model):
+    """
+    Read model of a teacher's statistics
+    Maintained incrementally by profiles/signals.py from test packages, notes,
+    premium content purchases and exam results, so the profile pages never run
+    aggregates or depend on the client reporting what it published
+    Can be recomputed from the source tables with `manage.py rebuild_teacher_stats`
+    """
+
+    # One row per teacher, sharing its primary key
+    teacher = models.OneToOneField(Profile_Teacher, primary_key=True, on_delete=models.CASCADE, related_name='stats')
+
+    # Published content
+    number_of_exams = models.IntegerField(default=0)
+    number_of_notes = models.IntegerField(default=0)
+
+    # Sales of premium content
+    number_of_sales = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    total_net = models.IntegerField(default=0)
+    number_of_buyers = models.IntegerField(default=0)
+
+    # Results of the students on the teacher's exams
+    number_of_results = models.IntegerField(default=0)
+    total_score = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    @property
+    def average_score(self):
+        """
+        Average result of the students on the teacher's exams, None before the first result
+        """
+        if not self.number_of_results:
+            return None
+        return round(self.total_score / self.number_of_results, 2)
+
+    def __str__(self):
+        return str(self.teacher_id)
+
+
+@receiver(post_save, sender=Profile_Teacher)
+def create_teacher_stats(sender, instance, created, **kwargs):
+    """
+    Signal handler to create the (empty) statistics of a new teacher profile
+    """
+    if created:
+        TeacherStats.objects.get_or_create(teacher=instance)
+
+
+class EarningsEntry(models.Model):
+    """
+    Append-only ledger of a teacher's earnings
+    One entry per sale or renewal of premium content (and a reversal entry for
+    each of them when the record is deleted), so a sales spike only inserts rows instead of updating the teacher's row
+    The rollup job (`manage.py rollup_earnings`) folds entries into TeacherStats in batches
+    """
+
+    teacher = models.ForeignKey(Profile_Teacher, on_delete=models.CASCADE, related_name='earnings')
+
+    # The StudentPremiumContent sold, kept as a plain id so deleting the sale leaves the ledger intact
+    purchase_id = models.BigIntegerField()
+
+    # Price paid by the student and the teacher's commission, negative for a reversal
+    price = models.DecimalField(max_digits=10, decimal_places=2)
+    amount = models.IntegerField()
+    is_reversal = models.BooleanField(default=False)
+
+    # Time of the sale (settable so existing sales keep their purchase date)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    # Whether the rollup job already added the entry to TeacherStats
+    rolled_up = models.BooleanField(default=False)
+
+    class Meta:
+        # Newest first, id breaks ties so cursor pagination always sees a stable order
+        ordering = ['-created_at', '-id']
+
+        indexes = [
+            # Seek index for the teacher's earnings history feed
+            models.Index(fields=['teacher', 'created_at', 'id'], name='earnings_teacher_date_idx'),
+            # The rollup job reads the pending entries in id order
+            models.Index(fields=['rolled_up', 'id'], name='earnings_rolled_up_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.teacher_id} {self.amount}'
@@ -1,16 +1,58 @@
 from rest_framework import serializers
-from .models import Profile_Teacher, Profile_Student
+from .models import Profile_Teacher, Profile_Student, TeacherStats, EarningsEntry
 from users.models import User
 from notes.models import Notes
 from django.db import connection
 from test_packages.models import TestPackage
 
+class TeacherStatsSerializer(serializers.ModelSerializer):
+    """
+    Serializer for the TeacherStats read model
+    Used by the teacher dashboard (get_teacher_stats)
+    """
+    average_score = serializers.DecimalField(max_digits=14, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = TeacherStats
+        fields = [
+            'number_of_exams',    # Test packages published
+            'number_of_notes',    # Notes published
+            'number_of_sales',    # Premium content sold
+            'revenue',            # Sum of the prices paid
+            'total_net',          # Teacher's share of the revenue
+            'number_of_buyers',   # Distinct students who bought from the teacher
+            'number_of_results',  # Exam results of students on the teacher's exams
+            'average_score',      # Average of those results
+        ]
+
+
+class EarningsEntrySerializer(serializers.ModelSerializer):
+    """
+    Serializer for one entry of a teacher's earnings history
+    """
+    class Meta:
+        model = EarningsEntry
+        fields = [
+            'id',
+            'purchase_id',  # StudentPremiumContent sold
+            'price',        # Price paid, negative for a reversal
+            'amount',       # Teacher's commission, negative for a reversal
+            'is_reversal',  # Whether the sale was cancelled
+            'created_at',   # Time of the sale
+        ]
+
+
 class ProfileTeacherSerializer(serializers.ModelSerializer):
     """
     Complete serializer for Profile_Teacher model
     Used for full CRUD operations with all model fields
     Provides comprehensive data representation for teacher profiles
+    The counters are read from the TeacherStats read model
     """
+    number_of_exams = serializers.IntegerField(source='stats.number_of_exams', read_only=True)
+    number_of_notes = serializers.IntegerField(source='stats.number_of_notes', read_only=True)
+    total_net = serializers.IntegerField(source='stats.total_net', read_only=True)
+
     class Meta:
         model = Profile_Teacher 
         # Include all fields for complete data representation
@@ -22,7 +64,11 @@ class TeacherPreviewSerializer(serializers.ModelSerializer):
     Preview serializer for Profile_Teacher model
     Used for listing teachers with essential fields only
     Optimized for displaying teacher information in lists and search results
+    The counters are read from the TeacherStats read model
     """
+    number_of_notes = serializers.IntegerField(source='stats.number_of_notes', read_only=True)
+    number_of_exams = serializers.IntegerField(source='stats.number_of_exams', read_only=True)
+
     class Meta:
         model = Profile_Teacher 
         # Define essential fields for teacher preview display
@@ -0,0 +1,78 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from notes.models import Notes
+from student_related_exams.models import DoneExams
+from StudentPremiumContent.models import StudentPremiumContent
+from test_packages.models import TestPackage
+from users.models import User
+from .earnings import record_reversal, record_sale
+from .models import Profile_Student, Profile_Teacher
+from .snapshots import invalidate as invalidate_snapshot
+from .stats import bump
+
+# Publisher changes of an existing package or note are not followed,
+# `manage.py rebuild_teacher_stats` recomputes the counts in that case
+
+
+@receiver(post_save, sender=TestPackage)
+def count_created_exam(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.publisher_id, number_of_exams=1)
+
+
+@receiver(post_delete, sender=TestPackage)
+def count_deleted_exam(sender, instance, **kwargs):
+    bump(instance.publisher_id, number_of_exams=-1)
+
+
+@receiver(post_save, sender=Notes)
+def count_created_note(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.publisher_id, number_of_notes=1)
+
+
+@receiver(post_delete, sender=Notes)
+def count_deleted_note(sender, instance, **kwargs):
+    bump(instance.publisher_id, number_of_notes=-1)
+
+
+# Sales only append to the earnings ledger, `manage.py rollup_earnings` folds them into the statistics
+
+@receiver(post_save, sender=StudentPremiumContent)
+def record_created_sale(sender, instance, created, **kwargs):
+    if created:
+        record_sale(instance)
+
+
+@receiver(post_delete, sender=StudentPremiumContent)
+def record_deleted_sale(sender, instance, **kwargs):
+    record_reversal(instance)
+
+
+@receiver(post_save, sender=DoneExams)
+def count_created_result(sender, instance, created, **kwargs):
+    if created:
+        bump(instance.publisher_id, number_of_results=1, total_score=instance.result)
+
+
+@receiver(post_delete, sender=DoneExams)
+def count_deleted_result(sender, instance, **kwargs):
+    bump(instance.publisher_id, number_of_results=-1, total_score=-instance.result)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile_Student)
+@receiver(post_delete, sender=Profile_Student)
+@receiver(post_save, sender=Profile_Teacher)
+@receiver(post_delete, sender=Profile_Teacher)
+def drop_profile_snapshot(sender, instance, **kwargs):
+    """
+    Drop the cached profile snapshot and teacher page of the user
+    Dropped again once committed, a read in between may have cached the old profile
+    """
+    user_id = instance.pk
+    invalidate_snapshot(user_id)
+    transaction.on_commit(lambda: invalidate_snapshot(user_id))
@@ -0,0 +1,116 @@
+"""
+Cached profile snapshot of every user
+login, token refresh and the teacher page only need a few fields of the user
+and of their student or teacher profile. A snapshot holding them is read with
+one query joining the user to both profile tables and cached, so the auth
+endpoints usually answer without reading the profile at all
+The teacher page keeps its rendered profile next to the snapshot, only the
+statistics (updated by the counters without a save) are read on every request
+The snapshots live in the shared cache, saving or deleting the user or one
+of its profiles drops both for every worker (profiles/signals.py)
+"""
+from django.core.cache import caches
+
+from users.models import User
+from .models import Profile_Teacher, TeacherStats
+from .serializers import ProfileTeacherSerializer
+
+snapshot_cache = caches['shared']
+
+# Longest time a snapshot stays cached (seconds), saves invalidate it earlier
+SNAPSHOT_TIMEOUT = 60 * 60
+
+# Profile columns of the snapshot, read from whichever profile the user has
+PROFILE_FIELDS = ('full_name', 'gender', 'Class', 'city')
+
+# Fields of ProfileTeacherSerializer read from TeacherStats
+STATS_FIELDS = ('number_of_exams', 'number_of_notes', 'total_net')
+
+
+def snapshot_key(user_id):
+    return f'profile_snapshot:{user_id}'
+
+
+def teacher_page_key(teacher_id):
+    return f'teacher_page:{teacher_id}'
+
+
+def _image_url(name):
+    if not name:
+        return None
+    return Profile_Teacher._meta.get_field('image').storage.url(name)
+
+
+def load_snapshot(user_id):
+    """
+    Read the snapshot of a user with one query, None if the user or their profile does not exist
+    """
+    columns = ['id', 'username', 'email', 'is_teacher', 'is_staff', 'profile_teacher__image']
+    for profile in ('profile_student', 'profile_teacher'):
+        columns.append(f'{profile}__user_id')
+        columns.extend(f'{profile}__{field}' for field in PROFILE_FIELDS)
+
+    row = User.objects.filter(pk=user_id).values(*columns).first()
+    if row is None:
+        return None
+
+    profile = 'profile_teacher' if row['is_teacher'] else 'profile_student'
+    if row[f'{profile}__user_id'] is None:
+        return None
+
+    return {
+        'id': row['id'],
+        'username': row['username'],
+        'email': row['email'],
+        'is_teacher': row['is_teacher'],
+        'is_staff': row['is_staff'],
+        'profile_id': row[f'{profile}__user_id'],
+        **{field: row[f'{profile}__{field}'] for field in PROFILE_FIELDS},
+        'image': _image_url(row['profile_teacher__image']) if row['is_teacher'] else None,
+    }
+
+
+def get_snapshot(user_id):
+    """
+    Return the snapshot of a user: id, username, email, is_teacher, is_staff,
+    profile_id, full_name, gender, Class, city and image (teachers only)
+    None if the user or their profile does not exist
+    """
+    key = snapshot_key(user_id)
+    snapshot = snapshot_cache.get(key)
+    if snapshot is None:
+        snapshot = load_snapshot(user_id)
+        if snapshot is not None:
+            snapshot_cache.set(key, snapshot, SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def get_teacher_page(teacher_id):
+    """
+    Return the ProfileTeacherSerializer data of a teacher, or None if there is no such teacher
+    The profile comes from the cache, the statistics are read fresh
+    """
+    key = teacher_page_key(teacher_id)
+    page = snapshot_cache.get(key)
+
+    if page is None:
+        # Cold: one joined query renders everything, the profile part is kept
+        teacher = Profile_Teacher.objects.select_related('stats').filter(user=teacher_id).first()
+        if teacher is None:
+            return None
+        data = ProfileTeacherSerializer(teacher).data
+        # The statistics fields keep their place in the cached page, filled on every read
+        snapshot_cache.set(key, {field: None if field in STATS_FIELDS else value for field, value in data.items()}, SNAPSHOT_TIMEOUT)
+        return data
+
+    stats = TeacherStats.objects.filter(teacher_id=teacher_id).first()
+    return {
+        **page,
+        'number_of_exams': stats and stats.number_of_exams,
+        'number_of_notes': stats and stats.number_of_notes,
+        'total_net': stats and stats.total_net,
+    }
+
+
+def invalidate(user_id):
+    snapshot_cache.delete_many([snapshot_key(user_id), teacher_page_key(user_id)])
@@ -0,0 +1,130 @@
+"""
+Maintenance of the TeacherStats read model
+bump() applies the change of one source row with a single relative UPDATE,
+rebuild() recomputes rows from the source tables (the earnings ledger for the
+sales) with one grouped query per table (used by the rebuild command),
+holding the lock of the rows it rewrites so no bump lands in between
+Rows are created with the teacher profile (models.py) and for existing
+teachers by migration 0023, so bump() never recomputes inside the
+transaction of the change it applies
+Sales reach the statistics through the earnings ledger instead (earnings.py)
+"""
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F, Q, Sum
+
+# Part of the price of premium content paid to its publisher
+TEACHER_SHARE = Decimal('0.7')
+
+STATS_FIELDS = [
+    'number_of_exams', 'number_of_notes', 'number_of_sales', 'revenue',
+    'total_net', 'number_of_buyers', 'number_of_results', 'total_score',
+]
+
+
+def commission(price):
+    """
+    Return the teacher's share of a sale (rounded down to a whole amount)
+    """
+    return int(Decimal(price) * TEACHER_SHARE)
+
+
+def bump(teacher_id, **deltas):
+    """
+    Add the deltas to the statistics of a teacher with one relative UPDATE
+    A teacher left without a row (created outside the signals) gets one holding
+    the deltas, `manage.py rebuild_teacher_stats` recounts what came before
+    Publishers without a teacher profile have no statistics
+    """
+    from .models import Profile_Teacher, TeacherStats
+
+    deltas = {field: delta for field, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    increments = {field: F(field) + delta for field, delta in deltas.items()}
+    if TeacherStats.objects.filter(teacher_id=teacher_id).update(**increments):
+        return
+
+    if Profile_Teacher.objects.filter(user_id=teacher_id).exists():
+        _, created = TeacherStats.objects.get_or_create(teacher_id=teacher_id, defaults=deltas)
+        if not created:
+            # Created by a concurrent transaction since the UPDATE
+            TeacherStats.objects.filter(teacher_id=teacher_id).update(**increments)
+
+
+def _grouped(queryset, teacher_field, teacher_ids, **aggregates):
+    """
+    Return {teacher id: {aggregate: value}} for one source table
+    """
+    if teacher_ids is not None:
+        queryset = queryset.filter(**{f'{teacher_field}__in': teacher_ids})
+
+    rows = queryset.order_by().values(teacher_field).annotate(**aggregates)
+    return {row.pop(teacher_field): row for row in rows}
+
+
+def rebuild(teacher_ids=None):
+    """
+    Recompute the statistics of the given teachers (every teacher by default)
+    Returns the number of rows written
+    """
+    from notes.models import Notes
+    from student_related_exams.models import DoneExams
+    from StudentPremiumContent.models import StudentPremiumContent
+    from test_packages.models import TestPackage
+    from .models import EarningsEntry, Profile_Teacher, TeacherStats
+
+    with transaction.atomic():
+        # bump() and the rollup wait on the locked rows, so no change lands
+        # between the reads below and the rows written from them
+        locked = TeacherStats.objects.select_for_update()
+        if teacher_ids is not None:
+            locked = locked.filter(teacher_id__in=teacher_ids)
+        list(locked.values_list('teacher_id', flat=True))
+
+        # Entries a running rollup is folding are left to it, it adds them to the rebuilt rows
+        pending = EarningsEntry.objects.select_for_update(skip_locked=True).filter(rolled_up=False)
+        if teacher_ids is not None:
+            pending = pending.filter(teacher_id__in=teacher_ids)
+        pending_ids = list(pending.values_list('id', flat=True))
+
+        exams = _grouped(TestPackage.objects.all(), 'publisher_id', teacher_ids, number_of_exams=Count('id'))
+        notes = _grouped(Notes.objects.all(), 'publisher_id', teacher_ids, number_of_notes=Count('id'))
+        # Sales are counted from the earnings ledger like the rollup folds them, renewals included
+        sales = _grouped(
+            EarningsEntry.objects.filter(Q(rolled_up=True) | Q(id__in=pending_ids)), 'teacher_id', teacher_ids,
+            number_of_sales=Count('id', filter=Q(is_reversal=False)) - Count('id', filter=Q(is_reversal=True)),
+            revenue=Sum('price'),
+            total_net=Sum('amount'),
+        )
+        buyers = _grouped(
+            StudentPremiumContent.objects.all(), 'publisher_id', teacher_ids,
+            number_of_buyers=Count('student', distinct=True),
+        )
+        results = _grouped(
+            DoneExams.objects.all(), 'publisher_id', teacher_ids,
+            number_of_results=Count('id'),
+            total_score=Sum('result'),
+        )
+
+        teachers = Profile_Teacher.objects.order_by('user_id')
+        if teacher_ids is not None:
+            teachers = teachers.filter(user_id__in=teacher_ids)
+
+        rows = []
+        for teacher_id in teachers.values_list('user_id', flat=True):
+            values = {field: 0 for field in STATS_FIELDS}
+            for source in (exams, notes, sales, buyers, results):
+                values.update({field: value or 0 for field, value in source.get(teacher_id, {}).items()})
+            values['total_net'] = int(values['total_net'])
+            rows.append(TeacherStats(teacher_id=teacher_id, **values))
+
+        locked.delete()
+        TeacherStats.objects.bulk_create(rows, batch_size=1000)
+
+        # Only the entries counted above are taken from the rollup, later ones are still folded by it
+        EarningsEntry.objects.filter(id__in=pending_ids).update(rolled_up=True)
+
+    return len(rows)
@@ -1,3 +1,278 @@
+from datetime import date
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import caches
 from django.test import TestCase
 
+from myproject.testing import QueryPlanTestMixin, QueryRecorder
+from notes.models import Notes
+from student_related_exams.models import DoneExams
+from StudentPremiumContent.models import StudentPremiumContent
+from test_packages.models import TestPackage
+from users.models import User
+from .earnings import reconcile, rollup
+from .models import EarningsEntry, Profile_Student, Profile_Teacher, TeacherStats
+from . import snapshots
+from .snapshots import get_snapshot, get_teacher_page
+from . import stats as teacher_stats
+from .stats import bump, rebuild
+
 # Create your tests here.
+
+CITIES = ['damascus', 'aleppo', 'homs', 'latakia']
+SUBJECTS = ['math', 'physics', 'chemistry', 'science', 'arabic']
+
+
+class TeacherPreviewIndexTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that the teacher search is served by the (Class, city, studying_subjects) index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(120):
+            user = User.objects.create(username=f'teacher{i}', email=f'teacher{i}@svi.com', is_teacher=True)
+            Profile_Teacher.objects.filter(user=user).update(
+                full_name=f'teacher {i}',
+                Class=['12', '9', '9_12'][i % 3],
+                city=CITIES[i % len(CITIES)],
+                studying_subjects=SUBJECTS[i % len(SUBJECTS)],
+            )
+
+    def test_filtered_preview_uses_class_city_subject_index(self):
+        self.assertEndpointUsesIndex(
+            '/profiles/get_teacher_preview/',
+            Profile_Teacher,
+            'teacher_class_city_subj_idx',
+            {'Class': '12', 'city': 'homs', 'subject_name': 'math', 'count': 1, 'limit': 10},
+        )
+
+    def test_unfiltered_preview_uses_class_index_prefix(self):
+        self.assertEndpointUsesIndex(
+            '/profiles/get_teacher_preview/',
+            Profile_Teacher,
+            'teacher_class_city_subj_idx',
+            {'Class': '9', 'city': 'all', 'subject_name': 'عرض الكل', 'count': 1, 'limit': 10},
+        )
+
+
+class TeacherStatsTests(TestCase):
+    """
+    The teacher statistics follow the source tables and match a full rebuild
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+        cls.teacher = Profile_Teacher.objects.get(user=user)
+        cls.students = [
+            Profile_Student.objects.get(user=User.objects.create(username=f'student{i}', email=f'student{i}@svi.com'))
+            for i in range(2)
+        ]
+
+    def purchase(self, student, content_id, price):
+        return StudentPremiumContent.objects.create(
+            student=student, Class='12', type='exam', subject_name='math_12', content_id=content_id,
+            content_name='package', publisher_id=self.teacher, publisher_name='teacher',
+            price=price, date_of_expiry=date(2100, 1, 1),
+        )
+
+    def stats(self):
+        return TeacherStats.objects.get(teacher=self.teacher)
+
+    def test_stats_follow_source_tables(self):
+        packages = [
+            TestPackage.objects.create(
+                package_name=f'package {i}', units='unit', subject_name='math_12',
+                price=1000, number_of_questions=10, publisher_id=self.teacher.pk,
+            )
+            for i in range(3)
+        ]
+        Notes.objects.create(title='note', content='content', publisher_id=self.teacher.pk)
+        packages[0].delete()
+
+        first = self.purchase(self.students[0], packages[1].pk, 1000)
+        self.purchase(self.students[0], packages[2].pk, 555)
+        self.purchase(self.students[1], packages[1].pk, 1000)
+        first.delete()
+
+        # Sales reach the statistics with the rollup
+        self.assertEqual(self.stats().number_of_sales, 0)
+        self.assertEqual(rollup(), 4)
+
+        for result in (80, 90):
+            DoneExams.objects.create(
+                student=self.students[0], subject_name='math_12', exam_name='package',
+                exam_id=str(packages[1].pk), publisher_id=self.teacher.pk, result=result,
+            )
+
+        stats = self.stats()
+        self.assertEqual(stats.number_of_exams, 2)
+        self.assertEqual(stats.number_of_notes, 1)
+        self.assertEqual(stats.number_of_sales, 2)
+        self.assertEqual(stats.revenue, Decimal('1555'))
+        self.assertEqual(stats.total_net, 700 + 388)
+        self.assertEqual(stats.number_of_buyers, 2)
+        self.assertEqual(stats.average_score, Decimal('85'))
+
+        # A full rebuild from the source tables gives the same numbers
+        maintained = {field: getattr(stats, field) for field in ['number_of_exams', 'number_of_notes', 'number_of_sales',
+                      'revenue', 'total_net', 'number_of_buyers', 'number_of_results', 'total_score']}
+        rebuild([self.teacher.pk])
+        stats = self.stats()
+        self.assertEqual(maintained, {field: getattr(stats, field) for field in maintained})
+
+    def test_sale_posted_during_a_rebuild_is_left_to_the_rollup(self):
+        grouped = teacher_stats._grouped
+
+        def post_sale_then_read(*args, **kwargs):
+            # Committed after the rebuild read the pending entries
+            if not EarningsEntry.objects.exists():
+                EarningsEntry.objects.create(teacher_id=self.teacher.pk, purchase_id=1, price=1000, amount=700)
+            return grouped(*args, **kwargs)
+
+        with mock.patch.object(teacher_stats, '_grouped', post_sale_then_read):
+            rebuild([self.teacher.pk])
+        self.assertEqual(self.stats().number_of_sales, 0)
+
+        self.assertEqual(rollup(), 1)
+        self.assertEqual((self.stats().number_of_sales, self.stats().total_net), (1, 700))
+
+    def test_profile_endpoints_read_stats(self):
+        TestPackage.objects.create(
+            package_name='package', units='unit', subject_name='math_12',
+            price=0, number_of_questions=10, publisher_id=self.teacher.pk,
+        )
+
+        # The old client calls no longer change the counts
+        self.client.post(f'/profiles/increase_number_of_teacher_exams/{self.teacher.pk}/')
+
+        info = self.client.get(f'/profiles/get_teacher_info/{self.teacher.pk}/').json()
+        self.assertEqual(info['number_of_exams'], 1)
+        self.assertNotIn('stats', info)
+
+        dashboard = self.client.get(f'/profiles/get_teacher_stats/{self.teacher.pk}/').json()
+        self.assertEqual(dashboard['number_of_exams'], 1)
+        self.assertIsNone(dashboard['average_score'])
+
+    def test_new_teacher_gets_a_row(self):
+        user = User.objects.create(username='new_teacher', email='new_teacher@svi.com', is_teacher=True)
+
+        self.assertTrue(TeacherStats.objects.filter(teacher_id=user.pk).exists())
+
+    def test_missing_row_is_created_without_a_rebuild(self):
+        TeacherStats.objects.filter(teacher=self.teacher).delete()
+
+        # The UPDATE, the profile check and get_or_create, no aggregate over the source tables
+        with QueryRecorder() as recorder:
+            bump(self.teacher.pk, number_of_exams=1)
+        self.assertEqual(recorder.queries, 4)
+        self.assertEqual(self.stats().number_of_exams, 1)
+
+        bump(self.teacher.pk, number_of_exams=1, number_of_results=1)
+        self.assertEqual((self.stats().number_of_exams, self.stats().number_of_results), (2, 1))
+
+    def test_publisher_without_teacher_profile_has_no_row(self):
+        student = self.students[0]
+
+        bump(student.pk, number_of_exams=1)
+
+        self.assertFalse(TeacherStats.objects.filter(teacher_id=student.pk).exists())
+
+    def test_sales_are_appended_to_the_ledger(self):
+        first = self.purchase(self.students[0], 1, 1000)
+        self.purchase(self.students[1], 1, 10)
+        first.delete()
+
+        entries = EarningsEntry.objects.filter(teacher=self.teacher).order_by('id')
+        self.assertEqual([entry.amount for entry in entries], [700, 7, -700])
+        self.assertEqual([entry.is_reversal for entry in entries], [False, False, True])
+        self.assertEqual(reconcile(), {})
+
+        dashboard = self.client.get(f'/profiles/get_teacher_stats/{self.teacher.pk}/').json()
+        self.assertEqual((dashboard['total_net'], dashboard['pending_net']), (0, 7))
+
+        rollup(batch_size=2)
+        dashboard = self.client.get(f'/profiles/get_teacher_stats/{self.teacher.pk}/').json()
+        self.assertEqual((dashboard['total_net'], dashboard['pending_net']), (7, 0))
+        self.assertEqual((dashboard['number_of_sales'], dashboard['number_of_buyers']), (1, 1))
+
+        history = self.client.get(f'/profiles/get_teacher_earnings/{self.teacher.pk}/', {'count': 1, 'limit': 2}).json()
+        self.assertEqual(history['number'], 3)
+        self.assertEqual([entry['amount'] for entry in history['earnings']], [-700, 7])
+
+        feed = self.client.get(f'/profiles/get_teacher_earnings/{self.teacher.pk}/', {'cursor': '', 'limit': 2}).json()
+        following = self.client.get(
+            f'/profiles/get_teacher_earnings/{self.teacher.pk}/', {'cursor': feed['next_cursor'], 'limit': 2}
+        ).json()
+        self.assertEqual([entry['amount'] for entry in following['earnings']], [700])
+
+
+class ProfileSnapshotTests(TestCase):
+    """
+    Profile snapshots are read with one joined query, shared by the workers
+    and dropped for all of them when the user or profile is saved
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = User.objects.create(username='student', email='student@svi.com')
+        Profile_Student.objects.filter(user=cls.student).update(full_name='student', Class='9', city='homs')
+        cls.teacher = User.objects.create(username='teacher', email='teacher@svi.com', is_teacher=True)
+
+    def setUp(self):
+        caches['shared'].clear()
+
+    def test_snapshot_is_cached(self):
+        with self.assertNumQueries(1):
+            snapshot = get_snapshot(self.student.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_snapshot(self.student.pk), snapshot)
+
+        self.assertEqual(snapshot['profile_id'], self.student.pk)
+        self.assertEqual((snapshot['full_name'], snapshot['Class'], snapshot['city']), ('student', '9', 'homs'))
+        self.assertFalse(snapshot['is_teacher'])
+        self.assertIsNone(snapshot['image'])
+
+    def test_saves_drop_the_snapshot(self):
+        get_snapshot(self.student.pk)
+        profile = Profile_Student.objects.get(user=self.student)
+        profile.Class = '12'
+        profile.save()
+        self.assertEqual(get_snapshot(self.student.pk)['Class'], '12')
+
+        self.student.email = 'new@svi.com'
+        self.student.save()
+        self.assertEqual(get_snapshot(self.student.pk)['email'], 'new@svi.com')
+
+    def test_save_in_another_worker_invalidates(self):
+        get_snapshot(self.student.pk)
+
+        # Another worker has its own cache connection, only the backend is shared
+        with mock.patch.object(snapshots, 'snapshot_cache', caches.create_connection('shared')):
+            profile = Profile_Student.objects.get(user=self.student)
+            profile.city = 'aleppo'
+            profile.save()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(get_snapshot(self.student.pk)['city'], 'aleppo')
+
+    def test_teacher_snapshot_reads_teacher_profile(self):
+        teacher = Profile_Teacher.objects.get(user=self.teacher)
+        teacher.full_name = 'teacher'
+        teacher.save()
+
+        snapshot = get_snapshot(self.teacher.pk)
+        self.assertTrue(snapshot['is_teacher'])
+        self.assertEqual(snapshot['full_name'], 'teacher')
+
+    def test_teacher_page_reads_fresh_statistics(self):
+        self.assertEqual(get_teacher_page(self.teacher.pk)['number_of_exams'], 0)
+
+        # Counters change without saving the profile
+        bump(self.teacher.pk, number_of_exams=2)
+        with self.assertNumQueries(1):
+            page = get_teacher_page(self.teacher.pk)
+        self.assertEqual(page['number_of_exams'], 2)
+        self.assertIsNone(get_teacher_page(0))
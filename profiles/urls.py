@@ -11,6 +11,8 @@ urlpatterns = [
      # Check if student has sufficient balance
      path('check_student_balance/', views.check_student_balance, name='check_student_balance'),
      
+     path('get_teacher_stats/<int:id>/', views.get_teacher_stats),
+     path('get_teacher_earnings/<int:id>/', views.get_teacher_earnings),
      path('increase_number_of_teacher_exams/<int:id>/', views.increase_number_of_teacher_exams),
      path('decrease_number_of_teacher_exams/<int:id>/', views.decrease_number_of_teacher_exams),
      path('increase_number_of_teacher_notes/<int:id>/', views.increase_number_of_teacher_notes),
@@ -1,35 +1,39 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from .models import Profile_Teacher, Profile_Student
+from .models import Profile_Teacher, Profile_Student, TeacherStats, EarningsEntry
+from .earnings import pending_net
+from .snapshots import get_teacher_page
 from users.models import User
 from django.db.models import Q
-from .serializers import ProfileTeacherSerializer, TeacherPreviewSerializer, StudentOwnProfile, StudentProfileUpdateSerializer
+from .serializers import TeacherPreviewSerializer, TeacherStatsSerializer, EarningsEntrySerializer, StudentOwnProfile, StudentProfileUpdateSerializer
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.views import APIView
 from test_packages.models import TestPackage
 from notes.models import Notes
+from myproject.pagination import paginate, keyset_paginate, cursor_total, MAX_PAGE_SIZE
+from myproject.projection import optimize
+from django.shortcuts import get_object_or_404
+from search.index import search
 
 # Create your views here.
 
-@api_view(['GET'])
-def get_teacher_preview(request):
+def teacher_catalogue(params):
     """
-    Get a filtered preview of teachers based on search criteria
-    Returns paginated list of teachers matching the specified filters
+    Build the filtered, optimized queryset of get_teacher_preview from its query parameters
+    Shared by the DRF view and its async twin (async_views.py)
     """
-    # Get query parameters for filtering
-    Class = request.GET.get('Class')
-    subject_name = request.GET.get('subject_name')
-    city = request.GET.get('city')
-    count = request.GET.get('count')
-    limit = request.GET.get('limit')
-    name = request.GET.get('name')
+    Class = params.get('Class')
+    subject_name = params.get('subject_name')
+    city = params.get('city')
+    name = params.get('name')
 
     # Filter teachers by class (including those who teach both 9 and 12)
-    result = Profile_Teacher.objects.filter(Q(Class=Class) | Q(Class='9_12'))
+    # ordered by id so pages are stable
+    result = Profile_Teacher.objects.filter(Q(Class=Class) | Q(Class='9_12')).order_by('user_id')
     
+    # Search by name through the search index (best matches first)
     if name is not None:
-        result = result.filter(full_name__icontains=name)
+        result = search(result, 'teacher', 'full_name', name)
     
     # Apply city filter if not 'all'
     if city != 'all':
@@ -43,14 +47,31 @@ def get_teacher_preview(request):
         else:
             result = result.filter(studying_subjects=subject_name)
     
-    # Serialize the filtered teacher data
-    serial = TeacherPreviewSerializer(result, many=True)
+    # Load only the columns of the preview (no bio or contact details)
+    # with the statistics joined
+    return optimize(result, TeacherPreviewSerializer)
 
-    # Apply pagination
-    begin = (int(count) - 1) * int(limit)
-    end = int(count) * int(limit)
 
-    return Response({'teacher_preview': serial.data[begin:end], 'number': len(serial.data)}, status=200)
+@api_view(['GET'])
+def get_teacher_preview(request):
+    """
+    Get a filtered preview of teachers based on search criteria
+    Returns paginated list of teachers matching the specified filters
+    """
+    # Get query parameters for pagination
+    count = request.GET.get('count')
+    limit = request.GET.get('limit')
+
+    # Filter, search and optimize the teachers
+    result = teacher_catalogue(request.GET)
+
+    # Apply pagination in the database
+    page, number = paginate(result, count, limit)
+
+    # Serialize only the requested page of teachers
+    serial = TeacherPreviewSerializer(page, many=True)
+
+    return Response({'teacher_preview': serial.data, 'number': number}, status=200)
 
 
 @api_view(['GET'])
@@ -58,30 +79,79 @@ def get_teacher_info(request, id):
     """
     Get detailed information about a specific teacher
     Returns complete teacher profile data
+    The profile is rendered from the cache (profiles/snapshots.py), only the statistics are read
     """
-    # Get the teacher profile by user ID
-    query = Profile_Teacher.objects.get(user=id)
-    
-    # Serialize the teacher data
-    serial = ProfileTeacherSerializer(query)
+    data = get_teacher_page(id)
+    if data is None:
+        return Response({'error': 'لم يتم العثور على المعلم'}, status=404)
 
-    return Response(serial.data, status=200)
+    return Response(data, status=200)
+
+
+@api_view(['GET'])
+def get_teacher_stats(request, id):
+    """
+    Get the statistics of a teacher for the teacher dashboard
+    Read from the TeacherStats read model, plus the earnings not yet rolled up
+    """
+    # Get the statistics row or return 404 if the teacher does not exist
+    stats = get_object_or_404(TeacherStats, teacher=id)
+
+    # Serialize the statistics
+    serial = TeacherStatsSerializer(stats)
+
+    return Response({**serial.data, 'pending_net': pending_net(id)}, status=200)
+
+
+@api_view(['GET'])
+def get_teacher_earnings(request, id):
+    """
+    Get the earnings history of a teacher (newest first) with pagination
+    Pass ?cursor= (empty for the first page) to page with cursors instead of count
+    """
+    count = request.GET.get('count', 1)
+    limit = request.GET.get('limit', 10)
+    cursor = request.GET.get('cursor')
+
+    queryset = EarningsEntry.objects.filter(teacher_id=id)
+
+    # Opt-in cursor pagination seeks on (created_at, id) instead of using OFFSET
+    if cursor is not None:
+        try:
+            page, next_cursor, previous_cursor = keyset_paginate(queryset, cursor, limit, 'created_at')
+        except (ValueError, TypeError):
+            return Response({'error': 'مؤشر الصفحة غير صحيح'}, status=400)
+
+        serial = EarningsEntrySerializer(page, many=True)
+
+        return Response({
+            'earnings': serial.data,
+            'number': cursor_total(queryset, cursor),
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor,
+        }, status=200)
+
+    # Apply pagination in the database
+    try:
+        page, number = paginate(queryset, count, limit)
+    except (ValueError, TypeError):
+        page, number = paginate(queryset, 1, MAX_PAGE_SIZE)
+
+    serial = EarningsEntrySerializer(page, many=True)
+
+    return Response({'earnings': serial.data, 'number': number}, status=200)
 
 
 @api_view(['POST'])
 def increase_number_of_teacher_exams(request, id):
     """
     Increase the exam count for a specific teacher
-    Increments the teacher's exam counter by 1
+    Kept for older clients, the count is maintained from the published packages
     """
-    # Get the teacher profile by user ID
-    obj = Profile_Teacher.objects.get(user=id)
-    
-    # Increment the exam count
-    obj.number_of_exams += 1
+    # Make sure the teacher exists, reading its primary key only
+    get_object_or_404(Profile_Teacher.objects.only('user'), user=id)
     
-    # Save the updated profile
-    obj.save()
+    # TeacherStats.number_of_exams follows the test packages table (profiles/signals.py)
     
     return Response('تم زيادة عدد اختبارات المعلم بنجاح', status=200)
 
@@ -90,16 +160,12 @@ def increase_number_of_teacher_exams(request, id):
 def decrease_number_of_teacher_exams(request, id):
     """
     Decrease the exam count for a specific teacher
-    Decrements the teacher's exam counter by 1
+    Kept for older clients, the count is maintained from the published packages
     """
-    # Get the teacher profile by user ID
-    obj = Profile_Teacher.objects.get(user=id)
-    
-    # Decrement the exam count
-    obj.number_of_exams -= 1
+    # Make sure the teacher exists, reading its primary key only
+    get_object_or_404(Profile_Teacher.objects.only('user'), user=id)
     
-    # Save the updated profile
-    obj.save()
+    # TeacherStats.number_of_exams follows the test packages table (profiles/signals.py)
     
     return Response('تم تقليل عدد اختبارات المعلم بنجاح', status=200)
 
@@ -108,16 +174,12 @@ def decrease_number_of_teacher_exams(request, id):
 def increase_number_of_teacher_notes(request, id):
     """
     Increase the notes count for a specific teacher
-    Increments the teacher's notes counter by 1
+    Kept for older clients, the count is maintained from the published notes
     """
-    # Get the teacher profile by user ID
-    obj = Profile_Teacher.objects.get(user=id)
+    # Make sure the teacher exists, reading its primary key only
+    get_object_or_404(Profile_Teacher.objects.only('user'), user=id)
     
-    # Increment the notes count
-    obj.number_of_notes += 1
-    
-    # Save the updated profile
-    obj.save()
+    # TeacherStats.number_of_notes follows the notes table (profiles/signals.py)
     
     return Response('تم زيادة عدد ملاحظات المعلم بنجاح', status=200)
 
@@ -126,16 +188,12 @@ def increase_number_of_teacher_notes(request, id):
 def decrease_number_of_teacher_notes(request, id):
     """
     Decrease the notes count for a specific teacher
-    Decrements the teacher's notes counter by 1
+    Kept for older clients, the count is maintained from the published notes
     """
-    # Get the teacher profile by user ID
-    obj = Profile_Teacher.objects.get(user=id)
-    
-    # Decrement the notes count
-    obj.number_of_notes -= 1
+    # Make sure the teacher exists, reading its primary key only
+    get_object_or_404(Profile_Teacher.objects.only('user'), user=id)
     
-    # Save the updated profile
-    obj.save()
+    # TeacherStats.number_of_notes follows the notes table (profiles/signals.py)
     
     return Response('تم تقليل عدد ملاحظات المعلم بنجاح', status=200)
 
@@ -0,0 +1,42 @@
+"""
+Bundled exam payload: every question of a package with its images grouped by field
+Built with one questions query and one prefetched images query, so rendering
+an exam costs the same two queries whatever the number of questions
+"""
+from django.db.models import Prefetch
+
+from .models import Questions, QuestionImages
+from .serializers import QuestionSerializer
+
+# The parts of a question an image can be attached to
+IMAGE_FIELDS = [name for name, _ in QuestionImages.field_name_choices]
+
+
+def exam_payload(package_id):
+    """
+    Return the exam of a package as plain data:
+    {'package_id': ..., 'questions': [{...question fields, 'images': {field: [image, ...]}}]}
+    """
+    questions = Questions.objects.filter(package_id=package_id).order_by('id').prefetch_related(
+        Prefetch('questionimages_set', queryset=QuestionImages.objects.order_by('id'))
+    )
+
+    return {'package_id': package_id, 'questions': [question_payload(question) for question in questions]}
+
+
+def question_payload(question):
+    """
+    Return one question as plain data with its (prefetched) images grouped by field
+    """
+    data = dict(QuestionSerializer(question).data)
+
+    # Every field is present so the client never has to ask for a missing one
+    images = {field: [] for field in IMAGE_FIELDS}
+    for image in question.questionimages_set.all():
+        images.setdefault(image.field_name, []).append({
+            'id': image.id,
+            'images': image.images.url if image.images else None,
+        })
+    data['images'] = images
+
+    return data
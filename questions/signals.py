@@ -0,0 +1,37 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from test_packages.models import TestPackage
+from .models import Questions, QuestionImages
+from .snapshots import drop_snapshot
+
+
+@receiver(post_save, sender=Questions)
+@receiver(post_delete, sender=Questions)
+def bump_exam_version(sender, instance, **kwargs):
+    """
+    Move the package of a saved or deleted question to a new exam version
+    Its snapshot is compiled again on the next read once the change is committed
+    """
+    TestPackage.objects.filter(id=instance.package_id).update(exam_version=F('exam_version') + 1)
+
+
+@receiver(post_save, sender=QuestionImages)
+@receiver(post_delete, sender=QuestionImages)
+def bump_exam_version_images(sender, instance, **kwargs):
+    """
+    Move the package of the question an image was added to or removed from to a new exam version
+    """
+    TestPackage.objects.filter(questions__id=instance.test_id_id).update(exam_version=F('exam_version') + 1)
+
+
+@receiver(post_delete, sender=TestPackage)
+def drop_exam_snapshot(sender, instance, **kwargs):
+    """
+    Forget the exam snapshot of a deleted package
+    """
+    package_id, version = instance.id, instance.__dict__.get('exam_version')
+    if version is not None:
+        transaction.on_commit(lambda: drop_snapshot(package_id, version))
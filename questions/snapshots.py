@@ -0,0 +1,74 @@
+"""
+Precompiled exam snapshots
+An exam is read thousands of times for every edit, so the payload of
+exam_payload() is compiled once into JSON bytes and kept in the
+'exam_snapshots' cache together with its content version (a hash of the bytes,
+also used as the ETag). Reads serve the stored bytes without a serializer
+Snapshots are keyed on TestPackage.exam_version, which every change to the
+questions or images of a package bumps in the transaction of the change
+(questions/signals.py). A read looks the version up with one primary key
+query, so an edit makes the next read compile the exam again from the
+database. A snapshot is never patched, and a read racing an edit can at worst
+store the exam under a version nobody asks for anymore
+"""
+import hashlib
+import json
+
+from django.core.cache import caches
+
+from test_packages.models import TestPackage
+from .exam import exam_payload
+
+snapshot_cache = caches['exam_snapshots']
+
+
+def snapshot_key(package_id, version):
+    return f'exam:{package_id}:{version}'
+
+
+def encode(data):
+    """
+    Encode data the way the JSON renderer of the API does
+    """
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), default=str).encode()
+
+
+class Snapshot:
+    """
+    Compiled exam of one package
+    exam: bytes of the bundled exam (get_exam)
+    questions: bytes of the question list without images (get_all_questions)
+    """
+
+    def __init__(self, payload):
+        self.exam = encode(payload)
+        self.questions = encode([
+            {field: value for field, value in question.items() if field != 'images'}
+            for question in payload['questions']
+        ])
+        self.version = hashlib.sha256(self.exam).hexdigest()[:32]
+
+    @property
+    def etag(self):
+        return f'"{self.version}"'
+
+
+def get_snapshot(package_id):
+    """
+    Return the snapshot of a package, compiling and storing it on a miss
+    None when the package does not exist, nothing is stored for it
+    """
+    version = TestPackage.objects.filter(id=package_id).values_list('exam_version', flat=True).first()
+    if version is None:
+        return None
+
+    key = snapshot_key(package_id, version)
+    snapshot = snapshot_cache.get(key)
+    if snapshot is None:
+        snapshot = Snapshot(exam_payload(package_id))
+        snapshot_cache.set(key, snapshot)
+    return snapshot
+
+
+def drop_snapshot(package_id, version):
+    snapshot_cache.delete(snapshot_key(package_id, version))
@@ -1,3 +1,132 @@
+from django.core.cache import cache, caches
 from django.test import TestCase
 
+from test_packages.models import TestPackage
+from .exam import IMAGE_FIELDS, exam_payload
+from .models import Questions, QuestionImages
+from .snapshots import snapshot_key
+
 # Create your tests here.
+
+
+class ExamBundleTests(TestCase):
+    """
+    The bundled exam carries every question with its images grouped by field,
+    costs two queries and answers repeat loads with 304
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = TestPackage.objects.create(
+            package_name='package', units='unit', subject_name='math_12', price=0,
+            number_of_questions=3, publisher_id=1,
+        )
+        cls.questions = [
+            Questions.objects.create(package=cls.package, test_content=f'question {i}', right_answer='B')
+            for i in range(3)
+        ]
+        QuestionImages.objects.create(test_id=cls.questions[0], field_name='option_A', images='ImagesForQuestions/a.png')
+        QuestionImages.objects.create(test_id=cls.questions[0], field_name='explanation', images='ImagesForQuestions/e.png')
+
+    def setUp(self):
+        cache.clear()
+        caches['exam_snapshots'].clear()
+
+    def test_payload_groups_images_by_field_in_two_queries(self):
+        with self.assertNumQueries(2):
+            payload = exam_payload(self.package.pk)
+
+        self.assertEqual([question['id'] for question in payload['questions']], [q.id for q in self.questions])
+        images = payload['questions'][0]['images']
+        self.assertEqual(set(images), set(IMAGE_FIELDS))
+        self.assertEqual([image['images'] for image in images['option_A']], ['/media/ImagesForQuestions/a.png'])
+        self.assertEqual(len(images['explanation']), 1)
+        self.assertEqual(images['test_content'], [])
+        self.assertEqual(payload['questions'][1]['images']['option_A'], [])
+
+    def test_repeat_load_with_the_etag_is_not_modified(self):
+        response = self.client.get(f'/questions/exam/{self.package.pk}/')
+        etag = response['ETag']
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(etag.startswith('"'))
+        self.assertEqual(len(response.json()['questions']), 3)
+
+        repeat = self.client.get(f'/questions/exam/{self.package.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(repeat.status_code, 304)
+        self.assertEqual(repeat['ETag'], etag)
+        self.assertEqual(repeat.content, b'')
+
+    def test_stale_etag_gets_the_exam(self):
+        response = self.client.get(f'/questions/exam/{self.package.pk}/', HTTP_IF_NONE_MATCH='"stale"')
+
+        self.assertEqual(response.status_code, 200)
+
+
+class ExamSnapshotTests(TestCase):
+    """
+    Snapshots follow every committed edit of the questions and images, and
+    nothing is stored for packages that do not exist
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.package = TestPackage.objects.create(
+            package_name='package', units='unit', subject_name='math_12', price=0,
+            number_of_questions=2, publisher_id=1,
+        )
+        cls.question = Questions.objects.create(package=cls.package, test_content='question', right_answer='A')
+
+    def setUp(self):
+        cache.clear()
+        caches['exam_snapshots'].clear()
+
+    def exam(self):
+        return self.client.get(f'/questions/exam/{self.package.pk}/')
+
+    def contents(self):
+        return [question['test_content'] for question in self.exam().json()['questions']]
+
+    def test_repeat_read_is_served_from_the_snapshot(self):
+        self.exam()
+        # A change that sends no signal is not seen, the stored snapshot is served
+        Questions.objects.filter(id=self.question.id).update(test_content='changed')
+
+        self.assertEqual(self.contents(), ['question'])
+
+    def test_edit_endpoint_compiles_a_new_snapshot(self):
+        etag = self.exam()['ETag']
+
+        response = self.client.put(f'/questions/edit_question_by_id/{self.question.pk}/', {
+            'test_content': 'edited', 'option_A': 'a', 'option_B': 'b', 'option_C': 'c',
+            'option_D': 'd', 'option_E': 'e', 'explanation': 'why', 'right_answer': 'B',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        fresh = self.exam()
+        self.assertNotEqual(fresh['ETag'], etag)
+        self.assertEqual(fresh.json()['questions'][0]['test_content'], 'edited')
+
+    def test_added_and_deleted_questions_are_seen(self):
+        self.exam()
+
+        added = Questions.objects.create(package=self.package, test_content='second', right_answer='A')
+        self.assertEqual(self.contents(), ['question', 'second'])
+
+        added.delete()
+        self.assertEqual(self.contents(), ['question'])
+
+    def test_new_image_is_seen(self):
+        self.exam()
+
+        QuestionImages.objects.create(test_id=self.question, field_name='option_B', images='ImagesForQuestions/b.png')
+
+        images = self.exam().json()['questions'][0]['images']['option_B']
+        self.assertEqual([image['images'] for image in images], ['/media/ImagesForQuestions/b.png'])
+
+    def test_unknown_package_is_404_and_not_stored(self):
+        missing = self.package.pk + 1000
+
+        self.assertEqual(self.client.get(f'/questions/exam/{missing}/').status_code, 404)
+        self.assertEqual(self.client.get(f'/questions/all_questions/{missing}/').status_code, 404)
+        self.assertIsNone(caches['exam_snapshots'].get(snapshot_key(missing, 0)))
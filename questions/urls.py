@@ -7,6 +7,7 @@ from . import views
 
 urlpatterns = [
     path('all_questions/<int:package_id>/', views.get_all_questions),
+    path('exam/<int:package_id>/', views.get_exam),
     path('add_questions/', views.add_questions.as_view()),
     path('add_question_images/', views.AddQuestionImages.as_view()),
     path('get_question_images/<int:test_id>/', views.get_question_images),
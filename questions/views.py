@@ -6,6 +6,12 @@ from .models import Questions, QuestionImages
 from .serializers import QuestionSerializer, QuestionImageSerializer   
 from rest_framework import generics  
 from rest_framework.parsers import MultiPartParser, FormParser
+from myproject.pagination import BoundedListMixin
+from myproject.projection import project, ProjectedListMixin
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from .snapshots import get_snapshot
+from StudentPremiumContent.entitlements import access_denied, get_content_terms
 
 # Create your views here.
  
@@ -14,17 +20,68 @@ def get_all_questions(request, package_id):
     """
     Get all questions for a specific package
     Returns all questions associated with the given package ID
+    Served from the precompiled exam snapshot of the package
+    A paid package is only sent to its publisher, staff, or a student with an active purchase
     """
-    # Filter questions by package ID and order by question ID
-    obj = Questions.objects.filter(package_id=package_id).order_by('id') 
+    denied = exam_access_denied(request, package_id)
+    if denied is not None:
+        return denied
 
-    # Serialize the filtered questions data
-    serial = QuestionSerializer(obj, many=True) 
+    snapshot = get_snapshot(package_id)
+    if snapshot is None:
+        return Response({'error': 'الحزمة غير موجودة'}, status=404)
 
-    return Response(serial.data)
+    return snapshot_response(request, snapshot, snapshot.questions)
+
+
+def exam_access_denied(request, package_id):
+    """
+    Return the 403 response refusing a paid package to request.user, or None
+    The price and publisher of the package come from the content terms cache
+    """
+    terms = get_content_terms('exam', package_id)
+    if terms is None:
+        return None
+    return access_denied(request, 'exam', package_id, *terms)
+
+
+def snapshot_response(request, snapshot, body):
+    """
+    Send precompiled JSON bytes of an exam snapshot with its version as a strong ETag
+    A request whose If-None-Match carries the current version gets 304 Not Modified
+    """
+    not_modified = get_conditional_response(request, etag=snapshot.etag)
+    if not_modified is not None:
+        not_modified['ETag'] = snapshot.etag
+        return not_modified
+
+    response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = snapshot.etag
+    return response
+
+
+@api_view(['GET'])
+def get_exam(request, package_id):
+    """
+    Get a whole exam in one response: every question of the package with its
+    images grouped by field (test_content, option_A..E, explanation)
+    Replaces get_all_questions plus one get_question_images call per question and field
+    Sends a strong ETag, a repeat load of an unchanged exam gets 304 Not Modified
+    Served as raw bytes from the precompiled exam snapshot of the package
+    A paid package is only sent to its publisher, staff, or a student with an active purchase
+    """
+    denied = exam_access_denied(request, package_id)
+    if denied is not None:
+        return denied
+
+    snapshot = get_snapshot(package_id)
+    if snapshot is None:
+        return Response({'error': 'الحزمة غير موجودة'}, status=404)
+
+    return snapshot_response(request, snapshot, snapshot.exam)
 
 # Generic views for CRUD operations
-class add_questions(generics.ListCreateAPIView):
+class add_questions(BoundedListMixin, ProjectedListMixin, generics.ListCreateAPIView):
     """
     Generic view for listing and creating questions
     Provides standard CRUD operations for Questions model
@@ -58,7 +115,7 @@ def edit_question_by_id(request, id):
         obj.explanation = data['explanation']
         obj.right_answer = data['right_answer']
         
-        # Save the updated question
+        # Save the updated question, its post_save signal moves the exam to a new snapshot version
         obj.save()
         
         return Response('تم تعديل السؤال بنجاح', status=200)
@@ -86,7 +143,7 @@ def delete_question_by_id(request, id):
         return Response('فشل في حذف السؤال', status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class AddQuestionImages(generics.ListCreateAPIView):
+class AddQuestionImages(ProjectedListMixin, generics.ListCreateAPIView):
     """
     Generic view for listing and creating question images
     Handles file uploads for question images
@@ -106,7 +163,7 @@ def get_question_images(request, test_id):
     field_name = request.GET.get('field_name')
     
     # Filter images by test ID and field name
-    obj = QuestionImages.objects.filter(test_id=test_id, field_name=field_name)
+    obj = project(QuestionImages.objects.filter(test_id=test_id, field_name=field_name), QuestionImageSerializer)
     
     # Serialize the filtered images data
     serial = QuestionImageSerializer(obj, many=True)
@@ -121,7 +178,7 @@ def get_all_question_images(request, test_id):
     Returns all images associated with the given test ID
     """
     # Filter all images by test ID and order by image ID
-    obj = QuestionImages.objects.filter(test_id=test_id).order_by('id')
+    obj = project(QuestionImages.objects.filter(test_id=test_id).order_by('id'), QuestionImageSerializer)
     
     # Serialize the filtered images data
     serial = QuestionImageSerializer(obj, many=True)
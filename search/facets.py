@@ -0,0 +1,253 @@
+"""
+Facet counts for the catalogue filter sidebars
+A single GROUP BY over every combination of facet values returns all the
+counts of a catalogue in one query. Counts of each facet respect the filters
+applied on the other facets (so the sidebar still shows the alternatives of
+the facet being filtered), the rollup is done in Python over the grouped rows
+Results are kept in the 'shared' cache and the cached sets of a catalogue are
+dropped on every write to its model, in every worker
+"""
+import hashlib
+import json
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Case, CharField, Count, Value, When
+
+from notes.models import Notes
+from profiles.models import Profile_Teacher
+from test_packages.models import TestPackage, Unit
+from .index import search
+from .normalization import normalize
+
+# Seconds a computed facet set stays cached (writes invalidate it earlier)
+CACHE_TIMEOUT = 600
+
+facet_cache = caches['shared']
+
+# (band name, lowest price, highest price or None)
+PRICE_BANDS = [
+    ('free', 0, 0),
+    ('1-2000', 1, 2000),
+    ('2001-5000', 2001, 5000),
+    ('5001-10000', 5001, 10000),
+    ('10001+', 10001, None),
+]
+
+# Parameter value meaning "no filter" in the list endpoints
+SHOW_ALL = ('all', 'عرض الكل')
+
+
+def price_band():
+    """
+    SQL expression mapping a price to its band name
+    """
+    whens = []
+    for name, low, high in PRICE_BANDS:
+        if high is None:
+            whens.append(When(price__gte=low, then=Value(name)))
+        else:
+            whens.append(When(price__gte=low, price__lte=high, then=Value(name)))
+    return Case(*whens, default=Value(''), output_field=CharField())
+
+
+def equals(value, selected):
+    return str(value) == selected
+
+
+def teacher_class_matches(value, selected):
+    # Teachers of both levels show up for either level, as in get_teacher_preview
+    return value == selected or value == '9_12'
+
+
+def teacher_subject_matches(value, selected):
+    # Physics and chemistry also match the combined subject, as in get_teacher_preview
+    if selected in ('physics', 'chemistry'):
+        return value in (selected, 'physics_chemistry')
+    return value == selected
+
+
+class Facet:
+    """
+    One facet of a catalogue
+    name: query parameter that filters on it, field: grouped column,
+    label_field: optional column holding a display label for the value
+    """
+
+    def __init__(self, name, field, label_field=None, matches=equals):
+        self.name = name
+        self.field = field
+        self.label_field = label_field
+        self.matches = matches
+
+
+def filter_packages(queryset, params):
+    """
+    Apply the non-facet filters of get_packages
+    """
+    if params.get('price') is not None:
+        queryset = queryset.filter(price__lte=int(params['price']))
+    if params.get('number_of_questions') is not None:
+        queryset = queryset.filter(number_of_questions__lte=int(params['number_of_questions']))
+    if params.get('name') is not None:
+        queryset = search(queryset, 'package', 'package_name', params['name'], rank=False)
+    if params.get('publisher_name') is not None:
+        queryset = search(queryset, 'package', 'publisher_name', params['publisher_name'], rank=False)
+    if params.get('unit') is not None and params['unit'] not in SHOW_ALL:
+        units = Unit.objects.filter(normalized_name=normalize(' '.join(params['unit'].split())))
+        if params.get('subject_name') is not None:
+            units = units.filter(subject_name=params['subject_name'])
+        queryset = queryset.filter(unit_catalogue__in=units)
+    return queryset
+
+
+def filter_notes(queryset, params):
+    """
+    Apply the non-facet filters of get_by_filter
+    """
+    if params.get('price') is not None:
+        queryset = queryset.filter(price__lte=int(params['price']))
+    if params.get('name') is not None:
+        queryset = search(queryset, 'note', 'title', params['name'], rank=False)
+    if params.get('publisher_name') is not None:
+        queryset = search(queryset, 'note', 'publisher_name', params['publisher_name'], rank=False)
+    return queryset
+
+
+def filter_teachers(queryset, params):
+    """
+    Apply the non-facet filters of get_teacher_preview
+    """
+    if params.get('name') is not None:
+        queryset = search(queryset, 'teacher', 'full_name', params['name'], rank=False)
+    return queryset
+
+
+# catalogue -> query parameters read by its non-facet filter function
+FILTER_PARAMS = {
+    'packages': ('price', 'number_of_questions', 'name', 'publisher_name', 'unit'),
+    'notes': ('price', 'name', 'publisher_name'),
+    'teachers': ('name',),
+}
+
+# catalogue -> (model, non-facet filter function, facets)
+CATALOGUES = {
+    'packages': (TestPackage, filter_packages, [
+        Facet('subject_name', 'subject_name'),
+        Facet('Class', 'Class'),
+        Facet('publisher_id', 'publisher_id', 'publisher_name'),
+        Facet('price_band', 'price_band'),
+    ]),
+    'notes': (Notes, filter_notes, [
+        Facet('subject_name', 'subject_name'),
+        Facet('Class', 'Class'),
+        Facet('publisher_id', 'publisher_id', 'publisher_name'),
+        Facet('price_band', 'price_band'),
+    ]),
+    'teachers': (Profile_Teacher, filter_teachers, [
+        Facet('subject_name', 'studying_subjects', matches=teacher_subject_matches),
+        Facet('Class', 'Class', matches=teacher_class_matches),
+        Facet('city', 'city'),
+    ]),
+}
+
+
+def generation_key(catalogue):
+    return f'facets:{catalogue}:generation'
+
+
+def new_generation(catalogue):
+    # A fresh value rather than an increment: two workers invalidating at once
+    # cannot write the same generation back, as a read-modify-write incr could
+    facet_cache.set(generation_key(catalogue), uuid.uuid4().hex, None)
+
+
+def invalidate(catalogue):
+    """
+    Drop every cached facet set of a catalogue, called on writes to its model
+    Again once the transaction commits, a set computed before that is stale
+    """
+    new_generation(catalogue)
+    transaction.on_commit(lambda: new_generation(catalogue))
+
+
+def cache_key(catalogue, generation, params):
+    """
+    Cache key of a facet set: only the filter parameters are part of it, so
+    pagination or other parameters the catalogue URL carries share one entry
+    """
+    _, _, facets = CATALOGUES[catalogue]
+    names = [facet.name for facet in facets] + list(FILTER_PARAMS[catalogue])
+    filters = {name: params[name] for name in names if params.get(name) is not None}
+    digest = hashlib.md5(json.dumps(filters, sort_keys=True).encode()).hexdigest()
+    return f'facets:{catalogue}:{generation}:{digest}'
+
+
+def compute_facets(catalogue, params):
+    """
+    Run the grouped query of a catalogue and roll it up into facet counts
+    Raises ValueError when a numeric filter is not a number
+    """
+    model, apply_filters, facets = CATALOGUES[catalogue]
+    queryset = apply_filters(model.objects.all(), params)
+
+    # Facets whose parameter is set (and is not a "show all" value)
+    selected = {
+        facet.name: params[facet.name]
+        for facet in facets
+        if params.get(facet.name) is not None and params[facet.name] not in SHOW_ALL
+    }
+
+    group_by = []
+    for facet in facets:
+        group_by.append(facet.field)
+        if facet.label_field:
+            group_by.append(facet.label_field)
+
+    if any(facet.field == 'price_band' for facet in facets):
+        queryset = queryset.annotate(price_band=price_band())
+
+    rows = queryset.order_by().values(*group_by).annotate(number=Count('pk'))
+
+    counts = {facet.name: {} for facet in facets}
+    for row in rows:
+        for facet in facets:
+            # A row counts for this facet when it passes the filters of the other facets
+            if not all(
+                other.matches(row[other.field], selected[other.name])
+                for other in facets
+                if other is not facet and other.name in selected
+            ):
+                continue
+            value = row[facet.field]
+            bucket = counts[facet.name].setdefault(value, {
+                'value': value,
+                'label': row[facet.label_field] if facet.label_field else value,
+                'count': 0,
+            })
+            bucket['count'] += row['number']
+
+    return {
+        name: sorted(buckets.values(), key=lambda bucket: (-bucket['count'], str(bucket['value'])))
+        for name, buckets in counts.items()
+    }
+
+
+def get_facets(catalogue, params):
+    """
+    Return the facet counts of a catalogue for the given filters, from cache when possible
+    """
+    generation = facet_cache.get(generation_key(catalogue))
+    if generation is None:
+        generation = uuid.uuid4().hex
+        # add() keeps a generation another worker stored meanwhile
+        if not facet_cache.add(generation_key(catalogue), generation, None):
+            generation = facet_cache.get(generation_key(catalogue), generation)
+    key = cache_key(catalogue, generation, params)
+
+    facets = facet_cache.get(key)
+    if facets is None:
+        facets = compute_facets(catalogue, params)
+        facet_cache.set(key, facets, CACHE_TIMEOUT)
+    return facets
@@ -0,0 +1,222 @@
+"""
+Inverted search index over the catalogue
+Every indexed text field is split into normalized words, and each word is
+stored together with its leading prefixes (edge n-grams) and its pieces of up
+to NGRAM_LENGTH letters, a number of postings linear in the length of the word.
+A query word of up to NGRAM_LENGTH letters is looked up as it is, a longer one
+through its trigrams, which must all appear in the field. Partial words typed
+by the user, single letters and pieces from the middle of a word of any length
+are so still equality lookups on an indexed column. Used by the catalogue
+views instead of __icontains scans
+"""
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Sum
+
+from .models import SearchToken
+from .normalization import strip_article, tokenize
+
+# kind -> (model label, indexed text fields)
+INDEXED_MODELS = {
+    'package': ('test_packages.TestPackage', ['package_name', 'publisher_name']),
+    'note': ('notes.Notes', ['title', 'publisher_name']),
+    'teacher': ('profiles.Profile_Teacher', ['full_name']),
+}
+
+# Longest piece of a word stored in the index, longer query words are matched
+# through their pieces of this length
+NGRAM_LENGTH = 3
+
+# Ranking weights of a whole word, of a prefix of a word and of a piece inside a word
+WORD_WEIGHT = 3
+PREFIX_WEIGHT = 2
+INFIX_WEIGHT = 1
+
+BATCH_SIZE = 1000
+
+
+def get_indexed_model(kind):
+    """
+    Return the model class indexed under the given kind
+    """
+    return apps.get_model(INDEXED_MODELS[kind][0])
+
+
+def word_tokens(word):
+    """
+    Compute the tokens of one word as a {token: weight} dict: the word itself,
+    its prefixes and its pieces of up to NGRAM_LENGTH letters, each with the best weight it gets
+    """
+    tokens = {}
+
+    for length in range(1, NGRAM_LENGTH + 1):
+        for start in range(len(word) - length + 1):
+            tokens[word[start:start + length]] = INFIX_WEIGHT
+
+    # Prefixes and the word itself overwrite the equal pieces with their higher weight
+    for end in range(1, len(word)):
+        tokens[word[:end]] = PREFIX_WEIGHT
+    tokens[word] = WORD_WEIGHT
+
+    return tokens
+
+
+def build_postings(kind, instance):
+    """
+    Compute the postings of one object as a {(field, token): weight} dict
+    """
+    postings = defaultdict(int)
+
+    for field in INDEXED_MODELS[kind][1]:
+        for word in tokenize(getattr(instance, field)):
+            tokens = word_tokens(word)
+
+            # The word without its definite article ranks like a whole word too
+            bare = strip_article(word)
+            if bare:
+                for token, weight in word_tokens(bare).items():
+                    tokens[token] = max(weight, tokens.get(token, 0))
+
+            for token, weight in tokens.items():
+                postings[(field, token)] += weight
+
+    return postings
+
+
+def index_object(kind, instance):
+    """
+    Bring the postings of one object in line with its current field values
+    Only the postings that changed are written, so saving an object whose
+    text did not change (e.g. a counter update) costs a single read
+    """
+    desired = build_postings(kind, instance)
+    existing = {
+        (field, token): (pk, weight)
+        for pk, field, token, weight in SearchToken.objects.filter(
+            kind=kind, object_id=instance.pk
+        ).values_list('id', 'field', 'token', 'weight')
+    }
+
+    stale = [pk for key, (pk, weight) in existing.items() if desired.get(key) != weight]
+    new = [
+        SearchToken(kind=kind, field=field, token=token, object_id=instance.pk, weight=weight)
+        for (field, token), weight in desired.items()
+        if existing.get((field, token), (None, None))[1] != weight
+    ]
+
+    if not stale and not new:
+        return
+
+    with transaction.atomic():
+        if stale:
+            SearchToken.objects.filter(id__in=stale).delete()
+        if new:
+            SearchToken.objects.bulk_create(new, batch_size=BATCH_SIZE)
+
+
+def index_objects(kind, instances):
+    """
+    Insert the postings of objects that have none yet (bulk created objects send no post_save)
+    """
+    SearchToken.objects.bulk_create([
+        SearchToken(kind=kind, field=field, token=token, object_id=instance.pk, weight=weight)
+        for instance in instances
+        for (field, token), weight in build_postings(kind, instance).items()
+    ], batch_size=BATCH_SIZE)
+
+
+def remove_object(kind, pk):
+    """
+    Drop every posting of a deleted object
+    """
+    SearchToken.objects.filter(kind=kind, object_id=pk).delete()
+
+
+def rebuild(kind):
+    """
+    Rebuild the whole index of one kind from its table and return the number of objects indexed
+    """
+    model = get_indexed_model(kind)
+    fields = INDEXED_MODELS[kind][1]
+    indexed = 0
+    batch = []
+
+    with transaction.atomic():
+        SearchToken.objects.filter(kind=kind).delete()
+
+        for instance in model.objects.only(model._meta.pk.attname, *fields).order_by().iterator(chunk_size=BATCH_SIZE):
+            indexed += 1
+            batch.extend(
+                SearchToken(kind=kind, field=field, token=token, object_id=instance.pk, weight=weight)
+                for (field, token), weight in build_postings(kind, instance).items()
+            )
+            if len(batch) >= BATCH_SIZE:
+                SearchToken.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+                batch = []
+
+        if batch:
+            SearchToken.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+
+    return indexed
+
+
+def query_terms(query):
+    """
+    Normalize a user query into the distinct terms that must all match
+    """
+    return list(dict.fromkeys(tokenize(query)))
+
+
+def term_grams(term):
+    """
+    Return the tokens that must all be posted for a field to match a query term:
+    the term itself when it is a piece short enough to be indexed, its trigrams otherwise
+    """
+    if len(term) <= NGRAM_LENGTH:
+        return [term]
+    return [term[start:start + NGRAM_LENGTH] for start in range(len(term) - NGRAM_LENGTH + 1)]
+
+
+def search(queryset, kind, field, query, rank=True):
+    """
+    Restrict the queryset to objects whose field matches every word of the query
+    Each query word matches an indexed word, the start of one or a piece inside
+    one, like the __icontains filters the index replaced. A long query word
+    matches when all its trigrams appear in the field, they may come from
+    different words of it. When rank is True the rows are annotated with
+    search_rank and ordered best match first (whole words and prefixes before
+    pieces), keeping the queryset's own ordering as the tie-breaker
+    An empty query (no words) leaves the queryset unchanged
+    """
+    terms = query_terms(query)
+    if not terms:
+        return queryset
+
+    grams = list(dict.fromkeys(gram for term in terms for gram in term_grams(term)))
+
+    # Objects that have a posting for every gram of every term
+    matching = (
+        SearchToken.objects.filter(kind=kind, field=field, token__in=grams)
+        .values('object_id')
+        .annotate(matched=Count('id'))
+        .filter(matched=len(grams))
+        .values('object_id')
+    )
+    queryset = queryset.filter(pk__in=matching)
+
+    if not rank:
+        return queryset
+
+    # Long terms matching a whole word or a prefix add its weight to the one of their trigrams
+    postings = SearchToken.objects.filter(kind=kind, field=field, token__in=list(dict.fromkeys(terms + grams)))
+    score = (
+        postings.filter(object_id=OuterRef('pk'))
+        .values('object_id')
+        .annotate(score=Sum('weight'))
+        .values('score')
+    )
+    ordering = queryset.query.order_by or queryset.model._meta.ordering
+
+    return queryset.annotate(search_rank=Subquery(score)).order_by('-search_rank', *ordering)
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from search.index import INDEXED_MODELS, rebuild
+
+
+class Command(BaseCommand):
+    """
+    Rebuild the search index from the catalogue tables
+    The migrations index the rows that existed when the search app was
+    deployed, the command is needed whenever rows were changed with
+    queryset.update() or raw SQL (which do not send the signals)
+    """
+    help = 'Rebuild the search index of test packages, notes and teachers'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--kind',
+            choices=sorted(INDEXED_MODELS),
+            action='append',
+            help='Only rebuild this kind (can be repeated), defaults to every kind',
+        )
+
+    def handle(self, *args, **options):
+        for kind in options['kind'] or sorted(INDEXED_MODELS):
+            started = time.monotonic()
+            indexed = rebuild(kind)
+            self.stdout.write(self.style.SUCCESS(
+                f'Indexed {indexed} {kind} objects in {time.monotonic() - started:.2f}s'
+            ))
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchToken',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=10)),
+                ('field', models.CharField(max_length=30)),
+                ('token', models.CharField(max_length=40)),
+                ('object_id', models.BigIntegerField()),
+                ('weight', models.PositiveIntegerField(default=1)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'object_id'], name='searchtoken_object_idx')],
+                'unique_together': {('kind', 'field', 'token', 'object_id')},
+            },
+        ),
+    ]
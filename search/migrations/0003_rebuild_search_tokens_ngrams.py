@@ -0,0 +1,107 @@
+import re
+from collections import defaultdict
+
+from django.db import migrations
+
+# Copy of the tokenization of search/normalization.py and search/index.py at
+# the time of this migration, so later changes to the live code do not change
+# what this migration does. A later change to the postings ships its own
+# rebuild, or asks for `manage.py rebuild_search_index` after deploying
+TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+
+CHARACTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ة': 'ه', '\u0640': None,
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+WORD = re.compile(r'[^\W_]+')
+
+ARTICLE_PREFIXES = ('وال', 'بال', 'فال', 'كال', 'لل', 'ال')
+
+INDEXED_MODELS = {
+    'package': (('test_packages', 'TestPackage'), ['package_name', 'publisher_name']),
+    'note': (('notes', 'Notes'), ['title', 'publisher_name']),
+    'teacher': (('profiles', 'Profile_Teacher'), ['full_name']),
+}
+
+MAX_TOKEN_LENGTH = 40
+NGRAM_LENGTH = 3
+WORD_WEIGHT, PREFIX_WEIGHT, INFIX_WEIGHT = 3, 2, 1
+
+BATCH_SIZE = 1000
+
+
+def tokenize(text):
+    if not text:
+        return []
+    text = TASHKEEL.sub('', text).translate(CHARACTER_MAP).casefold()
+    return [word[:MAX_TOKEN_LENGTH] for word in WORD.findall(text)]
+
+
+def strip_article(word):
+    for prefix in ARTICLE_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            return word[len(prefix):]
+    return None
+
+
+def word_tokens(word):
+    tokens = {}
+    for length in range(1, NGRAM_LENGTH + 1):
+        for start in range(len(word) - length + 1):
+            tokens[word[start:start + length]] = INFIX_WEIGHT
+    for end in range(1, len(word)):
+        tokens[word[:end]] = PREFIX_WEIGHT
+    tokens[word] = WORD_WEIGHT
+    return tokens
+
+
+def build_postings(fields, instance):
+    postings = defaultdict(int)
+    for field in fields:
+        for word in tokenize(getattr(instance, field)):
+            tokens = word_tokens(word)
+            bare = strip_article(word)
+            if bare:
+                for token, weight in word_tokens(bare).items():
+                    tokens[token] = max(weight, tokens.get(token, 0))
+            for token, weight in tokens.items():
+                postings[(field, token)] += weight
+    return postings
+
+
+def rebuild_search_tokens(apps, schema_editor):
+    """
+    Replace the postings of every test package, note and teacher
+    Words now post their pieces of up to NGRAM_LENGTH letters instead of every piece inside them
+    """
+    SearchToken = apps.get_model('search', 'SearchToken')
+
+    for kind, ((app_label, model_name), fields) in INDEXED_MODELS.items():
+        model = apps.get_model(app_label, model_name)
+        SearchToken.objects.filter(kind=kind).delete()
+
+        batch = []
+        rows = model.objects.only(model._meta.pk.attname, *fields).order_by()
+        for instance in rows.iterator(chunk_size=BATCH_SIZE):
+            batch.extend(
+                SearchToken(kind=kind, field=field, token=token, object_id=instance.pk, weight=weight)
+                for (field, token), weight in build_postings(fields, instance).items()
+            )
+            if len(batch) >= BATCH_SIZE:
+                SearchToken.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+                batch = []
+
+        SearchToken.objects.bulk_create(batch, batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('search', '0002_backfill_search_tokens'),
+    ]
+
+    operations = [
+        migrations.RunPython(rebuild_search_tokens, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+from django.db import models
+
+# Create your models here.
+
+
+class SearchToken(models.Model):
+    """
+    One posting of the inverted search index
+    Stores a normalized word (or a prefix or piece of a word) that appears in one field of one
+    indexed object. Lookups are equality matches on (kind, field, token) so they
+    are index seeks instead of the leading-wildcard LIKE scans of icontains
+    """
+
+    # Which catalogue the object belongs to ('package', 'note' or 'teacher')
+    kind = models.CharField(max_length=10)
+
+    # Name of the model field the token was extracted from (e.g. 'package_name')
+    field = models.CharField(max_length=30)
+
+    # Normalized word, word prefix or piece of a word
+    token = models.CharField(max_length=40)
+
+    # Primary key of the indexed object
+    object_id = models.BigIntegerField()
+
+    # Ranking weight: whole words count more than prefixes, prefixes more than pieces
+    weight = models.PositiveIntegerField(default=1)
+
+    class Meta:
+        unique_together = ['kind', 'field', 'token', 'object_id']
+
+        indexes = [
+            # Used to replace the postings of one object when it is saved or deleted
+            models.Index(fields=['kind', 'object_id'], name='searchtoken_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind}:{self.field}:{self.token} -> {self.object_id}"
@@ -0,0 +1,91 @@
+"""
+Text normalization for the search index
+Folds the common Arabic spelling variants together so that a query matches
+regardless of how the teacher typed the title:
+- أ / إ / آ / ٱ are folded to ا
+- ى is folded to ي and ة to ه
+- tashkeel (harakat, shadda, sukun...) and tatweel are removed
+- Arabic-Indic digits are converted to ASCII digits
+Latin text is case folded
+"""
+import re
+
+# Harakat, Quranic annotation marks and superscript alef
+TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+
+TATWEEL = '\u0640'
+
+CHARACTER_MAP = str.maketrans({
+    'أ': 'ا',
+    'إ': 'ا',
+    'آ': 'ا',
+    'ٱ': 'ا',
+    'ى': 'ي',
+    'ة': 'ه',
+    TATWEEL: None,
+    # Arabic-Indic digits
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+# A word is a run of letters or digits, underscores and punctuation split words
+WORD = re.compile(r'[^\W_]+')
+
+# Tokens longer than this are cut, nobody types more to find a title
+MAX_TOKEN_LENGTH = 40
+
+
+def normalize(text):
+    """
+    Return the normalized form of a piece of text
+    """
+    if not text:
+        return ''
+    text = TASHKEEL.sub('', text)
+    return text.translate(CHARACTER_MAP).casefold()
+
+
+def tokenize(text):
+    """
+    Split text into normalized word tokens (duplicates are kept, in order)
+    """
+    return [word[:MAX_TOKEN_LENGTH] for word in WORD.findall(normalize(text))]
+
+
+# Definite article (and its common attached forms) stripped to index the bare word too
+ARTICLE_PREFIXES = ('وال', 'بال', 'فال', 'كال', 'لل', 'ال')
+
+
+def strip_article(word):
+    """
+    Return the word without its leading definite article, or None if it has none
+    Short words are left alone so "الى" or "الا" are not mangled
+    """
+    for prefix in ARTICLE_PREFIXES:
+        if word.startswith(prefix) and len(word) - len(prefix) >= 3:
+            return word[len(prefix):]
+    return None
+
+
+# Arabic letters to Latin, used to match names typed with a Latin keyboard
+TRANSLITERATION_MAP = str.maketrans({
+    'ا': 'a', 'ب': 'b', 'ت': 't', 'ث': 'th', 'ج': 'j', 'ح': 'h', 'خ': 'kh',
+    'د': 'd', 'ذ': 'th', 'ر': 'r', 'ز': 'z', 'س': 's', 'ش': 'sh', 'ص': 's',
+    'ض': 'd', 'ط': 't', 'ظ': 'z', 'ع': 'a', 'غ': 'gh', 'ف': 'f', 'ق': 'q',
+    'ك': 'k', 'ل': 'l', 'م': 'm', 'ن': 'n', 'ه': 'h', 'و': 'w', 'ي': 'y',
+    'ء': None, 'ؤ': 'w', 'ئ': 'y', 'گ': 'g', 'پ': 'p', 'چ': 'ch', 'ڤ': 'v',
+})
+
+LATIN_VOWELS = re.compile('[aeiou]')
+REPEATED = re.compile(r'(.)\1+')
+
+
+def latin_skeleton(text):
+    """
+    Reduce (normalized) text to a Latin consonant skeleton
+    Arabic is transliterated, then vowels and doubled letters are dropped, so
+    "محمد", "mohammad" and "muhamad" all become "mhmd"
+    """
+    text = normalize(text).translate(TRANSLITERATION_MAP)
+    text = text.replace('w', 'u').replace('y', 'i')
+    return REPEATED.sub(r'\1', LATIN_VOWELS.sub('', text))
@@ -0,0 +1,78 @@
+"""
+Signals keeping the search index, the suggestions and the facet counts in sync
+The postings are written in the transaction of the change, the in-memory
+suggestions of this worker are only patched once it commits
+"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from notes.models import Notes
+from profiles.models import Profile_Teacher
+from test_packages.models import TestPackage
+from .facets import invalidate as invalidate_facets
+from .index import index_object, remove_object
+from .suggest import suggestion_index
+
+
+@receiver(post_save, sender=TestPackage)
+def index_test_package(sender, instance, **kwargs):
+    """
+    Keep the search index, suggestions and facet counts of a test package in sync with its name and publisher
+    """
+    index_object('package', instance)
+    transaction.on_commit(lambda: suggestion_index.update('package', instance))
+    invalidate_facets('packages')
+
+
+@receiver(post_delete, sender=TestPackage)
+def unindex_test_package(sender, instance, **kwargs):
+    """
+    Remove a deleted test package from the search index, suggestions and facet counts
+    """
+    pk = instance.pk
+    remove_object('package', pk)
+    transaction.on_commit(lambda: suggestion_index.remove('package', pk))
+    invalidate_facets('packages')
+
+
+@receiver(post_save, sender=Notes)
+def index_note(sender, instance, **kwargs):
+    """
+    Keep the search index, suggestions and facet counts of a note in sync with its title and publisher
+    """
+    index_object('note', instance)
+    transaction.on_commit(lambda: suggestion_index.update('note', instance))
+    invalidate_facets('notes')
+
+
+@receiver(post_delete, sender=Notes)
+def unindex_note(sender, instance, **kwargs):
+    """
+    Remove a deleted note from the search index, suggestions and facet counts
+    """
+    pk = instance.pk
+    remove_object('note', pk)
+    transaction.on_commit(lambda: suggestion_index.remove('note', pk))
+    invalidate_facets('notes')
+
+
+@receiver(post_save, sender=Profile_Teacher)
+def index_teacher(sender, instance, **kwargs):
+    """
+    Keep the search index, suggestions and facet counts of a teacher in sync with their full name
+    """
+    index_object('teacher', instance)
+    transaction.on_commit(lambda: suggestion_index.update('teacher', instance))
+    invalidate_facets('teachers')
+
+
+@receiver(post_delete, sender=Profile_Teacher)
+def unindex_teacher(sender, instance, **kwargs):
+    """
+    Remove a deleted teacher from the search index, suggestions and facet counts
+    """
+    pk = instance.pk
+    remove_object('teacher', pk)
+    transaction.on_commit(lambda: suggestion_index.remove('teacher', pk))
+    invalidate_facets('teachers')
@@ -0,0 +1,357 @@
+"""
+In-memory search-as-you-type suggestions
+Each worker lazily loads the names of teachers, test packages and notes into
+sorted key arrays. A suggestion is a binary search for the typed prefix, so
+answering a keystroke never touches the database. Short prefixes, whose
+ranges can cover most of the catalogue, have their top matches precomputed
+The arrays are patched from the model signals of this worker and fully
+reloaded every REFRESH_SECONDS, in a background thread, to pick up writes
+made by other workers
+"""
+import heapq
+import threading
+import time
+from bisect import bisect_left, bisect_right, insort
+
+from django.core.exceptions import ObjectDoesNotExist
+from django.db import connection
+
+from .index import get_indexed_model
+from .normalization import latin_skeleton, strip_article, tokenize
+
+# kind -> (label field, popularity fields used to rank equal matches)
+# Popularity fields may follow a relation ('stats__number_of_exams')
+SUGGESTED_FIELDS = {
+    'teacher': ('full_name', ('stats__number_of_exams', 'stats__number_of_notes')),
+    'package': ('package_name', ('number_of_apps',)),
+    'note': ('title', ('number_of_reads',)),
+}
+
+# Prefixes up to this length get their top matches precomputed
+SHORT_PREFIX_LENGTH = 2
+
+# Largest number of suggestions kept per short prefix / returned per request
+MAX_SUGGESTIONS = 20
+
+# Seconds after which a worker reloads its copy from the database
+REFRESH_SECONDS = 300
+
+
+def word_forms(text):
+    """
+    Return the normalized words of a text as written and with their definite
+    articles stripped, so "الرياضيات الشامل" is also reachable as "رياضيات شامل"
+    """
+    words = tuple(tokenize(text))
+    return {words, tuple(strip_article(word) or word for word in words)}
+
+
+def suggestion_keys(label):
+    """
+    Return the keys of a label: every word-aligned suffix of its normalized
+    words, so typing the start of any word (or phrase) in the name matches
+    """
+    return {' '.join(words[i:]) for words in word_forms(label) for i in range(len(words))}
+
+
+def latin_keys(label):
+    """
+    Same as suggestion_keys but on the Latin consonant skeleton of the words
+    """
+    keys = set()
+    for words in word_forms(label):
+        skeletons = [skeleton for skeleton in map(latin_skeleton, words) if skeleton]
+        keys.update(' '.join(skeletons[i:]) for i in range(len(skeletons)))
+    return keys
+
+
+def field_value(instance, path):
+    """
+    Value of a field of SUGGESTED_FIELDS on an instance, following relations
+    only when they are already loaded, so saving a row never queries for its score
+    Raises LookupError when a relation is not loaded, None when a related row is missing
+    """
+    *relations, field = path.split('__')
+    value = instance
+    for name in relations:
+        if value is None:
+            return None
+        if name not in value._state.fields_cache:
+            raise LookupError(path)
+        try:
+            value = getattr(value, name)
+        except ObjectDoesNotExist:
+            return None
+    return getattr(value, field) if value is not None else None
+
+
+class PrefixTable:
+    """
+    Sorted (key, entry) pairs with prefix range lookups
+    """
+
+    def __init__(self):
+        self.pairs = []
+        self.top = {}
+
+    def add(self, key, entry):
+        insort(self.pairs, (key, entry))
+
+    def remove(self, key, entry):
+        i = bisect_left(self.pairs, (key, entry))
+        if i < len(self.pairs) and self.pairs[i] == (key, entry):
+            del self.pairs[i]
+
+    def range(self, prefix):
+        """
+        Return the [begin, end) slice of pairs whose key starts with prefix
+        """
+        begin = bisect_left(self.pairs, (prefix,))
+        end = bisect_right(self.pairs, (prefix + '\U0010ffff',))
+        return begin, end
+
+    def best(self, prefix, score, k):
+        """
+        Return up to k distinct entries matching prefix, best score first
+        """
+        if len(prefix) <= SHORT_PREFIX_LENGTH and prefix in self.top:
+            return self.top[prefix][:k]
+
+        begin, end = self.range(prefix)
+        entries = {entry for _, entry in self.pairs[begin:end]}
+        return heapq.nlargest(k, entries, key=score)
+
+    def rebuild_top(self, prefixes, score):
+        """
+        Recompute the precomputed top matches of the given short prefixes
+        """
+        for prefix in prefixes:
+            begin, end = self.range(prefix)
+            entries = {entry for _, entry in self.pairs[begin:end]}
+            if entries:
+                self.top[prefix] = heapq.nlargest(MAX_SUGGESTIONS, entries, key=score)
+            else:
+                self.top.pop(prefix, None)
+
+
+class Suggestions:
+    """
+    One generation of the suggestion tables over teachers, test packages and notes
+    Every kind has its own tables so filtering by kind never starves the result
+    Entries are (kind, id) tuples, labels and scores are kept in side dicts
+    """
+
+    def __init__(self):
+        self.tables = {kind: {'keys': PrefixTable(), 'latin': PrefixTable()} for kind in SUGGESTED_FIELDS}
+        self.labels = {}
+        self.scores = {}
+        self.entry_keys = {}
+
+    @classmethod
+    def from_database(cls):
+        """
+        Read every name from the database and build the tables from scratch
+        """
+        suggestions = cls()
+        for kind, (label_field, score_fields) in SUGGESTED_FIELDS.items():
+            model = get_indexed_model(kind)
+            rows = model.objects.order_by().values_list(model._meta.pk.attname, label_field, *score_fields)
+            for pk, label, *counters in rows.iterator(chunk_size=2000):
+                suggestions._add((kind, pk), label, sum(counter or 0 for counter in counters), sort=False)
+
+        for table in (table for tables in suggestions.tables.values() for table in tables.values()):
+            table.pairs.sort()
+            short_prefixes = {key[:length] for key, _ in table.pairs for length in range(1, SHORT_PREFIX_LENGTH + 1)}
+            table.rebuild_top(short_prefixes, suggestions.score)
+
+        return suggestions
+
+    def score(self, entry):
+        return self.scores.get(entry, 0)
+
+    def _add(self, entry, label, score, sort=True):
+        keys = {'keys': suggestion_keys(label), 'latin': latin_keys(label)}
+        self.labels[entry] = label
+        self.scores[entry] = score
+        self.entry_keys[entry] = keys
+        for name, table_keys in keys.items():
+            table = self.tables[entry[0]][name]
+            for key in table_keys:
+                if sort:
+                    table.add(key, entry)
+                else:
+                    table.pairs.append((key, entry))
+
+    def _remove(self, entry):
+        keys = self.entry_keys.pop(entry, {})
+        for name, table_keys in keys.items():
+            for key in table_keys:
+                self.tables[entry[0]][name].remove(key, entry)
+        self.labels.pop(entry, None)
+        self.scores.pop(entry, None)
+        return keys
+
+    def _refresh_top(self, kind, *key_sets):
+        for name, table in self.tables[kind].items():
+            prefixes = {
+                key[:length]
+                for keys in key_sets
+                for key in keys.get(name, ())
+                for length in range(1, SHORT_PREFIX_LENGTH + 1)
+            }
+            table.rebuild_top(prefixes, self.score)
+
+    def update(self, entry, label, score):
+        if score is None:
+            # The caller could not read the counters, keep the loaded score
+            score = self.scores.get(entry, 0)
+        if self.labels.get(entry) == label:
+            # Only a counter changed: keep the keys, the precomputed short
+            # prefix rankings catch up on the next periodic reload
+            self.scores[entry] = score
+            return
+        old_keys = self._remove(entry)
+        self._add(entry, label, score)
+        self._refresh_top(entry[0], old_keys, self.entry_keys[entry])
+
+    def remove(self, entry):
+        self._refresh_top(entry[0], self._remove(entry))
+
+    def best(self, prefixes, skeletons, k, kinds):
+        entries = []
+        for kind in kinds or SUGGESTED_FIELDS:
+            tables = self.tables[kind]
+            for prefix in prefixes:
+                entries.extend(tables['keys'].best(prefix, self.score, k))
+            for skeleton in skeletons:
+                entries.extend(tables['latin'].best(skeleton, self.score, k))
+
+        best = heapq.nlargest(k, dict.fromkeys(entries), key=self.score)
+        return [{'type': kind, 'id': pk, 'label': self.labels[(kind, pk)]} for kind, pk in best]
+
+
+class SuggestionIndex:
+    """
+    Per-worker suggestion index: the current Suggestions and their reloading
+    A reload reads the database into new tables without holding the lock, then
+    swaps them in, so suggestions keep being answered from the current tables
+    meanwhile. Signals received during a reload are applied to both generations
+    """
+
+    def __init__(self):
+        # Guards the current tables and the changes recorded during a reload
+        self.lock = threading.Lock()
+        # Held by the one thread reading the database
+        self.load_lock = threading.Lock()
+        self.suggestions = Suggestions()
+        self.pending = None
+        self.loaded_at = None
+        self.reloading = False
+
+    @property
+    def is_loaded(self):
+        return self.loaded_at is not None
+
+    def load(self):
+        """
+        Read every name from the database into new tables and swap them in
+        """
+        with self.load_lock:
+            self._load()
+
+    def _load(self):
+        with self.lock:
+            self.pending = []
+        try:
+            suggestions = Suggestions.from_database()
+        except BaseException:
+            with self.lock:
+                self.pending = None
+            raise
+
+        with self.lock:
+            # Writes of this worker that happened while the database was read
+            for method, args in self.pending:
+                getattr(suggestions, method)(*args)
+            self.pending = None
+            self.suggestions = suggestions
+            self.loaded_at = time.monotonic()
+
+    def ensure_loaded(self):
+        """
+        Load the index on first use, and start a background reload once it is older than REFRESH_SECONDS
+        """
+        if not self.is_loaded:
+            with self.load_lock:
+                # Requests that waited for the first load do not load again
+                if not self.is_loaded:
+                    self._load()
+        elif time.monotonic() - self.loaded_at > REFRESH_SECONDS:
+            self.reload_in_background()
+
+    def reload_in_background(self):
+        with self.lock:
+            if self.reloading:
+                return
+            self.reloading = True
+        threading.Thread(target=self._reload, name='suggestion-reload', daemon=True).start()
+
+    def _reload(self):
+        try:
+            self.load()
+        finally:
+            with self.lock:
+                self.reloading = False
+            # The thread opened its own database connection
+            connection.close()
+
+    def _apply(self, method, *args):
+        with self.lock:
+            # Before the first load there is nothing to patch, only a running load to catch up
+            if self.is_loaded:
+                getattr(self.suggestions, method)(*args)
+            if self.pending is not None:
+                self.pending.append((method, args))
+
+    def update(self, kind, instance):
+        """
+        Insert or replace one object, called once the post_save transaction commits
+        """
+        label_field, score_fields = SUGGESTED_FIELDS[kind]
+        try:
+            score = sum(field_value(instance, field) or 0 for field in score_fields)
+        except LookupError:
+            # Counters kept in another table, refreshed by the periodic reload
+            score = None
+        self._apply('update', (kind, instance.pk), getattr(instance, label_field), score)
+
+    def remove(self, kind, pk):
+        """
+        Drop one object, called once the post_delete transaction commits
+        """
+        self._apply('remove', (kind, pk))
+
+    def suggest(self, query, k=10, kinds=None):
+        """
+        Return up to k suggestions for what the user typed so far
+        Arabic input is matched on normalized words, Latin input is matched both
+        on the words as typed and on the transliterated consonant skeleton
+        """
+        k = min(k, MAX_SUGGESTIONS)
+        prefixes = {' '.join(words) for words in word_forms(query) if words}
+        if not prefixes:
+            return []
+
+        skeletons = set()
+        if all(prefix.isascii() for prefix in prefixes):
+            skeletons = {
+                ' '.join(filter(None, map(latin_skeleton, words)))
+                for words in word_forms(query)
+            } - {''}
+
+        with self.lock:
+            return self.suggestions.best(prefixes, skeletons, k, kinds)
+
+
+# One index per worker process, loaded on the first suggestion request
+suggestion_index = SuggestionIndex()
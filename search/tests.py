@@ -0,0 +1,278 @@
+import importlib
+import time
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import caches
+from django.db import transaction
+from django.test import TestCase
+
+from profiles.models import Profile_Teacher, TeacherStats
+from test_packages.models import TestPackage
+from users.models import User
+from . import facets, signals
+from .index import build_postings, search, word_tokens
+from .models import SearchToken
+from .normalization import normalize, strip_article, tokenize
+from .suggest import REFRESH_SECONDS, SuggestionIndex, Suggestions
+
+# Create your tests here.
+
+backfill = importlib.import_module('search.migrations.0003_rebuild_search_tokens_ngrams')
+
+
+def new_package(package_name, publisher_name='publisher'):
+    return TestPackage(
+        package_name=package_name,
+        publisher_name=publisher_name,
+        units='unit',
+        subject_name='math_12',
+        price=1000,
+        number_of_questions=10,
+        publisher_id=1,
+    )
+
+
+class NormalizationTests(TestCase):
+    """
+    Arabic spelling variants and tashkeel fold to the same token
+    """
+
+    def test_variants_fold_together(self):
+        self.assertEqual(normalize('أحمد'), normalize('احمد'))
+        self.assertEqual(normalize('إسلام'), normalize('اسلام'))
+        self.assertEqual(normalize('مستوى'), normalize('مستوي'))
+        self.assertEqual(normalize('مدرسة'), normalize('مدرسه'))
+
+    def test_tashkeel_tatweel_and_digits_are_dropped_or_folded(self):
+        self.assertEqual(normalize('الرِّياضيّات'), 'الرياضيات')
+        self.assertEqual(normalize('رياضـــيات'), 'رياضيات')
+        self.assertEqual(normalize('الصف ١٢'), 'الصف 12')
+
+    def test_tokenize_splits_words_and_folds_case(self):
+        self.assertEqual(tokenize('Physics_12 - الفيزياء'), ['physics', '12', 'الفيزياء'])
+
+    def test_strip_article(self):
+        self.assertEqual(strip_article('الرياضيات'), 'رياضيات')
+        self.assertEqual(strip_article('والكيمياء'), 'كيمياء')
+        self.assertIsNone(strip_article('الى'))
+
+
+class SearchIndexTests(TestCase):
+    """
+    The index matches whole words, prefixes, pieces inside words and single letters,
+    and follows the packages through their signals
+    """
+
+    def setUp(self):
+        self.algebra = new_package('الرياضيات الجبر')
+        self.algebra.save()
+        self.physics = new_package('فيزياء الحركة')
+        self.physics.save()
+
+    def matches(self, query):
+        return list(search(TestPackage.objects.all(), 'package', 'package_name', query).values_list('id', flat=True))
+
+    def test_prefix_and_spelling_variants_match(self):
+        self.assertEqual(self.matches('رياض'), [self.algebra.id])
+        self.assertEqual(self.matches('الرِّياضيّات'), [self.algebra.id])
+
+    def test_piece_inside_a_word_matches(self):
+        self.assertEqual(self.matches('ياضيات'), [self.algebra.id])
+        self.assertEqual(self.matches('ركه'), [self.physics.id])
+
+    def test_single_letter_matches(self):
+        self.assertEqual(self.matches('ف'), [self.physics.id])
+        self.assertCountEqual(self.matches('ر'), [self.algebra.id, self.physics.id])
+
+    def test_pieces_of_long_words_match(self):
+        long_word = new_package('supercalifragilisticexpialidocious')
+        long_word.save()
+
+        self.assertEqual(self.matches('fragilistic'), [long_word.id])
+        self.assertEqual(self.matches('xpi'), [long_word.id])
+        self.assertEqual(self.matches('fragilisticz'), [])
+
+    def test_postings_grow_linearly_with_the_word(self):
+        # Pieces of one, two and three letters, the longer prefixes and the word itself
+        self.assertEqual(len(word_tokens('abcdefghijklmnopqrst')), 20 + 19 + 18 + 16 + 1)
+
+    def test_every_word_must_match(self):
+        self.assertEqual(self.matches('جبر رياض'), [self.algebra.id])
+        self.assertEqual(self.matches('جبر فيزياء'), [])
+
+    def test_whole_word_ranks_before_piece(self):
+        piece = new_package('مجبرة')
+        piece.save()
+
+        self.assertEqual(self.matches('جبر'), [self.algebra.id, piece.id])
+
+    def test_rename_replaces_postings(self):
+        self.algebra.package_name = 'الهندسة'
+        self.algebra.save()
+
+        self.assertEqual(self.matches('جبر'), [])
+        self.assertEqual(self.matches('هندس'), [self.algebra.id])
+
+    def test_delete_removes_postings(self):
+        pk = self.physics.pk
+        self.physics.delete()
+
+        self.assertFalse(SearchToken.objects.filter(kind='package', object_id=pk).exists())
+
+
+class SearchBackfillTests(TestCase):
+    """
+    The backfill migration indexes rows that never sent a signal, like the live index would
+    """
+
+    def test_backfill_indexes_bulk_created_rows(self):
+        TestPackage.objects.bulk_create([new_package('كيمياء عضوية'), new_package('الأحياء', 'أحمد')])
+        self.assertFalse(SearchToken.objects.exists())
+
+        backfill.rebuild_search_tokens(apps, None)
+
+        for package in TestPackage.objects.all():
+            self.assertEqual(
+                {(field, token): weight for field, token, weight in SearchToken.objects.filter(
+                    kind='package', object_id=package.pk).values_list('field', 'token', 'weight')},
+                dict(build_postings('package', package)),
+            )
+
+
+class SuggestionIndexTests(TestCase):
+    """
+    Suggestions follow the signals, and a reload swaps fresh tables in without losing writes
+    """
+
+    def setUp(self):
+        self.index = SuggestionIndex()
+        self.package = new_package('الرياضيات الشامل')
+        self.package.save()
+        self.index.load()
+
+    def labels(self, query):
+        return [suggestion['label'] for suggestion in self.index.suggest(query)]
+
+    def test_prefixes_of_any_word_and_latin_input_match(self):
+        self.assertEqual(self.labels('رياض'), ['الرياضيات الشامل'])
+        self.assertEqual(self.labels('الشا'), ['الرياضيات الشامل'])
+        self.assertEqual(self.labels('riyad'), ['الرياضيات الشامل'])
+
+    def test_updates_and_removals_patch_the_tables(self):
+        self.package.package_name = 'الكيمياء'
+        self.index.update('package', self.package)
+        self.assertEqual(self.labels('رياض'), [])
+        self.assertEqual(self.labels('كيم'), ['الكيمياء'])
+
+        self.index.remove('package', self.package.pk)
+        self.assertEqual(self.labels('كيم'), [])
+
+    def test_signals_patch_the_tables_once_committed(self):
+        with mock.patch.object(signals, 'suggestion_index', self.index):
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    new_package('الفيزياء').save()
+                    transaction.set_rollback(True)
+
+                new_package('الكيمياء').save()
+                self.package.delete()
+                # Nothing reaches the tables before the commit
+                self.assertEqual(self.labels('كيم'), [])
+                self.assertEqual(self.labels('رياض'), ['الرياضيات الشامل'])
+
+        self.assertEqual(self.labels('فيز'), [])
+        self.assertEqual(self.labels('كيم'), ['الكيمياء'])
+        self.assertEqual(self.labels('رياض'), [])
+
+    def test_writes_during_a_reload_survive_the_swap(self):
+        build = Suggestions.from_database
+
+        def build_then_write():
+            # The database was read before this rename reached the index
+            suggestions = build()
+            self.package.package_name = 'الكيمياء'
+            self.index.update('package', self.package)
+            return suggestions
+
+        with mock.patch.object(Suggestions, 'from_database', build_then_write):
+            self.index.load()
+
+        self.assertEqual(self.labels('رياض'), [])
+        self.assertEqual(self.labels('كيم'), ['الكيمياء'])
+
+    def test_teachers_rank_by_their_statistics(self):
+        quiet, busy = (
+            Profile_Teacher.objects.get(user=User.objects.create(username=name, email=f'{name}@svi.com', is_teacher=True))
+            for name in ('quiet', 'busy')
+        )
+        for teacher, name in ((quiet, 'سامر'), (busy, 'سامي')):
+            teacher.full_name = name
+            teacher.save()
+        TeacherStats.objects.filter(teacher=busy).update(number_of_exams=4, number_of_notes=1)
+
+        self.index.load()
+        self.assertEqual(self.labels('سام'), ['سامي', 'سامر'])
+
+        # Saving a profile keeps the loaded score without reading the statistics
+        busy.full_name = 'سامي الحلبي'
+        with self.assertNumQueries(0):
+            self.index.update('teacher', busy)
+        self.assertEqual(self.labels('سام'), ['سامي الحلبي', 'سامر'])
+
+    def test_stale_index_reloads_in_background_and_keeps_answering(self):
+        self.index.loaded_at = time.monotonic() - REFRESH_SECONDS - 1
+
+        with mock.patch.object(self.index, 'reload_in_background') as reload, self.assertNumQueries(0):
+            self.index.ensure_loaded()
+            self.assertEqual(self.labels('رياض'), ['الرياضيات الشامل'])
+
+        reload.assert_called_once_with()
+
+
+class FacetTests(TestCase):
+    """
+    Facet counts respect the other facets' filters, are cached per filter set
+    and are invalidated for every worker through the shared cache
+    """
+
+    def setUp(self):
+        caches['shared'].clear()
+        for subject_name, price, publisher_id in [('math_12', 0, 1), ('math_12', 3000, 2), ('physics_12', 3000, 1)]:
+            package = new_package('package')
+            package.subject_name, package.price, package.publisher_id = subject_name, price, publisher_id
+            package.save()
+
+    def counts(self, facet, **params):
+        result = facets.get_facets('packages', params)
+        return {bucket['value']: bucket['count'] for bucket in result[facet]}
+
+    def test_counts_respect_the_other_facets(self):
+        self.assertEqual(self.counts('subject_name'), {'math_12': 2, 'physics_12': 1})
+        # A facet keeps showing its alternatives when it is filtered itself
+        self.assertEqual(self.counts('subject_name', subject_name='math_12'), {'math_12': 2, 'physics_12': 1})
+        self.assertEqual(self.counts('price_band', subject_name='math_12'), {'free': 1, '2001-5000': 1})
+        self.assertEqual(self.counts('publisher_id', price_band='2001-5000'), {1: 1, 2: 1})
+
+    def test_pagination_parameters_share_the_cached_set(self):
+        self.counts('subject_name', price='5000', count='1', limit='10')
+
+        with self.assertNumQueries(0):
+            self.counts('subject_name', price='5000', count='2', limit='20', cursor='abc')
+
+    def test_write_in_another_worker_invalidates(self):
+        self.assertEqual(self.counts('subject_name'), {'math_12': 2, 'physics_12': 1})
+
+        # Another worker has its own cache connection, only the backend is shared
+        with mock.patch.object(facets, 'facet_cache', caches.create_connection('shared')):
+            facets.invalidate('packages')
+        TestPackage.objects.filter(subject_name='physics_12').update(subject_name='math_12')
+
+        self.assertEqual(self.counts('subject_name'), {'math_12': 3})
+
+    def test_saving_a_package_invalidates(self):
+        self.counts('subject_name')
+
+        new_package('package').save()
+
+        self.assertEqual(self.counts('subject_name'), {'math_12': 3, 'physics_12': 1})
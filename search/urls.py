@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Search-as-you-type suggestions served from memory
+    path('suggest/', views.suggest, name='search_suggest'),
+
+    # Filter sidebar counts of a catalogue ('packages', 'notes' or 'teachers')
+    path('facets/<str:catalogue>/', views.facets, name='search_facets'),
+]
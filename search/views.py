@@ -0,0 +1,56 @@
+from rest_framework.decorators import api_view
+from rest_framework.response import Response
+
+from .facets import CATALOGUES, get_facets
+from .suggest import SUGGESTED_FIELDS, MAX_SUGGESTIONS, suggestion_index
+
+# Create your views here.
+
+
+@api_view(['GET'])
+def suggest(request):
+    """
+    Search-as-you-type suggestions over teacher names, test package names and note titles
+    Answered from the per-worker in-memory index, without querying the database
+    Query parameters:
+    - q: what the user typed so far
+    - limit: number of suggestions (default 10)
+    - type: optional comma separated kinds to keep ('teacher', 'package', 'note')
+    """
+    query = request.GET.get('q', '')
+
+    try:
+        limit = min(int(request.GET.get('limit', 10)), MAX_SUGGESTIONS)
+    except ValueError:
+        return Response({'error': 'يجب أن يكون limit رقماً صحيحاً'}, status=400)
+
+    kinds = None
+    if request.GET.get('type'):
+        kinds = set(request.GET['type'].split(','))
+        if not kinds <= set(SUGGESTED_FIELDS):
+            return Response({'error': "النوع يجب أن يكون 'teacher' أو 'package' أو 'note'"}, status=400)
+
+    suggestion_index.ensure_loaded()
+
+    return Response({'suggestions': suggestion_index.suggest(query, limit, kinds)}, status=200)
+
+
+@api_view(['GET'])
+def facets(request, catalogue):
+    """
+    Facet counts of a catalogue for its filter sidebar
+    Takes the same query parameters as the catalogue list endpoint and returns,
+    for every facet, the values still reachable and how many items each one has
+    - packages: subject_name, Class, publisher_id, price_band
+    - notes: subject_name, Class, publisher_id, price_band
+    - teachers: subject_name, Class, city
+    """
+    if catalogue not in CATALOGUES:
+        return Response({'error': "الفهرس يجب أن يكون 'packages' أو 'notes' أو 'teachers'"}, status=404)
+
+    try:
+        result = get_facets(catalogue, request.GET.dict())
+    except ValueError:
+        return Response({'error': 'يجب أن تكون قيم التصفية الرقمية أرقاماً صحيحة'}, status=400)
+
+    return Response({'facets': result}, status=200)
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0020_alter_profile_teacher_class'),
+        ('student_related_exams', '0012_alter_doneexams_date_of_application_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='doneexams',
+            options={'ordering': ['-date_of_application', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='doneexams',
+            index=models.Index(fields=['student', 'date_of_application', 'id'], name='doneexams_student_date_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('profiles', '0021_profile_teacher_teacher_class_city_subj_idx'),
+        ('student_related_exams', '0013_alter_doneexams_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='doneexams',
+            index=models.Index(fields=['student', 'subject_name', 'exam_id'], name='doneexams_student_subject_idx'),
+        ),
+    ]
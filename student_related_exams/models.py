@@ -81,7 +81,15 @@ class DoneExams(models.Model):
         Meta configuration for the DoneExams model
         Defines model behavior and display settings
         """
-        # Order records by date of application (newest first)
-        ordering = ['-date_of_application']
+        # Order records by date of application (newest first), id breaks ties
+        # so cursor pagination always sees a stable order
+        ordering = ['-date_of_application', '-id']
+
+        indexes = [
+            # Seek index for the student's exam history feed
+            models.Index(fields=['student', 'date_of_application', 'id'], name='doneexams_student_date_idx'),
+            # get_student_solved_exams: covers the student/subject filter and the exam_id projection
+            models.Index(fields=['student', 'subject_name', 'exam_id'], name='doneexams_student_subject_idx'),
+        ]
 
 
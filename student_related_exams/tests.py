@@ -1,3 +1,89 @@
 from django.test import TestCase
 
+from myproject.testing import QueryPlanTestMixin, QueryRecorder, indexes_starting_with
+from profiles.models import Profile_Student
+from users.models import User
+from .models import DoneExams
+
 # Create your tests here.
+
+
+class DoneExamsIndexTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that the student exam history is read through a student index
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        students = []
+        for i in range(10):
+            user = User.objects.create(username=f'student{i}', email=f'student{i}@svi.com')
+            students.append(Profile_Student.objects.get(user=user))
+
+        DoneExams.objects.bulk_create([
+            DoneExams(
+                student=students[i % len(students)],
+                subject_name='math_12',
+                exam_name=f'exam {i}',
+                exam_id=str(i),
+                result=50,
+            )
+            for i in range(300)
+        ])
+        cls.student = students[0]
+
+    def test_history_page_uses_student_index(self):
+        self.assertEndpointUsesIndex(
+            f'/StudentRelatedExams/student_done_exams/{self.student.pk}/',
+            DoneExams,
+            indexes_starting_with(DoneExams, 'student_id'),
+            {'count': 2, 'limit': 10},
+        )
+
+    def test_history_cursor_page_uses_seek_index(self):
+        response = self.client.get(
+            f'/StudentRelatedExams/student_done_exams/{self.student.pk}/', {'cursor': '', 'limit': 10}
+        )
+        self.assertEndpointUsesIndex(
+            f'/StudentRelatedExams/student_done_exams/{self.student.pk}/',
+            DoneExams,
+            indexes_starting_with(DoneExams, 'student_id'),
+            {'cursor': response.json()['next_cursor'], 'limit': 10},
+        )
+
+
+class DoneExamsCursorTests(TestCase):
+    """
+    Check the cursor pages of the exam history: complete, without overlap, counted once
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=user)
+        DoneExams.objects.bulk_create([
+            DoneExams(student=cls.student, subject_name='math_12', exam_name=f'exam {i}', exam_id=str(i), result=50)
+            for i in range(25)
+        ])
+        cls.url = f'/StudentRelatedExams/student_done_exams/{cls.student.pk}/'
+
+    def test_cursor_pages_walk_the_whole_history(self):
+        seen = []
+        response = self.client.get(self.url, {'cursor': '', 'limit': 10}).json()
+        self.assertEqual(response['number_of_exams'], 25)
+        seen.extend(exam['exam_id'] for exam in response['exams'])
+
+        while response['next_cursor']:
+            response = self.client.get(self.url, {'cursor': response['next_cursor'], 'limit': 10}).json()
+            seen.extend(exam['exam_id'] for exam in response['exams'])
+
+        self.assertEqual(sorted(seen), sorted(str(i) for i in range(25)))
+
+    def test_later_cursor_pages_skip_the_count(self):
+        first = self.client.get(self.url, {'cursor': '', 'limit': 10}).json()
+
+        with QueryRecorder() as recorder:
+            response = self.client.get(self.url, {'cursor': first['next_cursor'], 'limit': 10}).json()
+
+        self.assertIsNone(response['number_of_exams'])
+        self.assertEqual(recorder.queries, 1)
@@ -3,6 +3,8 @@ from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework.generics import ListCreateAPIView
 from .serializers import DoneExamsSerializer, GetExamsDone 
+from myproject.pagination import paginate, keyset_paginate, cursor_total
+from myproject.projection import project
 
 from .models import DoneExams  
 
@@ -21,24 +23,42 @@ def get_exams_done_by_student_id(request, id):
     """
     Get all exams completed by a specific student with pagination
     Returns paginated list of exams that the student has completed
+    Pass ?cursor= (empty for the first page) to page with cursors instead of count
     """
     # Get pagination parameters from query string
     count = request.GET.get('count')
     limit = request.GET.get('limit')
+    cursor = request.GET.get('cursor')
 
     # Filter exams by student ID to get all exams completed by this student
-    exams = DoneExams.objects.filter(student=id)
+    # loading only the columns of the history rows
+    exams = project(DoneExams.objects.filter(student=id), GetExamsDone)
 
-    # Serialize the filtered exam data
-    serial = GetExamsDone(exams, many=True)
-  
-    # Apply pagination to the results
-    begin = (int(count) - 1) * int(limit)
-    end = int(count) * int(limit)
+    # Opt-in cursor pagination seeks on (date_of_application, id) instead of using OFFSET
+    if cursor is not None:
+        try:
+            page, next_cursor, previous_cursor = keyset_paginate(exams, cursor, limit or 10, 'date_of_application')
+        except (ValueError, TypeError):
+            return Response({'error': 'مؤشر الصفحة غير صحيح'}, status=400)
+
+        serial = GetExamsDone(page, many=True)
+
+        return Response({
+            'exams': serial.data,
+            'number_of_exams': cursor_total(exams, cursor),
+            'next_cursor': next_cursor,
+            'previous_cursor': previous_cursor
+        }, status=200)
+
+    # Apply pagination in the database
+    page, number_of_exams = paginate(exams, count, limit)
+
+    # Serialize only the requested page of exams
+    serial = GetExamsDone(page, many=True)
  
     return Response({
-        'exams': serial.data[begin:end], 
-        'number_of_exams': len(serial.data)
+        'exams': serial.data, 
+        'number_of_exams': number_of_exams
     }, status=200)
 
  
\ No newline at end of file
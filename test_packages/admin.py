@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import TestPackage
+from .models import TestPackage, Unit
 from questions.models import Questions
 from django.db import connection
 from django.contrib.admin.models import LogEntry
@@ -26,6 +26,14 @@ class TestPackageAdmin(admin.ModelAdmin):
 admin.site.register(TestPackage ,TestPackageAdmin)
 
 
+class UnitAdmin(admin.ModelAdmin):
+    list_display = ['name', 'subject_name', 'id']
+    search_fields = ['name', 'subject_name']
+    list_filter = ['subject_name']
+
+admin.site.register(Unit, UnitAdmin)
+
+
 
 class LogEntryAdmin(admin.ModelAdmin):
     list_display = [
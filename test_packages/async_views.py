@@ -0,0 +1,44 @@
+"""
+Async twins of the catalogue reads of views.py, served under ASGI (myproject/fastpath.py)
+"""
+from myproject.fastpath import async_api_view, json_response
+from myproject.pagination import apaginate
+from myproject.projection import project
+from .models import TestPackage
+from .serializers import TestPackageSerializer, TestPackageDetailsSerializer
+from .views import package_catalogue
+
+
+@async_api_view(['GET'])
+async def get_all_packages(request, subject_name):
+    """
+    Async version of views.get_all_packages
+    """
+    page, number_of_exams = await apaginate(
+        package_catalogue(subject_name, request.GET), request.GET.get('count'), request.GET.get('limit')
+    )
+
+    return json_response({
+        'exams': TestPackageSerializer(page, many=True).data,
+        'number_of_exams': number_of_exams
+    })
+
+
+@async_api_view(['GET'])
+async def get_package_details(request, id):
+    """
+    Async version of views.get_package_details
+    """
+    obj = await TestPackage.objects.aget(id=id)
+
+    return json_response(TestPackageDetailsSerializer(obj).data)
+
+
+@async_api_view(['GET'])
+async def get_package_info(request, id):
+    """
+    Async version of views.get_package_info
+    """
+    obj = [package async for package in project(TestPackage.objects.filter(id=id), TestPackageSerializer)]
+
+    return json_response(TestPackageSerializer(obj, many=True).data)
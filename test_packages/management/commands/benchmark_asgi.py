@@ -0,0 +1,136 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from notes.models import Notes
+from profiles.models import Profile_Student
+from test_packages.models import TestPackage
+
+
+class Command(BaseCommand):
+    """
+    Throughput of the catalogue reads under WSGI and under ASGI
+    Sends --requests GETs per endpoint with --concurrency requests in flight to
+    the project's WSGI application (from threads, like a threaded WSGI worker),
+    to its ASGI application serving the DRF views, and to its ASGI application
+    with the async fast path (myproject/fastpath.py), all in this process
+    The applications are called directly, so the numbers leave out the HTTP
+    server and compare the request handling only. Run it on a seeded catalogue,
+    against the production database engine (MySQL) for meaningful numbers
+    """
+    help = 'Compare catalogue read throughput of sync WSGI and async ASGI handling'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help='Requests sent per endpoint and mode')
+        parser.add_argument('--concurrency', type=int, default=16, help='Requests in flight at once')
+
+    def handle(self, *args, **options):
+        from myproject.asgi import application as asgi_application
+        from myproject.wsgi import application as wsgi_application
+
+        urls = self.urls()
+        total, concurrency = options['requests'], options['concurrency']
+
+        modes = [
+            ('wsgi', lambda url: self.run_wsgi(wsgi_application, url, total, concurrency)),
+            ('asgi drf', lambda url: self.run_asgi_drf(asgi_application, url, total, concurrency)),
+            ('asgi fast', lambda url: asyncio.run(self.run_asgi(asgi_application, url, total, concurrency))),
+        ]
+
+        self.stdout.write(f'{"endpoint":<45}' + ''.join(f'{name:>12}' for name, _ in modes) + f'{"speedup":>10}')
+        for name, url in urls:
+            rates = []
+            for _, run in modes:
+                started = time.monotonic()
+                failures = run(url)
+                elapsed = time.monotonic() - started
+                if failures:
+                    raise CommandError(f'{failures} requests to {url} did not answer 200')
+                rates.append(total / elapsed if elapsed else 0)
+
+            self.stdout.write(
+                f'{name:<45}' + ''.join(f'{rate:>10.0f}/s' for rate in rates) + f'{rates[-1] / rates[0]:>9.2f}x'
+            )
+        self.stdout.write(self.style.SUCCESS(f'{total} requests per endpoint and mode, {concurrency} in flight'))
+
+    def urls(self):
+        """
+        (name, path with query string) of every benchmarked endpoint, on rows of the current database
+        """
+        package = TestPackage.objects.only('id', 'subject_name').order_by('id').first()
+        note = Notes.objects.only('id', 'subject_name', 'Class').order_by('id').first()
+        student_id = Profile_Student.objects.order_by('user_id').values_list('user_id', flat=True).first()
+        if package is None or note is None or student_id is None:
+            raise CommandError('Seed a catalogue first: the benchmark needs a package, a note and a student')
+
+        page = {'count': 1, 'limit': 10}
+        return [
+            ('packages', f'/test_packages/get_packages/{package.subject_name}/?' + urlencode(
+                {'price': 1000000, 'number_of_questions': 1000, **page})),
+            ('package details', f'/test_packages/get_package_details/{package.id}/'),
+            ('notes', f'/notes/get_by_filter/{note.subject_name}/?' + urlencode(
+                {'Class': note.Class, 'price': 1000000, **page})),
+            ('note preview', f'/notes/GetNoteWithoutContent/{note.id}/'),
+            ('teacher preview', '/profiles/get_teacher_preview/?' + urlencode(
+                {'Class': '12', 'city': 'all', 'subject_name': 'عرض الكل', **page})),
+            ('premium access', f'/StudentPremiumContent/check-access/{student_id}/{package.id}/exam/'),
+        ]
+
+    def run_wsgi(self, application, url, total, concurrency):
+        path, _, query = url.partition('?')
+
+        def call(_):
+            environ = {'PATH_INFO': path, 'QUERY_STRING': query, 'REQUEST_METHOD': 'GET'}
+            setup_testing_defaults(environ)
+            statuses = []
+            body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+            b''.join(body)
+            body.close()
+            return statuses[0].startswith('200')
+
+        with ThreadPoolExecutor(concurrency) as pool:
+            return sum(not ok for ok in pool.map(call, range(total)))
+
+    def run_asgi_drf(self, application, url, total, concurrency):
+        # The DRF views, as ASGI served them before the fast path
+        with override_settings(ASYNC_URLCONF=None):
+            return asyncio.run(self.run_asgi(application, url, total, concurrency))
+
+    async def run_asgi(self, application, url, total, concurrency):
+        path, _, query = url.partition('?')
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+            'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': query.encode(),
+            'root_path': '', 'headers': [(b'host', b'testserver')],
+            'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+        }
+
+        async def call():
+            statuses = []
+            received = False
+
+            async def receive():
+                nonlocal received
+                if not received:
+                    received = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                # The client stays connected, Django cancels this wait once it answered
+                await asyncio.Event().wait()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            await application(dict(scope), receive, send)
+            return statuses[0] == 200
+
+        async def worker(requests):
+            return sum([not await call() for _ in range(requests)])
+
+        shares = [total // concurrency + (i < total % concurrency) for i in range(concurrency)]
+        return sum(await asyncio.gather(*(worker(share) for share in shares if share)))
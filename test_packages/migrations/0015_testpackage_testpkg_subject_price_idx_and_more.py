@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-18 11:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_packages', '0014_remove_testpackage_number_of_comments_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='testpackage',
+            index=models.Index(fields=['subject_name', 'price', 'number_of_questions'], name='testpkg_subject_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='testpackage',
+            index=models.Index(fields=['publisher_id', 'date_added'], name='testpkg_publisher_date_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_packages', '0015_testpackage_testpkg_subject_price_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Unit',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject_name', models.CharField(help_text='Subject name this unit belongs to', max_length=25)),
+                ('name', models.CharField(help_text='Display name of the unit', max_length=255)),
+                ('normalized_name', models.CharField(help_text='Normalized unit name used for lookups', max_length=255)),
+            ],
+            options={
+                'ordering': ['name'],
+                'unique_together': {('subject_name', 'normalized_name')},
+            },
+        ),
+        migrations.AddField(
+            model_name='testpackage',
+            name='unit_catalogue',
+            field=models.ManyToManyField(blank=True, editable=False, help_text='Catalogue units covered by this test package', related_name='packages', to='test_packages.unit'),
+        ),
+    ]
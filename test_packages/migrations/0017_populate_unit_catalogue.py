@@ -0,0 +1,83 @@
+import re
+
+from django.db import migrations
+
+# Copy of test_packages/units.py and search/normalization.py at the time of
+# this migration, so later changes to the live code do not change what it does
+TASHKEEL = re.compile('[\u0610-\u061a\u064b-\u065f\u0670\u06d6-\u06ed]')
+
+CHARACTER_MAP = str.maketrans({
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا', 'ى': 'ي', 'ة': 'ه', '\u0640': None,
+    '٠': '0', '١': '1', '٢': '2', '٣': '3', '٤': '4',
+    '٥': '5', '٦': '6', '٧': '7', '٨': '8', '٩': '9',
+})
+
+UNIT_SEPARATORS = re.compile(r'[,،;؛|\n]+')
+
+MAX_UNIT_NAME_LENGTH = 255
+
+
+def normalize(text):
+    return TASHKEEL.sub('', text).translate(CHARACTER_MAP).casefold()
+
+
+def split_units(text):
+    """
+    Return {normalized name: display name} for the units listed in text
+    """
+    units = {}
+    for name in UNIT_SEPARATORS.split(text or ''):
+        name = ' '.join(name.split())[:MAX_UNIT_NAME_LENGTH]
+        key = normalize(name)
+        if key and key not in units:
+            units[key] = name
+    return units
+
+
+def populate_unit_catalogue(apps, schema_editor):
+    """
+    Parse the units text of every existing test package into the unit catalogue
+    """
+    TestPackage = apps.get_model('test_packages', 'TestPackage')
+    Unit = apps.get_model('test_packages', 'Unit')
+    Link = TestPackage.unit_catalogue.through
+
+    packages = TestPackage.objects.order_by().values_list('id', 'subject_name', 'units')
+
+    # First pass: create every distinct (subject, unit) of the catalogue
+    catalogue = {}
+    for package_id, subject_name, units in packages.iterator(chunk_size=2000):
+        for key, name in split_units(units).items():
+            catalogue.setdefault((subject_name, key), name)
+
+    Unit.objects.bulk_create(
+        [Unit(subject_name=subject, name=name, normalized_name=key) for (subject, key), name in catalogue.items()],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    unit_ids = {
+        (subject, key): pk
+        for pk, subject, key in Unit.objects.values_list('id', 'subject_name', 'normalized_name')
+    }
+
+    # Second pass: link every package to its units
+    links = []
+    for package_id, subject_name, units in packages.iterator(chunk_size=2000):
+        for key in split_units(units):
+            links.append(Link(testpackage_id=package_id, unit_id=unit_ids[(subject_name, key)]))
+        if len(links) >= 1000:
+            Link.objects.bulk_create(links, ignore_conflicts=True)
+            links = []
+
+    Link.objects.bulk_create(links, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_packages', '0016_unit_testpackage_unit_catalogue'),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_unit_catalogue, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 13:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('test_packages', '0017_populate_unit_catalogue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='testpackage',
+            name='exam_version',
+            field=models.PositiveIntegerField(default=0, editable=False, help_text='Version of the questions of this package'),
+        ),
+    ]
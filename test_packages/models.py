@@ -1,7 +1,55 @@
  
 from django.db import models
 from django.db import connection
+from django.dispatch import receiver
+from django.db.models.signals import post_delete, post_save, pre_delete
 from profiles.models import Profile_Teacher
+from .units import split_units
+
+
+class Unit(models.Model):
+    """
+    Model to store the catalogue of units of each subject
+    Test packages are linked to their units so the unit filter is an indexed join
+    instead of a substring search on the free-text units field
+    """
+
+    # Subject this unit belongs to (same values as TestPackage.subject_name)
+    subject_name = models.CharField(
+        max_length=25,
+        help_text="Subject name this unit belongs to"
+    )
+
+    # Unit name as first written by a teacher
+    name = models.CharField(
+        max_length=255,
+        help_text="Display name of the unit"
+    )
+
+    # Normalized name used to match spelling variants of the same unit
+    normalized_name = models.CharField(
+        max_length=255,
+        help_text="Normalized unit name used for lookups"
+    )
+
+    class Meta:
+        """
+        Meta configuration for the Unit model
+        """
+        # One unit per normalized name in each subject, also the lookup index
+        unique_together = ['subject_name', 'normalized_name']
+        ordering = ['name']
+
+    def __str__(self):
+        return f"{self.name} ({self.subject_name})"
+
+    @classmethod
+    def prune(cls, ids):
+        """
+        Delete the units among ids that no test package links to anymore
+        """
+        if ids:
+            cls.objects.filter(id__in=ids, packages__isnull=True).delete()
 
 class TestPackage(models.Model):
     """
@@ -80,6 +128,23 @@ class TestPackage(models.Model):
         blank=True,
         help_text="Total number of questions in this test package"
     )
+
+    # Bumped by every change to the questions or question images of the package
+    # (questions/signals.py), the compiled exam snapshots are keyed on it
+    exam_version = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        help_text="Version of the questions of this package"
+    )
+
+    # Units parsed from the units field, kept in sync by the post_save signal
+    unit_catalogue = models.ManyToManyField(
+        Unit,
+        related_name='packages',
+        blank=True,
+        editable=False,
+        help_text="Catalogue units covered by this test package"
+    )
  
     
     class Meta:
@@ -89,6 +154,13 @@ class TestPackage(models.Model):
         # Order records by date added (newest first)
         ordering = ['-date_added']
 
+        indexes = [
+            # get_packages: subject_name equality, then price / number_of_questions ranges
+            models.Index(fields=['subject_name', 'price', 'number_of_questions'], name='testpkg_subject_price_idx'),
+            # get_test_packages_by_publisher_id: publisher equality, newest first
+            models.Index(fields=['publisher_id', 'date_added'], name='testpkg_publisher_date_idx'),
+        ]
+
     def __str__(self):
         """
         String representation of the model instance
@@ -96,6 +168,48 @@ class TestPackage(models.Model):
         """
         return self.package_name + ' , ' + str(self.id)
   
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the loaded subject and units so saves that did not change them skip the unit sync
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_units = instance.units_key()
+        return instance
+
+    def units_key(self):
+        """
+        Values the unit links depend on (None for fields that were not loaded)
+        """
+        return (self.__dict__.get('subject_name'), self.__dict__.get('units'))
+
+    def sync_units(self, created=False):
+        """
+        Link the package to the catalogue units listed in its units field
+        Creates the units missing from the subject's catalogue and deletes the
+        ones this package was the last to use
+        """
+        parsed = split_units(self.units)
+        existing = {
+            unit.normalized_name: unit
+            for unit in Unit.objects.filter(subject_name=self.subject_name, normalized_name__in=parsed)
+        }
+        missing = [
+            Unit(subject_name=self.subject_name, name=name, normalized_name=key)
+            for key, name in parsed.items() if key not in existing
+        ]
+        if missing:
+            Unit.objects.bulk_create(missing, ignore_conflicts=True)
+            existing.update({
+                unit.normalized_name: unit
+                for unit in Unit.objects.filter(subject_name=self.subject_name, normalized_name__in=parsed)
+            })
+
+        previous = set() if created else set(self.unit_catalogue.order_by().values_list('id', flat=True))
+        self.unit_catalogue.set(existing.values())
+        Unit.prune(previous - {unit.id for unit in existing.values()})
+        self._loaded_units = self.units_key()
+
     @property 
     def get_publisher_full_name(self):
         """
@@ -103,5 +217,30 @@ class TestPackage(models.Model):
         Retrieves the teacher's full name from the Profile_Teacher model
         """
         obj = Profile_Teacher.objects.get(user_id=self.publisher_id)
-        return obj.full_name 
-    
\ No newline at end of file
+        return obj.full_name
+
+
+@receiver(post_save, sender=TestPackage)
+def sync_test_package_units(sender, instance, created, **kwargs):
+    """
+    Signal handler to keep the unit catalogue links of a test package in sync
+    Skipped when an existing package is saved without changing its subject or units
+    """
+    if created or instance.units_key() != getattr(instance, '_loaded_units', None):
+        instance.sync_units(created)
+
+
+@receiver(pre_delete, sender=TestPackage)
+def remember_test_package_units(sender, instance, **kwargs):
+    """
+    Signal handler to remember the units of a test package before its links are deleted with it
+    """
+    instance._unit_ids = list(instance.unit_catalogue.order_by().values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=TestPackage)
+def prune_test_package_units(sender, instance, **kwargs):
+    """
+    Signal handler to delete the units only the deleted test package used
+    """
+    Unit.prune(getattr(instance, '_unit_ids', ()))
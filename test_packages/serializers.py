@@ -26,7 +26,9 @@ class CreatePackages(serializers.ModelSerializer):
     class Meta:
         model = TestPackage
         # Include all fields for complete package creation and updates
-        fields = '__all__'
+        # except the unit links, which are derived from units by a signal,
+        # and the exam version, which the question signals maintain
+        exclude = ['unit_catalogue', 'exam_version']
     
     def validate_package_name(self, value):
         """
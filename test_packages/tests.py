@@ -1,3 +1,213 @@
+import importlib
+from unittest import mock
+
+from django.apps import apps
+
 from django.test import TestCase
 
+from myproject.pagination import MAX_PAGE_SIZE
+from myproject.testing import QueryPlanTestMixin, QueryRecorder
+from profiles.models import Profile_Student
+from student_related_exams.models import DoneExams
+from users.models import User
+from .models import TestPackage, Unit
+from .units import split_units
+from .views import create_test_packages
+
 # Create your tests here.
+
+populate = importlib.import_module('test_packages.migrations.0017_populate_unit_catalogue')
+
+SUBJECTS = ['math_12', 'physics_12', 'chemistry_12', 'science_12', 'arabic_12']
+
+
+class TestPackageIndexTests(QueryPlanTestMixin, TestCase):
+    """
+    Check that the catalogue queries of the test_packages app are served by their indexes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        TestPackage.objects.bulk_create([
+            TestPackage(
+                package_name=f'package {i}',
+                units='unit',
+                subject_name=SUBJECTS[i % len(SUBJECTS)],
+                price=(i % 10) * 1000,
+                number_of_questions=10 + i % 40,
+                publisher_id=i % 20 + 1,
+            )
+            for i in range(400)
+        ])
+
+        user = User.objects.create(username='student', email='student@svi.com')
+        cls.student = Profile_Student.objects.get(user=user)
+        DoneExams.objects.bulk_create([
+            DoneExams(
+                student=cls.student,
+                subject_name=SUBJECTS[i % len(SUBJECTS)],
+                exam_name=f'exam {i}',
+                exam_id=str(i),
+                result=50,
+            )
+            for i in range(100)
+        ])
+
+    def test_get_packages_uses_subject_price_index(self):
+        self.assertEndpointUsesIndex(
+            '/test_packages/get_packages/math_12/',
+            TestPackage,
+            'testpkg_subject_price_idx',
+            {'price': 3000, 'number_of_questions': 30, 'count': 2, 'limit': 10},
+        )
+
+    def test_get_packages_by_publisher_uses_publisher_index(self):
+        self.assertEndpointUsesIndex(
+            '/test_packages/get_test_packages_by_publisher_id/3/',
+            TestPackage,
+            'testpkg_publisher_date_idx',
+            {'count': 1, 'limit': 10},
+        )
+
+    def test_get_student_solved_exams_uses_covering_index(self):
+        self.assertEndpointUsesIndex(
+            '/test_packages/get_student_solved_exams/math_12/',
+            DoneExams,
+            'doneexams_student_subject_idx',
+            {'user_id': self.student.pk},
+        )
+
+
+class PackagePaginationTests(TestCase):
+    """
+    Check that get_packages pages in the database and keeps the count/limit contract
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        TestPackage.objects.bulk_create([
+            TestPackage(
+                package_name=f'package {i}',
+                units='unit',
+                subject_name='math_12',
+                price=1000,
+                number_of_questions=10,
+                publisher_id=1,
+            )
+            for i in range(MAX_PAGE_SIZE + 25)
+        ])
+
+    def get_page(self, count, limit):
+        return self.client.get('/test_packages/get_packages/math_12/', {
+            'price': 1000, 'number_of_questions': 10, 'count': count, 'limit': limit,
+        })
+
+    def test_page_holds_limit_rows_and_the_total(self):
+        response = self.get_page(2, 10)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['exams']), 10)
+        self.assertEqual(response.data['number_of_exams'], MAX_PAGE_SIZE + 25)
+
+    def test_last_page_is_partial(self):
+        response = self.get_page(3, MAX_PAGE_SIZE // 2)
+
+        self.assertEqual(len(response.data['exams']), 25)
+
+    def test_limit_is_capped(self):
+        response = self.get_page(1, MAX_PAGE_SIZE * 10)
+
+        self.assertEqual(len(response.data['exams']), MAX_PAGE_SIZE)
+
+    def test_page_costs_one_count_and_one_select(self):
+        with QueryRecorder() as recorder:
+            self.get_page(1, 10)
+
+        self.assertEqual(recorder.queries, 2)
+        self.assertEqual(recorder.rows, 11)
+
+    def test_generic_list_is_bounded(self):
+        with mock.patch.object(create_test_packages, 'max_list_size', 5):
+            response = self.client.get('/test_packages/create_test_packages/')
+
+        self.assertEqual(len(response.data), 5)
+
+
+class UnitCatalogueTests(TestCase):
+    """
+    Check that packages are linked to their units, filtered and counted through the catalogue,
+    and that units nobody uses anymore are deleted
+    """
+
+    def create(self, units, subject_name='math_12'):
+        return TestPackage.objects.create(
+            package_name='package',
+            units=units,
+            subject_name=subject_name,
+            price=1000,
+            number_of_questions=10,
+            publisher_id=1,
+        )
+
+    def catalogue(self, subject_name='math_12'):
+        return sorted(Unit.objects.filter(subject_name=subject_name).values_list('name', flat=True))
+
+    def test_split_units_folds_separators_and_spelling(self):
+        self.assertEqual(
+            list(split_units('الجبر، التفاضل ; الجَبر\n  الإحصاء  |')),
+            ['الجبر', 'التفاضل', 'الاحصاء'],
+        )
+
+    def test_packages_link_to_shared_units(self):
+        first = self.create('الجبر، التفاضل')
+        second = self.create('الجَبر')
+
+        self.assertEqual(self.catalogue(), ['التفاضل', 'الجبر'])
+        self.assertEqual(first.unit_catalogue.count(), 2)
+        self.assertEqual(list(second.unit_catalogue.values_list('name', flat=True)), ['الجبر'])
+
+    def test_unit_filter_and_counts(self):
+        self.create('الجبر، التفاضل')
+        self.create('الجبر')
+        self.create('الجبر', subject_name='physics_12')
+
+        response = self.client.get('/test_packages/get_packages/math_12/', {
+            'price': 1000, 'number_of_questions': 10, 'count': 1, 'limit': 10, 'unit': 'الجَبر',
+        })
+        self.assertEqual(response.data['number_of_exams'], 2)
+
+        units = self.client.get('/test_packages/get_units/math_12/').data['units']
+        self.assertEqual({unit['name']: unit['number_of_packages'] for unit in units}, {'الجبر': 2, 'التفاضل': 1})
+
+    def test_edit_relinks_and_prunes_unused_units(self):
+        package = self.create('الجبر، التفاضل')
+        self.create('الجبر')
+
+        package.units = 'الهندسة'
+        package.save()
+
+        self.assertEqual(self.catalogue(), ['الجبر', 'الهندسة'])
+
+    def test_delete_prunes_unused_units(self):
+        package = self.create('الجبر، التفاضل')
+        self.create('الجبر')
+
+        package.delete()
+
+        self.assertEqual(self.catalogue(), ['الجبر'])
+
+    def test_migration_builds_the_same_catalogue(self):
+        TestPackage.objects.bulk_create([
+            TestPackage(package_name='package', units=units, subject_name='math_12', price=1000,
+                        number_of_questions=10, publisher_id=1)
+            for units in ('الجبر، التفاضل', 'الجَبر ; الإحصاء', '')
+        ])
+
+        populate.populate_unit_catalogue(apps, None)
+
+        self.assertEqual(self.catalogue(), ['الإحصاء', 'التفاضل', 'الجبر'])
+        for package in TestPackage.objects.prefetch_related('unit_catalogue'):
+            self.assertEqual(
+                sorted(unit.normalized_name for unit in package.unit_catalogue.all()),
+                sorted(split_units(package.units)),
+            )
@@ -0,0 +1,27 @@
+"""
+Parsing of the free-text TestPackage.units field into unit names
+Used by the model signal, migration 0017 keeps its own copy
+"""
+import re
+
+from search.normalization import normalize
+
+# Teachers separate units with commas (Latin or Arabic), semicolons, pipes or new lines
+UNIT_SEPARATORS = re.compile(r'[,،;؛|\n]+')
+
+# Longest unit name kept in the catalogue
+MAX_UNIT_NAME_LENGTH = 255
+
+
+def split_units(text):
+    """
+    Return {normalized name: display name} for the units listed in text
+    Spelling variants of the same unit (أ/ا, tashkeel...) collapse to one entry
+    """
+    units = {}
+    for name in UNIT_SEPARATORS.split(text or ''):
+        name = ' '.join(name.split())[:MAX_UNIT_NAME_LENGTH]
+        key = normalize(name)
+        if key and key not in units:
+            units[key] = name
+    return units
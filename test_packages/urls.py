@@ -9,6 +9,7 @@ from rest_framework.routers import DefaultRouter
 urlpatterns = [
     path('get_packages/<str:subject_name>/', views.get_all_packages),
     path('get_student_solved_exams/<str:subject_name>/', views.get_student_solved_exams),
+    path('get_units/<str:subject_name>/', views.get_units),
     path('get_single_package/<int:id>/', views.get_package_info   ),
     path('increase_num_of_apps/<int:id>/', views.increase_num_of_apps   ),
     path('increase_number_of_purchases/<int:id>/', views.increase_num_of_purchases   ),
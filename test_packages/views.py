@@ -1,4 +1,4 @@
-from .models import TestPackage
+from .models import TestPackage, Unit
 from rest_framework.response import Response
 from rest_framework.decorators import api_view
 from rest_framework import status
@@ -7,21 +7,23 @@ from student_related_exams.models import DoneExams
 from student_related_exams.serializers import GetSolvedSerializer 
 from rest_framework import generics  
 from django.shortcuts import get_object_or_404 
+from myproject.pagination import paginate, BoundedListMixin, MAX_PAGE_SIZE
+from myproject.projection import project, ProjectedListMixin
+from myproject import counters
+from search.index import search
+from search.normalization import normalize
+from django.db.models import Count, Q
 
-@api_view(['GET']) 
-def get_all_packages(request, subject_name):
+def package_catalogue(subject_name, params):
     """
-    Get all test packages for a specific subject with filtering and pagination
-    Allows filtering by price, number of questions, and sorting options
+    Build the filtered, projected queryset of get_packages from its query parameters
+    Shared by the DRF view and its async twin (async_views.py)
     """
-    # Get query parameters for filtering and pagination
-    price = request.GET.get('price')
-    limit = request.GET.get('limit')
-    count = request.GET.get('count')
-    unit = request.GET.get('unit')    
-    number_of_questions = request.GET.get('number_of_questions')
-    publisher_name = request.GET.get('publisher_name')
-    name = request.GET.get('name')
+    price = params.get('price')
+    unit = params.get('unit')    
+    number_of_questions = params.get('number_of_questions')
+    publisher_name = params.get('publisher_name')
+    name = params.get('name')
  
     # Filter packages by subject, price, and number of questions
     obj = TestPackage.objects.filter(
@@ -30,39 +32,77 @@ def get_all_packages(request, subject_name):
         number_of_questions__lte=number_of_questions
     )
     
+    # Search by name and publisher through the search index (best matches first)
     if name is not None:
-        obj = obj.filter(package_name__icontains=name)
-    
+        obj = search(obj, 'package', 'package_name', name)
     
     if publisher_name is not None:
-        obj = obj.filter(publisher_name__icontains=publisher_name)
+        obj = search(obj, 'package', 'publisher_name', publisher_name, rank=name is None)
     
     # Add unit filter if unit parameter is provided
+    # Joins through the unit catalogue on its (subject_name, normalized_name) index
     if unit is not None and unit != "عرض الكل":
-        obj = obj.filter(units__icontains=unit)
+        obj = obj.filter(unit_catalogue__in=Unit.objects.filter(
+            subject_name=subject_name,
+            normalized_name=normalize(' '.join(unit.split()))
+        ))
     
- 
-    # Count total number of exams matching the criteria
-    number_of_exams = obj.count()
+    # Load only the columns rendered by the serializer
+    return project(obj, TestPackageSerializer)
 
- 
-    # Serialize the filtered data
-    serial = TestPackageSerializer(obj, many=True)
 
-    # Apply pagination
-    begin = (int(count) - 1) * int(limit)
-    end = int(count) * int(limit) 
- 
-    # Ensure pagination bounds are within data length
-    begin = min(begin, len(serial.data))
-    end = min(end, len(serial.data))
+@api_view(['GET']) 
+def get_all_packages(request, subject_name):
+    """
+    Get all test packages for a specific subject with filtering and pagination
+    Allows filtering by price, number of questions, and sorting options
+    """
+    # Get query parameters for pagination
+    limit = request.GET.get('limit')
+    count = request.GET.get('count')
+
+    # Filter, search and project the packages
+    obj = package_catalogue(subject_name, request.GET)
+
+    # Apply pagination in the database and count total number of exams matching the criteria
+    page, number_of_exams = paginate(obj, count, limit)
+
+    # Serialize only the requested page
+    serial = TestPackageSerializer(page, many=True)
  
     return Response({
-        'exams': serial.data[begin:end], 
+        'exams': serial.data, 
         'number_of_exams': number_of_exams
     }, status=200)
 
 
+@api_view(['GET'])
+def get_units(request, subject_name):
+    """
+    Get the unit catalogue of a subject with the number of packages in each unit
+    Counts are computed in one grouped query for the filter sidebar and can be
+    narrowed by the same price and number_of_questions filters as get_packages
+    """
+    price = request.GET.get('price')
+    number_of_questions = request.GET.get('number_of_questions')
+
+    # Only count packages that pass the currently applied filters
+    package_filter = Q()
+    try:
+        if price is not None:
+            package_filter &= Q(packages__price__lte=int(price))
+        if number_of_questions is not None:
+            package_filter &= Q(packages__number_of_questions__lte=int(number_of_questions))
+    except ValueError:
+        return Response({'error': 'يجب أن يكون السعر وعدد الأسئلة أرقاماً صحيحة'}, status=400)
+
+    units = Unit.objects.filter(subject_name=subject_name).annotate(
+        number_of_packages=Count('packages', filter=package_filter)
+    ).values('id', 'name', 'number_of_packages')
+
+    return Response({'units': list(units)}, status=200)
+
+
 @api_view(['GET']) 
 def get_student_solved_exams(request, subject_name):
     """
@@ -73,10 +113,12 @@ def get_student_solved_exams(request, subject_name):
     user_id = request.GET.get('user_id')
 
     # Get unique exam IDs that the student has solved for this subject
+    # order_by() drops the default ordering so DISTINCT applies to exam_id only
+    # and the query is answered from the (student, subject_name, exam_id) index
     user_solved_exams = DoneExams.objects.filter(
         student=user_id, 
         subject_name=subject_name
-    ).values('exam_id').distinct()
+    ).values('exam_id').order_by().distinct()
     
     # Serialize the solved exams data
     serial = GetSolvedSerializer(user_solved_exams, many=True)
@@ -107,7 +149,7 @@ def get_package_info(request, id):
     Returns basic package information using TestPackageSerializer
     """
     # Get the test package by ID
-    obj = TestPackage.objects.filter(id=id)
+    obj = project(TestPackage.objects.filter(id=id), TestPackageSerializer)
 
     # Serialize with basic serializer
     serial = TestPackageSerializer(obj, many=True)
@@ -121,12 +163,11 @@ def increase_num_of_apps(request, id):
     Increment the number of applications for a test package
     Tracks how many times the package has been accessed
     """
-    # Get the test package by ID
-    obj = TestPackage.objects.get(id=id)
+    # Make sure the package exists, reading its primary key only
+    get_object_or_404(TestPackage.objects.only('id'), id=id)
     
-    # Increment the applications counter
-    obj.number_of_apps += 1
-    obj.save()
+    # Buffer the increment, it reaches the database with the next batched flush
+    counters.increment(TestPackage, id, 'number_of_apps')
 
     return Response('تم تحديث عدد التطبيقات بنجاح', status=200)
  
@@ -137,17 +178,16 @@ def increase_num_of_purchases(request, id):
     Increment the number of purchases for a test package
     Tracks how many times the package has been purchased
     """
-    # Get the test package by ID
-    obj = TestPackage.objects.get(id=id)
+    # Make sure the package exists, reading its primary key only
+    get_object_or_404(TestPackage.objects.only('id'), id=id)
     
-    # Increment the purchases counter
-    obj.number_of_purchases += 1
-    obj.save()
+    # Buffer the increment, it reaches the database with the next batched flush
+    counters.increment(TestPackage, id, 'number_of_purchases')
 
     return Response('تم تحديث عدد المشتريات بنجاح', status=200)
     
 # Generic views for CRUD operations
-class create_test_packages(generics.ListCreateAPIView):
+class create_test_packages(BoundedListMixin, ProjectedListMixin, generics.ListCreateAPIView):
     """
     Generic view for listing and creating test packages
     Provides GET (list) and POST (create) functionality
@@ -169,31 +209,21 @@ def get_packages_by_publisher(request, id):
     # Set up filter for publisher ID
     filters = {'publisher_id': id}
  
-    # Filter packages by publisher
-    obj = TestPackage.objects.filter(**filters)
-    number_of_exams = obj.count()
-
-    # Serialize the filtered data
-    serial = TestPackageSerializer(obj, many=True)
+    # Filter packages by publisher, loading only the columns rendered by the serializer
+    obj = project(TestPackage.objects.filter(**filters), TestPackageSerializer)
 
     # Apply pagination if parameters are provided
-    if limit is not None and count is not None:
-        try:
-            limit = int(limit)
-            count = int(count)
-            begin = (count - 1) * limit
-            end = count * limit
-            begin = min(begin, len(serial.data))
-            end = min(end, len(serial.data))
-            exams = serial.data[begin:end]
-        except Exception:
-            # If pagination fails, return all data
-            exams = serial.data
-    else:
-        exams = serial.data
+    try:
+        page, number_of_exams = paginate(obj, count, limit)
+    except (ValueError, TypeError):
+        # If pagination fails, return the first page of the maximum size
+        page, number_of_exams = paginate(obj, 1, MAX_PAGE_SIZE)
+
+    # Serialize only the requested page
+    serial = TestPackageSerializer(page, many=True)
 
     return Response({
-        'exams': exams, 
+        'exams': serial.data, 
         'number_of_exams': number_of_exams
     }, status=200)
 
@@ -0,0 +1,77 @@
+"""
+Stateless JWT authentication
+ClaimsJWTAuthentication answers request.user from the claims of the access
+token (see tokens.py) instead of loading the users.User row on every request.
+Views that need the real row (to save it, or to read fields that are not
+claims) declare it with @full_user, and tokens issued before the claims existed
+fall back to the lookup as well
+Enabled with STATELESS_JWT_AUTH=1 (settings.py). A deactivated or demoted user
+keeps the claims of their access token until it expires
+"""
+from django.utils.functional import cached_property
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.models import TokenUser
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import User
+from .tokens import USER_CLAIMS
+
+
+class ClaimsUser(TokenUser):
+    """
+    Lightweight request.user built from the claims of a validated token
+    """
+
+    @cached_property
+    def id(self):
+        # The user id claim is written as a string, compare it as the model's primary key
+        return User._meta.pk.to_python(self.token[api_settings.USER_ID_CLAIM])
+
+    @cached_property
+    def is_teacher(self):
+        return self.token.get('is_teacher', False)
+
+    @cached_property
+    def Class(self):
+        return self.token.get('Class')
+
+    @cached_property
+    def profile_id(self):
+        return self.token.get('profile_id')
+
+
+def full_user(view):
+    """
+    Mark a view (an APIView class or an @api_view function) as needing the users.User row
+    """
+    target = getattr(view, 'cls', view)
+    target.requires_full_user = True
+    return view
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that only reads users.User for views marked with @full_user
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+
+        if self.needs_full_user(request, validated_token):
+            return self.get_user(validated_token), validated_token
+        return ClaimsUser(validated_token), validated_token
+
+    def needs_full_user(self, request, validated_token):
+        view = (getattr(request, 'parser_context', None) or {}).get('view')
+        if getattr(view, 'requires_full_user', False):
+            return True
+        # Tokens issued before the claims were added
+        return any(claim not in validated_token for claim in USER_CLAIMS)
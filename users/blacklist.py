@@ -0,0 +1,263 @@
+"""
+Refresh token blacklist: per-worker fast path and pruning
+Every refresh token check used to be an indexed lookup into BlacklistedToken,
+a table that gains one row per rotation and never shrinks
+Each worker keeps a Bloom filter of the blacklisted jtis (plus an LRU of
+the ones confirmed from the database). A jti the filter has never seen is
+answered "not blacklisted" without a query, only possible members are looked
+up. The filter is sized from a count of the unexpired blacklisted tokens and
+loaded by a background thread on first use, checks made while it loads ask the
+database. It learns the tokens blacklisted by this worker at once and pulls
+the ones blacklisted elsewhere with an incremental id > watermark query at most
+every SYNC_SECONDS, which bounds how long another worker's logout can be missed
+prune() deletes the expired outstanding and blacklisted tokens in chunks,
+they can no longer be presented so neither table needs them
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.db import connection, transaction
+from django.db.models import Q
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+# Seconds between two pulls of the tokens blacklisted by other workers
+SYNC_SECONDS = 2
+
+# Seconds an id missing below the watermark is looked for again. Ids are
+# allocated before commit, a blacklisting transaction still open that long is given up on
+GAP_SECONDS = 60
+
+# Ids below a pulled row looked for again at most, more than concurrent blacklisting transactions can hold
+MAX_GAP = 1000
+
+# Bloom filter sizing: bits per expected member and hash functions (about 1% false positives)
+BITS_PER_MEMBER = 10
+HASHES = 7
+
+# The filter is sized for GROWTH times the blacklisted tokens it loads, at least MIN_CAPACITY,
+# and loaded again in the background once full
+MIN_CAPACITY = 10000
+GROWTH = 2
+
+# Blacklisted jtis confirmed from the database kept per worker
+CONFIRMED_SIZE = 10000
+
+# Tokens deleted per transaction by prune()
+PRUNE_BATCH_SIZE = 5000
+
+
+class BloomFilter:
+    """
+    Fixed size set of strings that can answer "certainly absent"
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.size = capacity * BITS_PER_MEMBER
+        self.bits = bytearray(self.size // 8 + 1)
+        self.count = 0
+
+    def _positions(self, value):
+        digest = hashlib.blake2b(value.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big')
+        # Double hashing: k positions from two independent halves of one digest
+        return [(first + i * second) % self.size for i in range(HASHES)]
+
+    def add(self, value):
+        for position in self._positions(value):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, value):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(value))
+
+    @property
+    def full(self):
+        return self.count >= self.capacity
+
+
+class BlacklistFilter:
+    """
+    Per-worker answer to "is this jti blacklisted", see the module docstring
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generation = 0
+        self.reset()
+
+    @property
+    def is_loaded(self):
+        return self.bloom is not None
+
+    def reset(self):
+        """
+        Forget everything, the next check loads the filter again
+        """
+        with self.lock:
+            self.bloom = None
+            self.confirmed = OrderedDict()
+            self.watermark = 0
+            # id -> monotonic time it was first missed below the watermark
+            self.gaps = {}
+            self.synced_at = None
+            # jtis blacklisted by this worker while a load runs
+            self.pending = None
+            self.loading = False
+            self.syncing = False
+            # Changed by every reset and load, a pull read for an older filter is dropped
+            self.generation += 1
+
+    def load(self):
+        """
+        Read the unexpired blacklisted tokens into a filter sized for them and swap it in
+        """
+        with self.lock:
+            self.pending = set()
+
+        rows = BlacklistedToken.objects.filter(token__expires_at__gt=aware_utcnow())
+        bloom = BloomFilter(max(MIN_CAPACITY, rows.count() * GROWTH))
+        watermark = 0
+        for blacklisted_id, jti in rows.order_by('id').values_list('id', 'token__jti').iterator(chunk_size=5000):
+            bloom.add(jti)
+            watermark = max(watermark, blacklisted_id)
+
+        with self.lock:
+            for jti in self.pending or ():
+                if jti not in bloom:
+                    bloom.add(jti)
+            self.pending = None
+            self.bloom = bloom
+            # Rows pulled by a sync during the load stay in the old filter only, pull them again
+            self.watermark = watermark
+            self.synced_at = time.monotonic()
+            self.generation += 1
+
+    def load_in_background(self):
+        with self.lock:
+            if self.loading:
+                return
+            self.loading = True
+        threading.Thread(target=self._load_in_thread, name='blacklist-load', daemon=True).start()
+
+    def _load_in_thread(self):
+        try:
+            self.load()
+        finally:
+            self.loading = False
+            # The thread opened its own database connection
+            connection.close()
+
+    def _pull(self, watermark, gaps):
+        """
+        Read the (id, jti) of the tokens blacklisted since the watermark, and of the missing ids below it
+        """
+        rows = BlacklistedToken.objects.filter(Q(id__gt=watermark) | Q(id__in=gaps))
+        return list(rows.order_by('id').values_list('id', 'token__jti'))
+
+    def _merge(self, rows):
+        """
+        Add the pulled rows to the filter and move the watermark past them
+        """
+        now = time.monotonic()
+        watermark = self.watermark
+        for blacklisted_id, jti in rows:
+            if jti not in self.bloom:
+                self.bloom.add(jti)
+            self.gaps.pop(blacklisted_id, None)
+            # Ids skipped on the way up may belong to transactions not committed yet
+            for missing in range(max(watermark + 1, blacklisted_id - MAX_GAP), blacklisted_id):
+                self.gaps[missing] = now
+            watermark = max(watermark, blacklisted_id)
+        self.watermark = watermark
+        self.gaps = {missing: seen for missing, seen in self.gaps.items() if now - seen < GAP_SECONDS}
+        self.synced_at = now
+
+    def sync(self):
+        """
+        Pull the tokens blacklisted by other workers when the last pull is older than SYNC_SECONDS
+        Starts the load of a filter not loaded yet, or too full for its false positive rate
+        The query runs without the lock, checks keep being answered from the filter meanwhile
+        """
+        with self.lock:
+            due = (
+                self.is_loaded and not self.syncing
+                and time.monotonic() - self.synced_at >= SYNC_SECONDS
+            )
+            if due:
+                # One thread pulls, the others go on with the filter as it is
+                self.syncing = True
+                generation, watermark, gaps = self.generation, self.watermark, list(self.gaps)
+            stale = not self.is_loaded or self.bloom.full
+
+        if due:
+            rows = None
+            try:
+                rows = self._pull(watermark, gaps)
+            finally:
+                with self.lock:
+                    self.syncing = False
+                    if rows is not None and generation == self.generation:
+                        self._merge(rows)
+        if stale:
+            self.load_in_background()
+
+    def add(self, jti):
+        """
+        Record a token this worker just blacklisted
+        """
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(jti)
+            if self.pending is not None:
+                self.pending.add(jti)
+            self._confirm(jti)
+
+    def _confirm(self, jti):
+        self.confirmed[jti] = True
+        self.confirmed.move_to_end(jti)
+        if len(self.confirmed) > CONFIRMED_SIZE:
+            self.confirmed.popitem(last=False)
+
+    def is_blacklisted(self, jti):
+        self.sync()
+
+        with self.lock:
+            if jti in self.confirmed:
+                self.confirmed.move_to_end(jti)
+                return True
+            if self.bloom is not None and jti not in self.bloom:
+                return False
+
+        # Possible member (or false positive), or the filter is still loading: ask the database
+        blacklisted = BlacklistedToken.objects.filter(token__jti=jti).exists()
+        if blacklisted:
+            with self.lock:
+                self._confirm(jti)
+        return blacklisted
+
+
+blacklist_filter = BlacklistFilter()
+
+
+def prune(batch_size=PRUNE_BATCH_SIZE):
+    """
+    Delete the expired outstanding tokens and their blacklist rows, batch_size per transaction
+    Returns the number of outstanding tokens deleted
+    """
+    pruned = 0
+    while True:
+        with transaction.atomic():
+            # Tokens expire in id order (fixed lifetime), the oldest ids are found first on the primary key
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=aware_utcnow())
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return pruned
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+        pruned += len(ids)
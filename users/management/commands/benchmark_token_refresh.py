@@ -0,0 +1,85 @@
+import statistics
+import time
+import uuid
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from users.blacklist import blacklist_filter
+from users.models import User
+from users.tokens import FilteredRefreshToken
+
+
+class Command(BaseCommand):
+    """
+    Refresh token check latency against a large blacklist
+    Fills the outstanding and blacklisted token tables with --rows rotated
+    tokens, then times the blacklist check of a valid refresh token through
+    simplejwt's query and through the per-worker filter (users/blacklist.py)
+    Run it against the production database engine (MySQL) for tens of
+    millions of rows, the synthetic rows are deleted afterwards unless --keep
+    """
+    help = 'Compare refresh token check latency with and without the blacklist filter'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000000, help='Blacklisted tokens to create')
+        parser.add_argument('--samples', type=int, default=2000, help='Checks timed per variant')
+        parser.add_argument('--chunk', type=int, default=5000, help='Rows inserted per statement')
+        parser.add_argument('--keep', action='store_true', help='Keep the synthetic rows')
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}-'
+        started = time.monotonic()
+        self.fill(prefix, options['rows'], options['chunk'])
+        self.stdout.write(f'Inserted {options["rows"]} blacklisted tokens in {time.monotonic() - started:.2f}s')
+
+        user = User.objects.create(username=f'{prefix}user', email=f'{prefix}user@svi.com')
+        try:
+            token = str(RefreshToken.for_user(user))
+
+            blacklist_filter.reset()
+            started = time.monotonic()
+            blacklist_filter.load()
+            self.stdout.write(f'Loaded the filter of this worker in {time.monotonic() - started:.2f}s')
+
+            for name, token_class in (('query', RefreshToken), ('filter', FilteredRefreshToken)):
+                timings = []
+                for _ in range(options['samples']):
+                    started = time.perf_counter()
+                    token_class(token)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f'{name:>6}: p50 {statistics.median(timings):.3f}ms '
+                    f'p95 {timings[int(len(timings) * 0.95)]:.3f}ms p99 {timings[int(len(timings) * 0.99)]:.3f}ms'
+                ))
+        finally:
+            if not options['keep']:
+                self.clean(prefix, options['chunk'])
+                user.delete()
+
+    def fill(self, prefix, rows, chunk):
+        now = aware_utcnow()
+        for start in range(0, rows, chunk):
+            jtis = [f'{prefix}{i}' for i in range(start, min(start + chunk, rows))]
+            with transaction.atomic():
+                OutstandingToken.objects.bulk_create([
+                    OutstandingToken(jti=jti, token='', created_at=now, expires_at=now + timedelta(days=90))
+                    for jti in jtis
+                ])
+                # bulk_create does not set the ids on MySQL, read them back through the jti index
+                ids = OutstandingToken.objects.filter(jti__in=jtis).values_list('id', flat=True)
+                BlacklistedToken.objects.bulk_create([BlacklistedToken(token_id=token_id) for token_id in ids])
+
+    def clean(self, prefix, chunk):
+        while True:
+            with transaction.atomic():
+                ids = list(OutstandingToken.objects.filter(jti__startswith=prefix).values_list('id', flat=True)[:chunk])
+                if not ids:
+                    return
+                BlacklistedToken.objects.filter(token_id__in=ids).delete()
+                OutstandingToken.objects.filter(id__in=ids).delete()
@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.provisioning import PROVISION_BATCH_SIZE, ProvisioningConflict, provision, read_csv
+
+
+class Command(BaseCommand):
+    """
+    Create the student or teacher accounts of a school CSV in bulk
+    The header line names the columns of users/provisioning.py FIELDS. Invalid
+    rows are printed with their errors and skipped, the others are created together
+    """
+    help = 'Create student and teacher accounts in bulk from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header line')
+        kind = parser.add_mutually_exclusive_group()
+        kind.add_argument('--students', action='store_true', help='Create every row as a student, ignoring the is_teacher column')
+        kind.add_argument('--teachers', action='store_true', help='Create every row as a teacher, ignoring the is_teacher column')
+        parser.add_argument('--workers', type=int, default=None, help='Password hashing processes (one per CPU by default)')
+        parser.add_argument('--batch-size', type=int, default=PROVISION_BATCH_SIZE, help='Rows per INSERT')
+
+    def handle(self, *args, **options):
+        is_teacher = True if options['teachers'] else False if options['students'] else None
+
+        with open(options['path'], 'rb') as file:
+            rows = read_csv(file)
+
+        started = time.monotonic()
+        try:
+            result = provision(rows, is_teacher=is_teacher, workers=options['workers'], batch_size=options['batch_size'])
+        except ProvisioningConflict:
+            raise CommandError('An account of the file was registered meanwhile, nothing was created, run the command again')
+        elapsed = time.monotonic() - started
+
+        for error in result.errors:
+            self.stderr.write(f"Row {error['row']}: {error['errors']}")
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {result.created} accounts, skipped {len(result.errors)} rows in {elapsed:.2f}s '
+            f'({result.created / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
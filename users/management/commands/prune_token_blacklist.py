@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.blacklist import PRUNE_BATCH_SIZE, prune
+
+
+class Command(BaseCommand):
+    """
+    Delete the expired refresh tokens from the outstanding and blacklisted token tables
+    Meant to run periodically (daily from cron). Unlike simplejwt's
+    flushexpiredtokens it deletes in chunks, so it never holds one huge transaction
+    """
+    help = 'Delete expired outstanding and blacklisted refresh tokens in chunks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=PRUNE_BATCH_SIZE, help='Tokens deleted per transaction')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        pruned = prune(options['batch_size'])
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {pruned} expired tokens in {elapsed:.2f}s ({pruned / elapsed if elapsed else 0:.0f} rows/s)'
+        ))
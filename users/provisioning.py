@@ -0,0 +1,287 @@
+"""
+Bulk provisioning of student and teacher accounts (school CSVs)
+register() costs about six queries and one password hash per account. Here a
+whole batch is validated first, usernames and emails are checked against the
+database with one query, passwords are hashed (in a process pool for the
+provision_accounts command, in the request for the capped endpoint), and the users
+and their fully populated profiles are inserted with bulk_create. bulk_create
+sends no post_save, so the profiles, teacher statistics and search postings the
+signals would create are inserted here directly
+Invalid rows are reported with their errors and skipped, the valid rows are
+created together in one transaction
+"""
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import io
+import os
+
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.functions import Lower
+
+from profiles.models import Profile_Student, Profile_Teacher, TeacherStats
+from search.facets import invalidate as invalidate_facets
+from search.index import index_objects
+from search.suggest import suggestion_index
+from .models import User
+
+# Dictionary mapping English subject names to Arabic names for teacher bio generation
+subject_arabic_names={
+     'math':'رياضيات' ,
+    'physics':'فيزياء' ,
+    'chemistry':'كيمياء' ,
+    'science':'علوم' ,
+    'arabic':'عربي' ,
+    'english':'إنكليزي' ,
+    'france':'فرنسي' ,
+    'islam':'ديانة' ,
+    'physics_chemistry':'فيزياء و كيمياء' ,
+    'geography':'اجتماعيات' ,
+}
+
+# Columns of a provisioning row, school is only read for students and studying_subjects for teachers
+FIELDS = ('username', 'email', 'password', 'is_teacher', 'full_name', 'phone_number', 'Class', 'city', 'gender', 'school', 'studying_subjects')
+REQUIRED_FIELDS = ('username', 'email', 'password', 'full_name', 'gender')
+
+# Rows inserted by one INSERT statement
+PROVISION_BATCH_SIZE = 1000
+
+# Most rows accepted by one upload to the endpoint, which hashes their passwords in
+# the web worker, larger files go through `manage.py provision_accounts`
+MAX_UPLOAD_ROWS = 200
+
+# Smaller batches are hashed in this process, starting a pool costs more than it saves
+POOL_THRESHOLD = 32
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+
+# created: number of accounts created, errors: [{'row': position from 1, 'errors': {field: message}}]
+Provisioned = namedtuple('Provisioned', ['created', 'errors'])
+
+
+class ProvisioningConflict(Exception):
+    """
+    An account of the batch was registered concurrently, nothing was created
+    """
+
+
+def teacher_bio(gender, studying_subjects):
+    """
+    Default bio of a new teacher, built from their gender and subject
+    """
+    if gender == 'M':
+        bio = 'استاذ متخصص في تدريس مادة '
+    else:
+        bio = "آنسة متخصصة في تدريس مادة "
+    return bio + subject_arabic_names[studying_subjects]
+
+
+def read_csv(file):
+    """
+    Rows of an uploaded or opened CSV file (binary), keyed by its header line
+    """
+    return list(csv.DictReader(io.TextIOWrapper(file, encoding='utf-8-sig', newline='')))
+
+
+def _is_true(value):
+    if isinstance(value, bool):
+        return value
+    return str(value or '').strip().lower() in TRUE_VALUES
+
+
+def clean_row(row, is_teacher=None):
+    """
+    Validate one row like register() does
+    is_teacher, when given, overrides the is_teacher column
+    Returns (cleaned row, {field: message})
+    """
+    cleaned = {field: str(row.get(field) or '').strip() for field in FIELDS if field != 'is_teacher'}
+    cleaned['is_teacher'] = _is_true(row.get('is_teacher')) if is_teacher is None else is_teacher
+    errors = {}
+
+    for field in REQUIRED_FIELDS:
+        if not cleaned[field]:
+            errors[field] = f'الحقل المطلوب مفقود: {field}'
+
+    if cleaned['username'] and len(cleaned['username']) < 3:
+        errors['username'] = "اسم المستخدم يجب أن يكون 3 أحرف على الأقل"
+    elif len(cleaned['username']) > User._meta.get_field('username').max_length:
+        errors['username'] = 'اسم المستخدم طويل جداً'
+
+    if cleaned['email']:
+        try:
+            validate_email(cleaned['email'])
+        except ValidationError:
+            errors['email'] = 'البريد الإلكتروني غير صحيح'
+
+    if cleaned['password'] and len(cleaned['password']) < 6:
+        errors['password'] = "كلمة المرور يجب أن تكون 6 أحرف على الأقل"
+
+    if cleaned['gender'] and cleaned['gender'] not in ('M', 'F'):
+        errors['gender'] = 'الجنس يجب أن يكون M أو F'
+
+    if cleaned['Class']:
+        if cleaned['is_teacher']:
+            valid_class = cleaned['Class'] in dict(Profile_Teacher.class_choices)
+        else:
+            valid_class = len(cleaned['Class']) <= Profile_Student._meta.get_field('Class').max_length
+        if not valid_class:
+            errors['Class'] = f"صف غير صحيح: {cleaned['Class']}"
+
+    if cleaned['is_teacher'] and cleaned['studying_subjects'] not in subject_arabic_names:
+        errors['studying_subjects'] = f"مادة غير صحيحة: {cleaned['studying_subjects']}"
+
+    return cleaned, errors
+
+
+def _taken(rows):
+    """
+    Usernames and emails of the rows already registered, with one query
+    Emails are compared without case, whatever the collation of the column
+    """
+    usernames = [row['username'] for row in rows]
+    emails = [row['email'].lower() for row in rows]
+    taken_usernames, taken_emails = set(), set()
+    users = User.objects.annotate(email_lower=Lower('email'))
+    for username, email in users.filter(Q(username__in=usernames) | Q(email_lower__in=emails)).values_list('username', 'email'):
+        taken_usernames.add(username)
+        taken_emails.add(email.lower())
+    return taken_usernames, taken_emails
+
+
+def _init_worker():
+    # Spawned workers (not forked) start without configured apps
+    import django
+    django.setup()
+
+
+def hash_passwords(passwords, workers=None):
+    """
+    Return make_password() of every password, in order
+    Large batches are spread over a process pool of workers processes (one per CPU by default)
+    """
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(passwords) < POOL_THRESHOLD:
+        return [make_password(password) for password in passwords]
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+        return list(pool.map(make_password, passwords, chunksize=max(1, len(passwords) // (workers * 4))))
+
+
+def _profile(user_id, row):
+    """
+    Fully populated profile of a new account, as register() leaves it after its second save
+    """
+    if row['is_teacher']:
+        return Profile_Teacher(
+            user_id=user_id,
+            full_name=row['full_name'],
+            phone_number=row['phone_number'] or '-',
+            Class=row['Class'] or '12',
+            studying_subjects=row['studying_subjects'],
+            city=row['city'],
+            gender=row['gender'],
+            bio=teacher_bio(row['gender'], row['studying_subjects']),
+        )
+    return Profile_Student(
+        user_id=user_id,
+        full_name=row['full_name'],
+        phone_number=row['phone_number'] or '-',
+        Class=row['Class'] or '12',
+        city=row['city'],
+        school=row['school'] or '-',
+        gender=row['gender'],
+    )
+
+
+def _insert(rows, passwords, batch_size):
+    """
+    Insert the users, their profiles and the teachers' statistics and postings
+    Returns the new teacher profiles
+    """
+    User.objects.bulk_create([
+        User(username=row['username'], email=row['email'], password=password, is_teacher=row['is_teacher'])
+        for row, password in zip(rows, passwords)
+    ], batch_size=batch_size)
+
+    # Read back for the ids, bulk_create does not set them on MySQL
+    ids = {}
+    for start in range(0, len(rows), batch_size):
+        usernames = [row['username'] for row in rows[start:start + batch_size]]
+        ids.update(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+
+    students = [_profile(ids[row['username']], row) for row in rows if not row['is_teacher']]
+    teachers = [_profile(ids[row['username']], row) for row in rows if row['is_teacher']]
+    Profile_Student.objects.bulk_create(students, batch_size=batch_size)
+    Profile_Teacher.objects.bulk_create(teachers, batch_size=batch_size)
+    TeacherStats.objects.bulk_create([TeacherStats(teacher_id=teacher.user_id) for teacher in teachers], batch_size=batch_size)
+    index_objects('teacher', teachers)
+    return teachers
+
+
+def provision(rows, is_teacher=None, workers=None, batch_size=PROVISION_BATCH_SIZE):
+    """
+    Create the accounts of rows (dicts keyed by FIELDS)
+    is_teacher, when given, overrides the is_teacher column of every row
+    workers is the number of password hashing processes (one per CPU by default),
+    1 hashes in this process and is what a web request passes
+    Returns Provisioned, raises ProvisioningConflict when an account was registered
+    concurrently between the check and the insert
+    """
+    errors = []
+    valid = []
+    seen_usernames, seen_emails = set(), set()
+
+    for position, row in enumerate(rows, start=1):
+        cleaned, row_errors = clean_row(row, is_teacher)
+
+        # Duplicates inside the batch keep their first row
+        if cleaned['username'] in seen_usernames:
+            row_errors.setdefault('username', 'اسم المستخدم مكرر في الملف')
+        if cleaned['email'].lower() in seen_emails:
+            row_errors.setdefault('email', 'البريد الإلكتروني مكرر في الملف')
+
+        if row_errors:
+            errors.append({'row': position, 'errors': row_errors})
+        else:
+            seen_usernames.add(cleaned['username'])
+            seen_emails.add(cleaned['email'].lower())
+            valid.append((position, cleaned))
+
+    if valid:
+        taken_usernames, taken_emails = _taken([row for _, row in valid])
+        fresh = []
+        for position, row in valid:
+            row_errors = {}
+            if row['username'] in taken_usernames:
+                row_errors['username'] = 'اسم المستخدم هذا مسجل بالفعل'
+            if row['email'].lower() in taken_emails:
+                row_errors['email'] = 'هذا البريد الإلكتروني مسجل بالفعل'
+            if row_errors:
+                errors.append({'row': position, 'errors': row_errors})
+            else:
+                fresh.append(row)
+        valid = fresh
+        errors.sort(key=lambda error: error['row'])
+
+    if not valid:
+        return Provisioned(0, errors)
+
+    passwords = hash_passwords([row['password'] for row in valid], workers)
+
+    try:
+        with transaction.atomic():
+            teachers = _insert(valid, passwords, batch_size)
+    except IntegrityError:
+        raise ProvisioningConflict()
+
+    if teachers:
+        for teacher in teachers:
+            suggestion_index.update('teacher', teacher)
+        invalidate_facets('teachers')
+
+    return Provisioned(len(valid), errors)
@@ -1,5 +1,7 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 from .models import User
+from .tokens import FilteredRefreshToken
 
 class SingUpSerializer(serializers.ModelSerializer):
     """
@@ -49,4 +51,10 @@ class UserSerializer(serializers.ModelSerializer):
         model = User
         # Define fields to be included in user data responses
         # Excludes password for security reasons
-        fields = ('id', 'username', 'email', 'is_teacher') 
\ No newline at end of file
+        fields = ('id', 'username', 'email', 'is_teacher') 
+
+class FilteredTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    token/refresh/ serializer checking and blacklisting through the per-worker filter
+    """
+    token_class = FilteredRefreshToken
@@ -1,3 +1,326 @@
+import io
+import time
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth.hashers import check_password
+from django.core.cache import caches
 from django.test import TestCase
+from rest_framework.decorators import api_view
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+from rest_framework_simplejwt.utils import aware_utcnow
+
+from profiles.models import Profile_Student, Profile_Teacher, TeacherStats
+from search.models import SearchToken
+from vouchers.codes import generate_batch
+from vouchers.models import VoucherBatch
+from .authentication import ClaimsJWTAuthentication, ClaimsUser, full_user
+from . import blacklist
+from .blacklist import SYNC_SECONDS, blacklist_filter, prune
+from .models import User
+from .provisioning import MAX_UPLOAD_ROWS, hash_passwords, provision, read_csv
+from .tokens import FilteredRefreshToken
 
 # Create your tests here.
+
+
+@api_view(['GET'])
+def plain_view(request):
+    pass
+
+
+@full_user
+@api_view(['GET'])
+def full_user_view(request):
+    pass
+
+
+class ClaimsAuthenticationTests(TestCase):
+    """
+    Tokens issued by login carry the user claims, which authenticate without a User query
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='student', email='student@svi.com')
+        cls.user.set_password('password')
+        cls.user.save()
+        Profile_Student.objects.filter(user=cls.user).update(Class='9')
+
+    def setUp(self):
+        caches['shared'].clear()
+
+    def login(self):
+        response = self.client.post('/users/login/', {'username': 'student', 'password': 'password'})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()['access']
+
+    def authenticate(self, access, view):
+        request = Request(
+            APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {access}'),
+            parser_context={'view': view.cls()},
+        )
+        return ClaimsJWTAuthentication().authenticate(request)[0]
+
+    def test_login_token_carries_claims(self):
+        token = AccessToken(self.login())
+
+        self.assertEqual(token['Class'], '9')
+        self.assertEqual(token['profile_id'], self.user.pk)
+        self.assertFalse(token['is_teacher'])
+
+    def test_claims_authenticate_without_query(self):
+        access = self.login()
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(access, plain_view)
+        self.assertIsInstance(user, ClaimsUser)
+        self.assertEqual((user.pk, user.Class, user.is_teacher), (self.user.pk, '9', False))
+
+    def test_full_user_views_load_the_user(self):
+        user = self.authenticate(self.login(), full_user_view)
+        self.assertIsInstance(user, User)
+
+    def test_token_without_claims_loads_the_user(self):
+        access = RefreshToken.for_user(self.user).access_token
+        self.assertIsInstance(self.authenticate(str(access), plain_view), User)
+
+
+class ClaimsEndpointTests(TestCase):
+    """
+    Under stateless authentication the endpoints reading only claims never load the user,
+    and those storing it get the users.User row
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        for username, is_staff in (('student', False), ('staff', True)):
+            user = User.objects.create(username=username, email=f'{username}@svi.com', is_staff=is_staff)
+            user.set_password('password')
+            user.save()
+        cls.staff_user = User.objects.get(username='staff')
+
+    def setUp(self):
+        caches['shared'].clear()
+        # The views were built with the default authentication classes of the test settings
+        patcher = mock.patch.object(APIView, 'get_authenticators', lambda view: [ClaimsJWTAuthentication()])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def client_for(self, username):
+        response = self.client.post('/users/login/', {'username': username, 'password': 'password'})
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {response.json()["access"]}')
+        return client
+
+    def test_claims_only_endpoints_do_not_load_the_user(self):
+        student, staff = self.client_for('student'), self.client_for('staff')
+        codes = io.StringIO()
+        generate_batch('shop', 500, 1, codes)
+        code = codes.getvalue().splitlines()[1].split(',')[1]
+
+        with mock.patch.object(ClaimsJWTAuthentication, 'get_user', side_effect=AssertionError('user loaded')):
+            self.assertEqual(student.post('/vouchers/redeem/', {'code': code}, format='json').status_code, 200)
+            self.assertEqual(student.get('/counters/metrics/').status_code, 403)
+            self.assertEqual(staff.get('/counters/metrics/').status_code, 200)
+
+    def test_voucher_batch_records_its_author(self):
+        response = self.client_for('staff').post(
+            '/vouchers/batches/', {'name': 'kiosk', 'value': 1000, 'quantity': 1}, format='json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(VoucherBatch.objects.get(name='kiosk').created_by, self.staff_user)
+
+
+class BlacklistFilterTests(TestCase):
+    """
+    Refresh tokens are checked against the blacklist without a query unless they may be on it
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='student', email='student@svi.com')
+
+    def setUp(self):
+        blacklist_filter.reset()
+        blacklist_filter.load()
+
+    def expire_sync(self):
+        blacklist_filter.synced_at = time.monotonic() - SYNC_SECONDS
+
+    def test_clean_token_is_checked_without_query(self):
+        token = str(FilteredRefreshToken.for_user(self.user))
+        FilteredRefreshToken(token)
+
+        with self.assertNumQueries(0):
+            FilteredRefreshToken(token)
+
+    def test_token_blacklisted_by_this_worker_is_refused(self):
+        token = FilteredRefreshToken.for_user(self.user)
+        FilteredRefreshToken(str(token))
+        token.blacklist()
+
+        with self.assertNumQueries(0), self.assertRaises(TokenError):
+            FilteredRefreshToken(str(token))
+
+    def test_token_blacklisted_elsewhere_is_pulled(self):
+        token = RefreshToken.for_user(self.user)
+        FilteredRefreshToken(str(token))
+
+        # Blacklisted by another worker, seen once the filter syncs again
+        token.blacklist()
+        self.expire_sync()
+        with self.assertRaises(TokenError):
+            FilteredRefreshToken(str(token))
+
+    def test_pull_runs_without_the_lock(self):
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        pull = blacklist_filter._pull
+
+        def pull_unlocked(*args):
+            self.assertFalse(blacklist_filter.lock.locked())
+            return pull(*args)
+
+        self.expire_sync()
+        with mock.patch.object(blacklist_filter, '_pull', side_effect=pull_unlocked) as pulled:
+            blacklist_filter.sync()
+        pulled.assert_called_once()
+        self.assertIn(token['jti'], blacklist_filter.bloom)
+
+    def test_filter_is_sized_from_the_blacklist(self):
+        for _ in range(3):
+            RefreshToken.for_user(self.user).blacklist()
+
+        with mock.patch.object(blacklist, 'MIN_CAPACITY', 1):
+            blacklist_filter.load()
+        self.assertEqual(blacklist_filter.bloom.capacity, 3 * blacklist.GROWTH)
+
+    def test_unloaded_filter_loads_in_background_and_asks_the_database(self):
+        token = RefreshToken.for_user(self.user)
+        token.blacklist()
+        blacklist_filter.reset()
+
+        with mock.patch.object(blacklist_filter, 'load_in_background') as load, self.assertNumQueries(1):
+            self.assertTrue(blacklist_filter.is_blacklisted(token['jti']))
+        load.assert_called_once_with()
+
+    def test_sync_pulls_new_rows_and_late_commits_only(self):
+        tokens = [RefreshToken.for_user(self.user) for _ in range(3)]
+        for token in tokens:
+            token.blacklist()
+        # The middle row is not committed yet when the filter syncs
+        late = BlacklistedToken.objects.get(token__jti=tokens[1]['jti'])
+        late_id = late.id
+        late.delete()
+        self.expire_sync()
+        blacklist_filter.sync()
+        self.assertNotIn(tokens[1]['jti'], blacklist_filter.bloom)
+
+        BlacklistedToken.objects.create(id=late_id, token=late.token)
+        self.expire_sync()
+        blacklist_filter.sync()
+        self.assertIn(tokens[1]['jti'], blacklist_filter.bloom)
+        self.assertEqual(blacklist_filter.gaps, {})
+
+    def test_prune_deletes_expired_tokens_only(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=aware_utcnow() - timedelta(days=1))
+        RefreshToken.for_user(self.user).blacklist()
+
+        self.assertEqual(prune(batch_size=1), 1)
+        self.assertEqual(OutstandingToken.objects.count(), 1)
+        self.assertEqual(BlacklistedToken.objects.count(), 1)
+
+
+class ProvisioningTests(TestCase):
+    """
+    Bulk created accounts match registered ones, invalid rows are reported and skipped
+    """
+
+    def row(self, username, **fields):
+        return {
+            'username': username, 'email': f'{username}@svi.com', 'password': 'password',
+            'full_name': username, 'phone_number': '0999', 'Class': '12', 'city': 'damascus',
+            'school': 'school', 'gender': 'M', **fields,
+        }
+
+    def test_creates_users_with_populated_profiles(self):
+        result = provision([
+            self.row('student'),
+            self.row('teacher', is_teacher='true', studying_subjects='math', gender='F'),
+        ])
+
+        self.assertEqual(result, (2, []))
+        student = Profile_Student.objects.get(user__username='student')
+        self.assertEqual((student.full_name, student.school, student.Class), ('student', 'school', '12'))
+        self.assertTrue(check_password('password', student.user.password))
+
+        teacher = Profile_Teacher.objects.get(user__username='teacher')
+        self.assertTrue(teacher.user.is_teacher)
+        self.assertEqual(teacher.bio, 'آنسة متخصصة في تدريس مادة رياضيات')
+        self.assertTrue(TeacherStats.objects.filter(teacher=teacher).exists())
+        self.assertTrue(SearchToken.objects.filter(kind='teacher', object_id=teacher.pk, token='teacher').exists())
+        self.assertFalse(Profile_Student.objects.filter(user=teacher.user).exists())
+
+    def test_reports_invalid_and_taken_rows(self):
+        User.objects.create(username='taken', email='taken@svi.com')
+
+        result = provision([
+            self.row('taken'),
+            self.row('other', email='TAKEN@svi.com'),
+            self.row('fresh'),
+            self.row('fresh', email='fresh2@svi.com'),
+            self.row('ab', password='123'),
+            self.row('teacher', is_teacher='1', studying_subjects='history'),
+        ])
+
+        self.assertEqual(result.created, 1)
+        self.assertEqual([error['row'] for error in result.errors], [1, 2, 4, 5, 6])
+        self.assertEqual(set(result.errors[3]['errors']), {'username', 'password'})
+        self.assertIn('studying_subjects', result.errors[4]['errors'])
+        self.assertEqual(set(User.objects.values_list('username', flat=True)), {'taken', 'fresh'})
+
+    def test_registered_email_is_taken_in_any_case(self):
+        User.objects.create(username='registered', email='Registered@svi.com')
+
+        result = provision([self.row('other', email='registered@SVI.com')])
+
+        self.assertEqual(result.created, 0)
+        self.assertEqual(set(result.errors[0]['errors']), {'email'})
+
+    def test_checks_the_batch_with_one_query(self):
+        rows = [self.row(f'student{i}') for i in range(5)]
+        with mock.patch('users.provisioning.hash_passwords', side_effect=lambda passwords, workers: passwords):
+            # Check, users, ids read back and profiles, plus the savepoint around the inserts
+            with self.assertNumQueries(6):
+                provision(rows)
+
+    def test_endpoint_hashes_in_process(self):
+        staff = User.objects.create(username='staff', email='staff@svi.com', is_staff=True)
+        client = APIClient()
+        client.force_authenticate(user=staff)
+
+        with mock.patch('users.provisioning.hash_passwords', side_effect=lambda passwords, workers: passwords) as hashed:
+            response = client.post('/users/provision/', {'users': [self.row('student')]}, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(hashed.call_args.args[1], 1)
+
+        rows = [self.row(f'student{i}') for i in range(MAX_UPLOAD_ROWS + 1)]
+        self.assertEqual(client.post('/users/provision/', {'users': rows}, format='json').status_code, 400)
+
+    def test_pool_hashes_in_order(self):
+        with mock.patch('users.provisioning.POOL_THRESHOLD', 1):
+            hashed = hash_passwords(['password1', 'password2'], workers=2)
+        self.assertTrue(check_password('password1', hashed[0]))
+        self.assertTrue(check_password('password2', hashed[1]))
+
+    def test_reads_csv_with_header(self):
+        file = io.BytesIO('\ufeffusername,email,full_name\nstudent,student@svi.com,طالب\n'.encode())
+        self.assertEqual(read_csv(file), [{'username': 'student', 'email': 'student@svi.com', 'full_name': 'طالب'}])
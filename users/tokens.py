@@ -0,0 +1,50 @@
+"""
+JWTs carrying the claims the API needs about their user
+login and refresh add is_teacher, is_staff, Class and profile_id to the
+tokens they issue, so ClaimsJWTAuthentication (authentication.py) can
+rebuild request.user from the access token without reading users.User
+FilteredRefreshToken checks the blacklist through the per-worker filter of blacklist.py
+"""
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .blacklist import blacklist_filter
+
+# Claims a token needs for a request to be authenticated without a User lookup
+USER_CLAIMS = ('is_teacher', 'is_staff', 'Class', 'profile_id')
+
+
+class FilteredRefreshToken(RefreshToken):
+    """
+    RefreshToken whose blacklist check is usually answered without a query
+    """
+
+    def check_blacklist(self):
+        if blacklist_filter.is_blacklisted(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        blacklisted = super().blacklist()
+        blacklist_filter.add(self.payload[api_settings.JTI_CLAIM])
+        return blacklisted
+
+
+def add_claims(refresh, snapshot):
+    """
+    Write the user claims on a refresh token, the access tokens it issues copy them
+    snapshot is the profile snapshot of the user (profiles/snapshots.py)
+    """
+    refresh['is_teacher'] = snapshot['is_teacher']
+    refresh['is_staff'] = snapshot['is_staff']
+    refresh['Class'] = snapshot['Class']
+    refresh['profile_id'] = snapshot['profile_id']
+    return refresh
+
+
+def tokens_for(user, snapshot):
+    """
+    Return a new refresh token (and through it the access token) carrying the user claims
+    """
+    return add_claims(FilteredRefreshToken.for_user(user), snapshot)
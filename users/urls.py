@@ -6,6 +6,7 @@ from . import views
 
 urlpatterns = [
   path('register/',views.register , name='register'),
+  path('provision/',views.provision_accounts , name='provision_accounts'),
   path('login/',views.login , name='login'),
   path('logout/',views.LogoutView.as_view() , name='logout'),
   path('refresh/', views.TokenRefreshViewCustom.as_view(), name='token_refresh'),
@@ -1,28 +1,17 @@
 from django.contrib.auth.hashers import make_password
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, permission_classes
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, generics
-from rest_framework_simplejwt.tokens import RefreshToken
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from .serializers import SingUpSerializer, UserSerializer
 from .models import User
+from .provisioning import MAX_UPLOAD_ROWS, ProvisioningConflict, provision, read_csv, teacher_bio
+from .tokens import FilteredRefreshToken, add_claims, tokens_for
 from profiles.models import Profile_Teacher , Profile_Student
+from profiles.snapshots import get_snapshot
 
-# Dictionary mapping English subject names to Arabic names for teacher bio generation
-subject_arabic_names={
-     'math':'رياضيات' ,
-    'physics':'فيزياء' ,
-    'chemistry':'كيمياء' ,
-    'science':'علوم' ,
-    'arabic':'عربي' ,
-    'english':'إنكليزي' ,
-    'france':'فرنسي' ,
-    'islam':'ديانة' ,
-    'physics_chemistry':'فيزياء و كيمياء' ,
-    'geography':'اجتماعيات' ,
-}
  
 
 @api_view(["POST"])
@@ -69,13 +58,7 @@ def register(request):
             # Handle teacher profile creation
             if data["is_teacher"]:
                 # Generate bio based on gender and subject
-                bio = ""
-                if data['gender'] == 'M':
-                    bio = 'استاذ متخصص في تدريس مادة '
-                else:
-                    bio = "آنسة متخصصة في تدريس مادة "
-                
-                bio += subject_arabic_names[data["studying_subjects"]]
+                bio = teacher_bio(data['gender'], data["studying_subjects"])
                 
                 # Get and update teacher profile
                 teacher = Profile_Teacher.objects.get(user=user)
@@ -110,6 +93,53 @@ def register(request):
         return Response(user.errors, status=status.HTTP_400_BAD_REQUEST)
     
 
+@api_view(["POST"])
+@permission_classes([IsAdminUser])
+def provision_accounts(request):
+    """
+    Create student and teacher accounts in bulk (staff only)
+    Body: a CSV upload in file, or a JSON list of rows in users, with the columns
+    of users/provisioning.py FIELDS. An optional is_teacher field applies to every row
+    Invalid rows are skipped and reported, the others are created together
+    At most MAX_UPLOAD_ROWS rows, hashed in this worker without a process pool
+    """
+    if 'file' in request.FILES:
+        rows = read_csv(request.FILES['file'])
+    else:
+        rows = request.data.get('users')
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            return Response(
+                {"error": "يجب إرسال ملف CSV في الحقل file أو قائمة الحسابات في الحقل users"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+    if len(rows) > MAX_UPLOAD_ROWS:
+        return Response(
+            {"error": f"لا يمكن إنشاء أكثر من {MAX_UPLOAD_ROWS} حساب في طلب واحد"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    is_teacher = request.data.get('is_teacher')
+    if is_teacher is not None:
+        is_teacher = str(is_teacher).lower() in ('1', 'true')
+
+    try:
+        result = provision(rows, is_teacher=is_teacher, workers=1)
+    except ProvisioningConflict:
+        return Response(
+            {"error": "تم تسجيل أحد الحسابات أثناء المعالجة، لم يتم إنشاء أي حساب، أعد المحاولة"},
+            status=status.HTTP_409_CONFLICT
+        )
+
+    return Response(
+        {
+            "created": result.created,
+            "errors": result.errors,
+        },
+        status=status.HTTP_201_CREATED if result.created else status.HTTP_400_BAD_REQUEST
+    )
+
+
 @api_view(["POST"])
 def login(request):
     """
@@ -118,7 +148,6 @@ def login(request):
     """
     # Get user by username or return 404 if not found
     user = get_object_or_404(User, username=request.data["username"])
-    profile = "initial value"
     
     # Verify password
     if not user.check_password(request.data["password"]):
@@ -127,50 +156,31 @@ def login(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    # Generate JWT tokens for the user
-    refresh = RefreshToken.for_user(user)
-
-    # Prepare user data for response
-    data = {
-        "username": request.data["username"],
-        "password": request.data["password"]
-    }
+    # Profile fields of teachers and students, from the cached snapshot (profiles/snapshots.py)
+    profile = get_snapshot(user.pk)
+    if profile is None:
+        return Response(
+            {"Error": "لم يتم العثور على الملف الشخصي"},
+            status=status.HTTP_404_NOT_FOUND
+        )
 
     # Serialize user data
     serializer = UserSerializer(instance=user)
-    
-    # Handle teacher login response
-    if user.is_teacher:
-        profile = Profile_Teacher.objects.get(user=user)
-        return Response(
-            {
-                "access": str(refresh.access_token),
-                "refresh": str(refresh),
-                "user": serializer.data,
-                "full_name": profile.full_name,
-                "gender": profile.gender,
-                "Class": profile.Class,
-                "city": profile.city,
-            },
-            status=status.HTTP_200_OK,
-        )
 
-    else:
-        # Handle student login response
-        profile = Profile_Student.objects.get(user=user)
-        
-        return Response(
-            {
-                "access": str(refresh.access_token),
-                "refresh": str(refresh),
-                "user": serializer.data,
-                "full_name": profile.full_name,
-                "gender": profile.gender,
-                "Class": profile.Class,
-                "city": profile.city,
-            },
-            status=status.HTTP_200_OK,
-        )
+    # Generate JWT tokens carrying the claims of the user
+    refresh = tokens_for(user, profile)
+    return Response(
+        {
+            "access": str(refresh.access_token),
+            "refresh": str(refresh),
+            "user": serializer.data,
+            "full_name": profile["full_name"],
+            "gender": profile["gender"],
+            "Class": profile["Class"],
+            "city": profile["city"],
+        },
+        status=status.HTTP_200_OK,
+    )
 
 
 class LogoutView(APIView):
@@ -195,7 +205,7 @@ class LogoutView(APIView):
                 )
 
             # Blacklist the refresh token
-            token = RefreshToken(refresh_token)
+            token = FilteredRefreshToken(refresh_token)
             token.blacklist()
 
             return Response("تم تسجيل الخروج بنجاح", status=status.HTTP_202_ACCEPTED)
@@ -227,40 +237,30 @@ class TokenRefreshViewCustom(generics.GenericAPIView):
 
         try:
             # Create refresh token object
-            refresh = RefreshToken(refresh_token)
+            refresh = FilteredRefreshToken(refresh_token)
 
-            # Get user by ID from token
-            user = User.objects.get(id=refresh["user_id"])
-            profile = ""
-            Class = "12"
-            
-            # Get appropriate profile based on user type
-            if user.is_teacher:
-                profile = Profile_Teacher.objects.get(user=user.id)
-            else:
-                profile = Profile_Student.objects.get(user=user.id)
-                Class = profile.Class 
-                
-            # Generate new access token
-            new_access_token = str(refresh.access_token)
-            
-            # Handle profile image if exists
-            image = None
-            if hasattr(profile, 'image') and profile.image:
-                image = profile.image.url
+            # User and profile fields from the cached snapshot (profiles/snapshots.py),
+            # usually without a query
+            profile = get_snapshot(refresh["user_id"])
+            if profile is None:
+                raise User.DoesNotExist(refresh["user_id"])
+
+            # Generate new access token, with claims refreshed from the profile
+            new_access_token = str(add_claims(refresh, profile).access_token)
 
             return Response(
                 {
                     "access": new_access_token,
                     "user": {
-                        "id": user.id,
-                        "username": user.username,
-                        "email": user.email,
-                        "is_teacher": user.is_teacher,
-                        "full_name": profile.full_name,
-                        "gender": profile.gender,
-                        "image": image,
-                        "Class": Class,
+                        "id": profile["id"],
+                        "username": profile["username"],
+                        "email": profile["email"],
+                        "is_teacher": profile["is_teacher"],
+                        "full_name": profile["full_name"],
+                        "gender": profile["gender"],
+                        "image": profile["image"],
+                        # Teachers always get "12", as before
+                        "Class": "12" if profile["is_teacher"] else profile["Class"],
                     },
                 },
                 status=status.HTTP_200_OK,
@@ -0,0 +1,17 @@
+from django.contrib import admin
+
+from .models import VoucherBatch
+
+
+@admin.register(VoucherBatch)
+class VoucherBatchAdmin(admin.ModelAdmin):
+    """
+    Batches are generated with `manage.py generate_vouchers`, the admin only lists them
+    """
+    list_display = ['id', 'name', 'value', 'quantity', 'created_at', 'created_by']
+    search_fields = ['name']
+    readonly_fields = ['name', 'value', 'quantity', 'created_at', 'created_by']
+    list_select_related = ['created_by']
+
+    def has_add_permission(self, request):
+        return False
@@ -0,0 +1,67 @@
+"""
+Prepaid voucher codes
+A code is 16 characters drawn with the secrets module from an alphabet without
+look-alike letters (about 79 bits), so knowing other codes or the batch
+tells nothing about it. The database only keeps the SHA-256 of each code: the
+codes are written once, to the printer CSV, while the batch is generated, and
+can never be read or exported again
+"""
+import csv
+import hashlib
+import secrets
+
+from django.db import transaction
+
+from .models import Voucher, VoucherBatch
+
+# No 0/O, 1/I/L: codes are typed by hand from a scratch card
+ALPHABET = 'ABCDEFGHJKMNPQRSTUVWXYZ23456789'
+CODE_LENGTH = 16
+GROUP_LENGTH = 4
+
+# Vouchers inserted by one INSERT statement
+GENERATE_BATCH_SIZE = 5000
+
+# Columns of the printer CSV
+CSV_HEADER = ['serial', 'code', 'value']
+
+
+def new_code():
+    """
+    Return a new random code, in groups of GROUP_LENGTH characters
+    """
+    code = ''.join(secrets.choice(ALPHABET) for _ in range(CODE_LENGTH))
+    return '-'.join(code[i:i + GROUP_LENGTH] for i in range(0, CODE_LENGTH, GROUP_LENGTH))
+
+
+def normalize(code):
+    """
+    Uppercase a typed code and drop the separators
+    """
+    return ''.join(character for character in str(code).upper() if character.isalnum())
+
+
+def hash_code(code):
+    return hashlib.sha256(normalize(code).encode()).hexdigest()
+
+
+def generate_batch(name, value, quantity, output, created_by=None, batch_size=GENERATE_BATCH_SIZE):
+    """
+    Create a batch and the hashes of its quantity vouchers, batch_size per INSERT
+    The printer CSV (CSV_HEADER: serial, code, value) is written to the text
+    file output as the chunks are inserted, it is the only copy of the codes.
+    If an error is raised nothing is stored and output must be discarded
+    Returns the VoucherBatch
+    """
+    writer = csv.writer(output)
+    writer.writerow(CSV_HEADER)
+    with transaction.atomic():
+        batch = VoucherBatch.objects.create(name=name, value=value, quantity=quantity, created_by=created_by)
+        # One chunk in memory at a time, bulk_create would build the whole list
+        for start in range(0, quantity, batch_size):
+            codes = [(serial, new_code()) for serial in range(start, min(start + batch_size, quantity))]
+            Voucher.objects.bulk_create([
+                Voucher(batch=batch, serial=serial, code_hash=hash_code(code)) for serial, code in codes
+            ])
+            writer.writerows([serial, code, value] for serial, code in codes)
+    return batch
@@ -0,0 +1,52 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from users.models import User
+from vouchers.codes import GENERATE_BATCH_SIZE, generate_batch
+
+
+class Command(BaseCommand):
+    """
+    Generate a batch of prepaid vouchers and write the CSV of their codes for the printer
+    Only the hashes of the codes are stored, the output file is the one copy of the codes
+    """
+    help = 'Generate a batch of prepaid voucher codes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Label of the batch (shop, region...)')
+        parser.add_argument('--output', required=True, help='CSV file the codes are written to, must not exist')
+        parser.add_argument('--value', type=int, required=True, help='Balance credited by each voucher')
+        parser.add_argument('--quantity', type=int, required=True, help='Number of vouchers')
+        parser.add_argument('--created-by', help='Username of the staff member generating the batch')
+        parser.add_argument('--batch-size', type=int, default=GENERATE_BATCH_SIZE, help='Vouchers per INSERT')
+
+    def handle(self, *args, **options):
+        if options['value'] <= 0 or options['quantity'] <= 0:
+            raise CommandError('--value and --quantity must be positive')
+
+        created_by = None
+        if options['created_by']:
+            created_by = User.objects.filter(username=options['created_by']).first()
+            if created_by is None:
+                raise CommandError(f'Unknown user {options["created_by"]}')
+
+        output = Path(options['output'])
+        started = time.monotonic()
+        try:
+            with output.open('x', newline='') as file:
+                batch = generate_batch(
+                    options['name'], options['value'], options['quantity'], file, created_by, options['batch_size']
+                )
+        except FileExistsError:
+            raise CommandError(f'{output} already exists')
+        except BaseException:
+            # Nothing was stored, the codes written so far are worthless
+            output.unlink(missing_ok=True)
+            raise
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Generated batch {batch.id}: {batch.quantity} vouchers of {batch.value} in {elapsed:.2f}s'
+            f' ({batch.quantity / elapsed if elapsed else 0:.0f} codes/s), codes written to {output}'
+        ))
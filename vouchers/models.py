@@ -0,0 +1,62 @@
+from django.db import models
+
+from profiles.models import Profile_Student
+from users.models import User
+
+# Create your models here.
+
+
+class VoucherBatch(models.Model):
+    """
+    A print run of prepaid scratch cards of the same value
+    The codes are random and only handed out once, in the CSV written while
+    the batch is generated (see codes.py)
+    """
+
+    # Label of the print run (shop, region...)
+    name = models.CharField(max_length=127)
+
+    # Balance credited by each voucher of the batch
+    value = models.PositiveIntegerField()
+
+    # Number of vouchers, their serials are 0 .. quantity - 1
+    quantity = models.PositiveIntegerField()
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    # Staff member who generated the batch
+    created_by = models.ForeignKey(User, null=True, blank=True, on_delete=models.SET_NULL)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"{self.name} ({self.quantity} x {self.value})"
+
+
+class Voucher(models.Model):
+    """
+    One prepaid code, stored only as the SHA-256 of its normalized text
+    Redemption looks the hash up through its unique index and claims the row
+    with a conditional UPDATE, a code can never be credited twice
+    """
+
+    batch = models.ForeignKey(VoucherBatch, on_delete=models.CASCADE, related_name='vouchers')
+
+    # Position of the voucher in its batch, printed next to its code
+    serial = models.PositiveIntegerField()
+
+    # Hex SHA-256 of the normalized code
+    code_hash = models.CharField(max_length=64, unique=True)
+
+    # Student who redeemed the voucher, NULL while it is unused
+    redeemed_by = models.ForeignKey(
+        Profile_Student, null=True, blank=True, on_delete=models.SET_NULL, related_name='vouchers'
+    )
+    redeemed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        unique_together = ['batch', 'serial']
+
+    def __str__(self):
+        return f"{self.batch_id}/{self.serial}"
@@ -0,0 +1,78 @@
+"""
+Redemption of prepaid vouchers
+The voucher is claimed with one conditional statement,
+UPDATE ... SET redeemed_by = student WHERE code_hash = hash AND redeemed_by IS NULL,
+found through the unique index on code_hash. Only the request whose UPDATE
+changed the row credits the balance, in the same transaction, with a relative
+UPDATE reading the value of the batch in a subquery
+"""
+from collections import namedtuple
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Subquery
+from django.utils import timezone
+
+from profiles.models import Profile_Student
+from .codes import hash_code
+from .models import Voucher
+
+Redemption = namedtuple('Redemption', ['value', 'new_balance'])
+
+
+class RedemptionError(Exception):
+    """
+    Base class of the reasons a voucher is refused, nothing was credited
+    """
+
+
+class UnknownVoucher(RedemptionError):
+    pass
+
+
+class VoucherAlreadyRedeemed(RedemptionError):
+    pass
+
+
+class StudentNotFound(RedemptionError):
+    pass
+
+
+def redeem(student_id, code):
+    """
+    Credit the student with the value of the voucher code
+    Raises a RedemptionError subclass when the voucher is refused
+    """
+    code_hash = hash_code(code)
+
+    try:
+        with transaction.atomic():
+            return _redeem(student_id, code_hash)
+    except IntegrityError:
+        # The claim points at a student profile that does not exist (a teacher account)
+        raise StudentNotFound(student_id)
+
+
+def _redeem(student_id, code_hash):
+    """
+    Claim the voucher and credit the student, inside the transaction of redeem()
+    """
+    claimed = Voucher.objects.filter(code_hash=code_hash, redeemed_by__isnull=True).update(
+        redeemed_by_id=student_id, redeemed_at=timezone.now()
+    )
+    if not claimed:
+        if Voucher.objects.filter(code_hash=code_hash).exists():
+            raise VoucherAlreadyRedeemed(code_hash)
+        raise UnknownVoucher(code_hash)
+
+    # Raising here rolls the claim back with the transaction
+    credited = Profile_Student.objects.filter(user_id=student_id).update(
+        balance=F('balance') + Subquery(Voucher.objects.filter(code_hash=code_hash).values('batch__value')[:1])
+    )
+    if not credited:
+        raise StudentNotFound(student_id)
+
+    new_balance, value = Profile_Student.objects.filter(user_id=student_id).values_list(
+        'balance', 'vouchers__batch__value'
+    ).filter(vouchers__code_hash=code_hash).get()
+
+    return Redemption(value, new_balance)
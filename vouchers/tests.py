@@ -0,0 +1,108 @@
+import csv
+import io
+import tempfile
+from pathlib import Path
+
+from django.core.management import call_command
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from profiles.models import Profile_Student
+from users.models import User
+from .codes import CSV_HEADER, generate_batch, hash_code
+from .models import Voucher, VoucherBatch
+
+# Create your tests here.
+
+
+def read_codes(text):
+    """
+    Return the codes of a printer CSV, in serial order
+    """
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0] == CSV_HEADER
+    return [code for _, code, _ in rows[1:]]
+
+
+class VoucherTests(TestCase):
+    """
+    Vouchers are random, stored hashed, handed out once and credit the balance once
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student_user = User.objects.create(username='student', email='student@svi.com')
+        cls.staff_user = User.objects.create(username='staff', email='staff@svi.com', is_staff=True)
+        output = io.StringIO()
+        cls.batch = generate_batch('shop', 5000, 7, output, batch_size=3)
+        cls.codes = read_codes(output.getvalue())
+
+    def redeem(self, code):
+        client = APIClient()
+        client.force_authenticate(user=self.student_user)
+        return client.post('/vouchers/redeem/', {'code': code}, format='json')
+
+    def balance(self):
+        return Profile_Student.objects.get(user=self.student_user).balance
+
+    def test_only_hashes_are_stored(self):
+        self.assertEqual(len(set(self.codes)), 7)
+        self.assertEqual(
+            dict(Voucher.objects.filter(batch=self.batch).values_list('serial', 'code_hash')),
+            {serial: hash_code(code) for serial, code in enumerate(self.codes)},
+        )
+
+    def test_codes_are_not_derived_from_the_batch(self):
+        # The same batch layout gives other codes
+        output = io.StringIO()
+        generate_batch('shop', 5000, 7, output)
+
+        self.assertFalse(set(read_codes(output.getvalue())) & set(self.codes))
+
+    def test_voucher_is_credited_once(self):
+        code = self.codes[3]
+
+        # Typed by hand: lower case, no dashes
+        response = self.redeem(code.replace('-', '').lower())
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['new_balance'], 5000)
+
+        self.assertEqual(self.redeem(code).status_code, 409)
+        self.assertEqual(self.balance(), 5000)
+
+    def test_unknown_code_is_refused(self):
+        self.assertEqual(self.redeem('AAAA-BBBB-CCCC-DDDD').status_code, 404)
+        self.assertEqual(self.balance(), 0)
+
+    def test_generation_endpoint_answers_the_codes_once(self):
+        client = APIClient()
+        client.force_authenticate(user=self.staff_user)
+        response = client.post('/vouchers/batches/', {'name': 'kiosk', 'value': 1000, 'quantity': 4}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        codes = read_codes(response.content.decode())
+        batch = VoucherBatch.objects.get(name='kiosk')
+        self.assertEqual(batch.created_by, self.staff_user)
+        self.assertEqual(
+            set(Voucher.objects.filter(batch=batch).values_list('code_hash', flat=True)),
+            {hash_code(code) for code in codes},
+        )
+
+    def test_generation_is_staff_only_and_bounded(self):
+        client = APIClient()
+        client.force_authenticate(user=self.student_user)
+        self.assertEqual(client.post('/vouchers/batches/', {'name': 'x', 'value': 1, 'quantity': 1}).status_code, 403)
+
+        client.force_authenticate(user=self.staff_user)
+        self.assertEqual(client.post('/vouchers/batches/', {'name': 'x', 'value': 1, 'quantity': 0}).status_code, 400)
+        self.assertFalse(VoucherBatch.objects.filter(name='x').exists())
+
+    def test_command_writes_the_codes_to_a_new_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / 'codes.csv'
+            call_command('generate_vouchers', 'shop', value=500, quantity=5, output=str(path), stdout=io.StringIO())
+
+            codes = read_codes(path.read_text())
+            self.assertEqual(len(codes), 5)
+            self.assertTrue(Voucher.objects.filter(code_hash=hash_code(codes[0])).exists())
@@ -0,0 +1,10 @@
+from django.urls import path
+from . import views
+
+urlpatterns = [
+    # Credit the student's balance with a prepaid scratch card
+    path('redeem/', views.redeem_voucher, name='redeem_voucher'),
+
+    # Generate a batch, answered with the CSV of its codes for the printer
+    path('batches/', views.generate_voucher_batch, name='generate_voucher_batch'),
+]
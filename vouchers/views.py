@@ -0,0 +1,78 @@
+import io
+
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.response import Response
+
+from users.authentication import full_user
+from .codes import generate_batch
+from .redemption import redeem, StudentNotFound, UnknownVoucher, VoucherAlreadyRedeemed
+
+# Largest batch generated through the API, bigger print runs use `manage.py generate_vouchers`
+MAX_API_QUANTITY = 10000
+
+# Create your views here.
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def redeem_voucher(request):
+    """
+    Credit the balance of the authenticated student with a prepaid voucher code
+    Body: code, as printed on the card (dashes and case are ignored)
+    """
+    code = request.data.get('code')
+    if not code:
+        return Response({'error': 'الحقل المطلوب مفقود: code'}, status=status.HTTP_400_BAD_REQUEST)
+
+    try:
+        redemption = redeem(request.user.pk, code)
+    except UnknownVoucher:
+        return Response({'error': 'رمز القسيمة غير صحيح'}, status=status.HTTP_404_NOT_FOUND)
+    except VoucherAlreadyRedeemed:
+        return Response({'error': 'تم استخدام هذه القسيمة مسبقاً'}, status=status.HTTP_409_CONFLICT)
+    except StudentNotFound:
+        return Response({'error': 'لم يتم العثور على الطالب'}, status=status.HTTP_404_NOT_FOUND)
+
+    return Response(
+        {
+            'success': True,
+            'amount_credited': redemption.value,
+            'new_balance': redemption.new_balance,
+        },
+        status=status.HTTP_200_OK
+    )
+
+
+# The batch keeps the users.User row of its author in created_by
+@full_user
+@api_view(['POST'])
+@permission_classes([IsAdminUser])
+def generate_voucher_batch(request):
+    """
+    Generate a batch of vouchers and answer the CSV of its codes for the printer (staff only)
+    Body: name, value (balance credited by each voucher) and quantity
+    Only the hashes are stored: this response is the one copy of the codes
+    """
+    name = request.data.get('name')
+    try:
+        value = int(request.data.get('value'))
+        quantity = int(request.data.get('quantity'))
+    except (TypeError, ValueError):
+        value = quantity = 0
+    if not name or value <= 0 or not 0 < quantity <= MAX_API_QUANTITY:
+        return Response(
+            {'error': f'يجب إرسال name و value موجبة و quantity بين 1 و {MAX_API_QUANTITY}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    output = io.StringIO()
+    batch = generate_batch(name, value, quantity, output, created_by=request.user)
+
+    response = HttpResponse(output.getvalue(), content_type='text/csv', status=status.HTTP_201_CREATED)
+    response['Content-Disposition'] = f'attachment; filename="vouchers-{batch.id}.csv"'
+    # The codes must not be kept by a cache on the way
+    response['Cache-Control'] = 'no-store'
+    return response